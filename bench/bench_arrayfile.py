@@ -0,0 +1,77 @@
+"""
+Compares loading a structured array from an array file against loading
+it from a pickle and from an npz file, and appending to an array file
+against rewriting it.
+
+    python bench/bench_arrayfile.py [rows]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import datashape
+from datashape import ArrayFile, save_array
+
+
+def main(rows=2000000):
+    a = np.zeros(rows, dtype=[('id', 'i8'), ('x', 'f8'), ('y', 'f8'),
+                              ('flag', 'i1')])
+    a['id'] = np.arange(rows)
+    a['x'] = np.random.RandomState(0).rand(rows)
+    print('datashape %s, %d rows, %d MB' %
+          (datashape.__version__, rows, a.nbytes // 2**20))
+
+    tmp = tempfile.mkdtemp()
+    paths = dict((ext, os.path.join(tmp, 'a.' + ext))
+                 for ext in ('pkl', 'npz', 'dsa'))
+    try:
+        with open(paths['pkl'], 'wb') as f:
+            pickle.dump(a, f, pickle.HIGHEST_PROTOCOL)
+        np.savez(paths['npz'], a=a)
+        start = time.time()
+        save_array(paths['dsa'], a)
+        print('array save           %8.4f s' % (time.time() - start))
+
+        start = time.time()
+        with open(paths['pkl'], 'rb') as f:
+            b = pickle.load(f)
+        b['x'].sum()
+        print('pickle load + sum    %8.4f s' % (time.time() - start))
+
+        start = time.time()
+        with np.load(paths['npz']) as npz:
+            b = npz['a']
+        b['x'].sum()
+        print('npz load + sum       %8.4f s' % (time.time() - start))
+
+        start = time.time()
+        with ArrayFile(paths['dsa']) as af:
+            opened = time.time()
+            af.array['x'].sum()
+            print('array open           %8.6f s' % (opened - start))
+            print('array open + sum     %8.4f s' % (time.time() - start))
+
+        extra = a[:rows // 100]
+        start = time.time()
+        with ArrayFile(paths['dsa'], 'r+') as af:
+            af.append(extra)
+        print('array append 1%%      %8.4f s' % (time.time() - start))
+        start = time.time()
+        np.savez(paths['npz'], a=np.concatenate([a, extra]))
+        print('npz rewrite          %8.4f s' % (time.time() - start))
+    finally:
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,59 @@
+"""
+Compares parsing a catalog of distinct datashape strings one at a time
+with dshape() against bulk_dshapes() using pools of 2, 4 and 8 processes,
+or of the given number. The speedup is bounded by the number of CPUs.
+
+The parse cache is cleared before each run, so every string is parsed.
+
+    python bench/bench_bulk_parse.py [count] [processes]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import sys
+import random
+import time
+
+import datashape
+from datashape import util
+
+_dtypes = ['int32', 'int64', 'float64', 'bool', 'string', 'string[16]',
+           'option[float32]', 'datetime', 'complex[float64]']
+
+
+def catalog(count, seed=0):
+    rnd = random.Random(seed)
+    ds_strs = []
+    for i in range(count):
+        fields = ', '.join('f%d_%d: %s' % (i, j, rnd.choice(_dtypes))
+                           for j in range(rnd.randint(2, 12)))
+        dims = rnd.choice(['', 'var * ', '%d * ' % (i % 100), 'N * 3 * '])
+        ds_strs.append('%s{%s}' % (dims, fields))
+    return ds_strs
+
+
+def timed(func, *args):
+    util.clear_parse_cache()
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+
+def main(count=100000, processes=None):
+    ds_strs = catalog(count)
+    util.set_parse_cache_size(count)
+    print('datashape %s, %d schema strings, %d CPUs' %
+          (datashape.__version__, count, multiprocessing.cpu_count()))
+    seq, expected = timed(lambda strs: [util.dshape(s) for s in strs],
+                          ds_strs)
+    print('sequential dshape      %8.3f s' % seq)
+    for n in [processes] if processes else [2, 4, 8]:
+        bulk, result = timed(util.bulk_dshapes, ds_strs, n)
+        assert result.dshapes == expected and not result.errors
+        print('bulk_dshapes, %d procs  %8.3f s  (%.2fx)' % (n, bulk,
+                                                           seq / bulk))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,53 @@
+"""
+Compares starting up from a schema catalog by parsing every datashape
+string against opening a bundle of the same catalog and looking up a
+few datashapes from it.
+
+    python bench/bench_bundle.py [count]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import tempfile
+import time
+
+import datashape
+from datashape import util
+from datashape.bundle import Bundle, save_bundle
+
+from bench_bulk_parse import catalog
+
+
+def main(count=100000):
+    ds_strs = catalog(count)
+    names = ['schema%d' % i for i in range(count)]
+    print('datashape %s, %d schema strings' % (datashape.__version__, count))
+
+    util.clear_parse_cache()
+    start = time.time()
+    dshapes = dict(zip(names, map(util.dshape, ds_strs)))
+    print('parse all            %8.3f s' % (time.time() - start))
+
+    fd, path = tempfile.mkstemp(suffix='.dsb')
+    os.close(fd)
+    try:
+        start = time.time()
+        save_bundle(path, dshapes)
+        print('save bundle          %8.3f s  (%d bytes)' %
+              (time.time() - start, os.path.getsize(path)))
+        del dshapes
+        start = time.time()
+        with Bundle(path) as bundle:
+            opened = time.time()
+            for name in names[::count // 10]:
+                bundle[name]
+            print('open bundle          %8.6f s' % (opened - start))
+            print('open + 10 lookups    %8.6f s' % (time.time() - start))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
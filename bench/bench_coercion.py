@@ -0,0 +1,115 @@
+"""
+Compares building the default coercion table and looking up coercion
+costs with the dense cost matrix of CoercionTable, against the table it
+replaced, which closed the rules recursively as each one was added, and
+times looking up cached coercion paths.
+
+    python bench/bench_coercion.py [repeat]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import datashape
+from datashape import coercion
+
+
+class RecursiveCoercionTable(object):
+    """The coercion table before the dense cost matrix."""
+
+    def __init__(self):
+        self.table = {}
+        self.srcs = defaultdict(set)
+        self.dsts = defaultdict(set)
+
+    def _reflexivity(self, a):
+        if (a, a) not in self.table:
+            self.table[a, a] = 0
+
+    def add_coercion(self, src, dst, cost, transitive=True):
+        if (src, dst) not in self.table:
+            self.srcs[dst].add(src)
+            self.dsts[src].add(dst)
+            self._reflexivity(src)
+            self._reflexivity(dst)
+            if src != dst:
+                self.table[src, dst] = cost
+                if transitive:
+                    self.transitivity(src, dst)
+        else:
+            self.table[src, dst] = min(self.table[src, dst], cost)
+
+    def transitivity(self, a, b):
+        for src in list(self.srcs[a]):
+            self.add_coercion(src, b, self.coercion_cost(src, a) +
+                              self.coercion_cost(a, b))
+        for dst in list(self.dsts[b]):
+            self.add_coercion(a, dst, self.coercion_cost(a, b) +
+                              self.coercion_cost(b, dst))
+
+    def coercion_cost(self, src, dst):
+        return self.table[src, dst]
+
+
+def default_rules():
+    """The default coercion rules, as (src, dst, cost) triples."""
+    table = coercion._table
+    rules = table._rules
+    return [(table.types[i], table.types[j], rules[i, j])
+            for i, j in zip(*np.nonzero(np.isfinite(rules)))
+            if i != j]
+
+
+def build(cls, rules):
+    table = cls()
+    for src, dst, cost in rules:
+        table.add_coercion(src, dst, cost)
+    if isinstance(table, coercion.CoercionTable):
+        table.costs
+    return table
+
+
+def lookups(table, pairs):
+    cost = table.coercion_cost
+    for src, dst in pairs:
+        cost(src, dst)
+
+
+def main(repeat=20):
+    rules = default_rules()
+    types = coercion._table.types
+    # Coercible pairs only, as both tables raise KeyError for the rest
+    costs = coercion._table.costs
+    pairs = [(types[i], types[j])
+             for i, j in zip(*np.nonzero(np.isfinite(costs)))] * 100
+    print('datashape %s, %d rules, %d lookups' % (
+        datashape.__version__, len(rules), len(pairs)))
+    for name, cls in [('recursive', RecursiveCoercionTable),
+                      ('dense matrix', coercion.CoercionTable)]:
+        start = time.time()
+        for _ in range(repeat):
+            table = build(cls, rules)
+        built = (time.time() - start) / repeat
+        start = time.time()
+        for _ in range(repeat):
+            lookups(table, pairs)
+        looked = (time.time() - start) / repeat / len(pairs)
+        print('%-14s build %8.2f ms   lookup %6.0f ns' % (
+            name, built * 1e3, looked * 1e9))
+
+    path = table.coercion_path
+    start = time.time()
+    for _ in range(repeat):
+        for src, dst in pairs:
+            path(src, dst)
+    print('%-14s path lookup %6.0f ns' % (
+        '', (time.time() - start) / repeat / len(pairs) * 1e9))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
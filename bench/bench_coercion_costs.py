@@ -0,0 +1,56 @@
+"""
+Times looking up the coercion costs of many pairs of types with
+coercion_costs, against calling coercion_cost once per pair and
+catching CoercionError for the pairs which can't be coerced.
+
+    python bench/bench_coercion_costs.py [pairs]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import sys
+import time
+
+import numpy as np
+
+import datashape
+from datashape import coercion_cost, coercion_costs
+from datashape.coercion import _table
+from datashape.error import CoercionError
+
+
+def per_pair(srcs, dsts):
+    costs = []
+    for a, b in zip(srcs, dsts):
+        try:
+            costs.append(coercion_cost(a, b))
+        except CoercionError:
+            costs.append(np.inf)
+    return np.array(costs)
+
+
+def main(pairs=100000):
+    rng = random.Random(0)
+    types = _table.types
+    srcs = [rng.choice(types) for _ in range(pairs)]
+    dsts = [rng.choice(types) for _ in range(pairs)]
+    print('datashape %s, %d pairs of %d types' % (
+        datashape.__version__, pairs, len(types)))
+
+    results = []
+    for name, f in [('coercion_cost', per_pair),
+                    ('coercion_costs', coercion_costs)]:
+        start = time.time()
+        results.append(f(srcs, dsts))
+        print('%-16s %8.3f s' % (name, time.time() - start))
+    assert np.array_equal(results[0], results[1])
+
+    src_ids, dst_ids = _table.type_ids(srcs), _table.type_ids(dsts)
+    start = time.time()
+    _table.costs_by_id(src_ids, dst_ids)
+    print('%-16s %8.3f s' % ('costs_by_id', time.time() - start))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
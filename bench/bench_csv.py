@@ -0,0 +1,72 @@
+"""
+Times reading a CSV file with read_csv, in this process and in a pool
+of workers, against csv.reader building a list of rows, and shows the
+peak memory of each.
+
+    python bench/bench_csv.py [rows] [processes]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import datashape
+from datashape import infer_csv, read_csv
+
+
+def traced(f):
+    tracemalloc.start()
+    result = f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+def main(rows=1000000, processes=2):
+    rng = random.Random(0)
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'data.csv')
+    try:
+        with io.open(path, 'w', newline='') as f:
+            f.write(u'id,score,when,name\n')
+            for i in range(rows):
+                f.write(u'%d,%s,2014-05-%02d,user%d\n' % (
+                    i, rng.random() if i % 10 else u'', i % 28 + 1, i))
+        print('datashape %s, %d rows, %.1f MB' % (
+            datashape.__version__, rows, os.path.getsize(path) / 1e6))
+        ds = infer_csv(path)
+        print(ds)
+
+        def rows_list():
+            with io.open(path, newline='') as f:
+                return len(list(csv.reader(f)))
+
+        def chunked(processes):
+            return lambda: sum(len(c) for c in read_csv(
+                path, ds, chunksize=65536, processes=processes))
+
+        for name, f in [('csv.reader list', rows_list),
+                        ('read_csv', chunked(1)),
+                        ('read_csv %d procs' % processes,
+                         chunked(processes))]:
+            start = time.time()
+            f()
+            elapsed = time.time() - start
+            # Tracing slows NumPy down, so memory is measured apart
+            peak = traced(f)[1]
+            print('%-20s %8.3f s %10.1f MB peak' % (name, elapsed,
+                                                    peak / 1e6))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
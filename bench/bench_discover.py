@@ -0,0 +1,35 @@
+"""
+Times discovering the datashape of a list of dicts, as parsed from JSON,
+reading every row and stopping once the type is stable.
+
+    python bench/bench_discover.py [rows]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import sys
+import time
+
+import datashape
+from datashape import discover
+
+
+def main(rows=1000000):
+    rng = random.Random(0)
+    data = [{'id': i, 'name': 'user%d' % i,
+             'score': rng.random() if i % 10 else None,
+             'when': '2014-05-%02d' % (i % 28 + 1),
+             'tags': ['a', 'b'][:i % 3]}
+            for i in range(rows)]
+    print('datashape %s, %d rows' % (datashape.__version__, rows))
+
+    for kwds in [{}, {'sample': 10000}, {'stable': 1000}]:
+        start = time.time()
+        ds = discover(data, **kwds)
+        print('%-18s %8.3f s  %s' % (kwds or 'all rows', time.time() - start,
+                                     ds))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,61 @@
+"""
+Times reading JSON lines into a structured array with read_jsonl,
+against parsing each line into a dict and building the array from
+tuples of the rows.
+
+    python bench/bench_jsonl.py [rows] [repeat]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+import datashape
+from datashape import read_jsonl, to_numpy_dtype
+
+
+DS = '{id: int64, user: string[16], score: option[float64], when: date}'
+
+
+def per_row(lines):
+    names = ['id', 'user', 'score', 'when']
+    dtype = to_numpy_dtype(datashape.dshape(
+        '{id: int64, user: string[16, "U32"], score: float64, when: date}'))
+    rows = []
+    for line in lines:
+        d = json.loads(line)
+        row = tuple(d.get(name) for name in names)
+        if row[2] is None:
+            row = row[:2] + (np.nan,) + row[3:]
+        rows.append(row)
+    return np.array(rows, dtype=dtype)
+
+
+def main(rows=500000, repeat=3):
+    rng = random.Random(0)
+    lines = [json.dumps({'id': i, 'user': 'user%d' % i,
+                         'score': rng.random() if i % 10 else None,
+                         'when': '2014-05-%02d' % (i % 28 + 1),
+                         'agent': 'x' * 20})
+             for i in range(rows)]
+    print('datashape %s, %d lines' % (datashape.__version__, rows))
+
+    for name, f in [('json.loads per row', lambda: len(per_row(lines))),
+                    ('read_jsonl', lambda: sum(
+                        len(c) for c in read_jsonl(lines, DS)))]:
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            n = f()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-20s %8.3f s  %d rows, best of %d' % (name, best, n, repeat))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
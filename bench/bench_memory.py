@@ -0,0 +1,69 @@
+"""
+Measures the resident bytes per datashape type object.
+
+Builds many distinct instances of a few common kinds of types, keeps
+them alive, and reports the memory allocated per instance as traced by
+tracemalloc. The interning table entries are included, since every type
+built through a constructor pays for one. The last kind builds the same
+few types repeatedly, which interning shares.
+
+    python bench/bench_memory.py [count]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import gc
+import sys
+import tracemalloc
+
+import datashape
+from datashape import coretypes as ct
+
+
+def fixed(i):
+    return ct.Fixed(i)
+
+
+def chunk_shape(i):
+    # e.g. the datashape of one chunk of a partitioned 2D array
+    return ct.DataShape(ct.Fixed(i), ct.Fixed(16), ct.float64)
+
+
+def fixed_string(i):
+    return ct.String(i, 'A')
+
+
+def record(i):
+    return ct.Record([('id', ct.int64),
+                      ('name', ct.String(i, 'A')),
+                      ('value', ct.float64),
+                      ('flag', ct.bool_)])
+
+
+def repeated_record(i):
+    # The same few records built again and again, as when parsing the
+    # datashapes of many chunks or files of one dataset
+    return record(i % 100)
+
+
+def bytes_per_type(make, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [make(i) for i in range(1, count + 1)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Don't count the list holding the results
+    return (after - before - sys.getsizeof(keep)) / count
+
+
+def main(count=100000):
+    print('datashape %s, %d instances per kind' % (datashape.__version__,
+                                                  count))
+    for make in [fixed, chunk_shape, fixed_string, record, repeated_record]:
+        print('%-14s %8.1f bytes/type' % (make.__name__,
+                                          bytes_per_type(make, count)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
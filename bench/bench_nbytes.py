@@ -0,0 +1,37 @@
+"""
+Compares sizing many chunk datashapes one at a time with nbytes and all
+at once with nbytes_many.
+
+    python bench/bench_nbytes.py [chunks]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import sys
+import time
+
+import datashape
+from datashape import dshape, nbytes, nbytes_many
+
+
+def main(chunks=50000):
+    rng = random.Random(0)
+    types = ['{a: int32, b: float64, c: string[8]}',
+             '{x: var * float32, name: string, flag: option[bool]}',
+             '100 * int16']
+    shapes = [dshape('%d * %s' % (rng.randint(1, 100000), rng.choice(types)))
+              for i in range(chunks)]
+    print('datashape %s, %d chunks' % (datashape.__version__, chunks))
+
+    start = time.time()
+    loop = [nbytes(ds, var_len=10, str_len=16) for ds in shapes]
+    print('nbytes loop   %8.3f s' % (time.time() - start))
+    start = time.time()
+    many = nbytes_many(shapes, var_len=10, str_len=16)
+    print('nbytes_many   %8.3f s' % (time.time() - start))
+    assert many.tolist() == loop
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
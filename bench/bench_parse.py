@@ -0,0 +1,39 @@
+"""
+Times lexing a datashape string one Token at a time with lex(), in one
+pass with lex_all(), and parsing it end to end with parse(), which is
+what dshape() does for a string missing from the parse cache.
+
+Each figure is the best of several repeats, in microseconds per call.
+
+    python bench/bench_parse.py [number]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import timeit
+
+import datashape
+from datashape import lexer, parser
+from datashape.type_symbol_table import sym
+
+ds_str = ('var * {id: int64, name: string[32], score: option[float64], '
+          'tags: 3 * string, when: datetime[tz="UTC"], '
+          'loc: {lat: float32, lon: float32}, vals: var * (int8, float64)}')
+
+
+def best(func, number):
+    return min(timeit.repeat(func, number=number, repeat=15)) / number * 1e6
+
+
+def main(number=1000):
+    print('datashape %s, %d tokens' % (datashape.__version__,
+                                       len(lexer.lex_all(ds_str).ids)))
+    print('lex      %8.1f us' % best(lambda: list(lexer.lex(ds_str)), number))
+    print('lex_all  %8.1f us' % best(lambda: lexer.lex_all(ds_str), number))
+    print('parse    %8.1f us' % best(lambda: parser.parse(ds_str, sym),
+                                     number))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""
+Compares scanning a catalog of datashape strings for their structure,
+their field names, number of dimensions and whether they have a var
+dimension, by parsing them into types against parsing them into ASTs.
+
+    python bench/bench_parse_ast.py [count]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import random
+import time
+
+import datashape
+from datashape import sym
+from datashape.parser import (parse, parse_ast, ast_field_names, ast_ndim,
+                              ast_has_var)
+
+_dtypes = ['int32', 'int64', 'float64', 'bool', 'string', 'string[16]',
+           'option[float32]', 'datetime', 'complex[float64]',
+           'var * int8', '3 * float32']
+
+
+def catalog(count, seed=0):
+    rnd = random.Random(seed)
+    ds_strs = []
+    for i in range(count):
+        fields = ', '.join('f%d_%d: %s' % (i, j, rnd.choice(_dtypes))
+                           for j in range(rnd.randint(2, 30)))
+        dims = rnd.choice(['', 'var * ', '%d * ' % (i % 100), 'N * 3 * '])
+        ds_strs.append('%s{%s}' % (dims, fields))
+    return ds_strs
+
+
+def scan_types(ds_strs):
+    result = []
+    for ds_str in ds_strs:
+        ds = parse(ds_str, sym)
+        result.append((ds.measure.names, ds.ndim,
+                       datashape.has_var_dim(ds)))
+    return result
+
+
+def scan_asts(ds_strs):
+    result = []
+    for ds_str in ds_strs:
+        ast = parse_ast(ds_str, sym)
+        result.append((ast_field_names(ast), ast_ndim(ast),
+                       ast_has_var(ast)))
+    return result
+
+
+def main(count=20000):
+    ds_strs = catalog(count)
+    print('datashape %s, %d schema strings' % (datashape.__version__, count))
+    start = time.time()
+    expected = scan_types(ds_strs)
+    types = time.time() - start
+    print('parse and inspect types  %8.3f s' % types)
+    start = time.time()
+    result = scan_asts(ds_strs)
+    asts = time.time() - start
+    assert result == expected
+    print('parse_ast and inspect    %8.3f s  (%.2fx)' % (asts, types / asts))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""
+Compares the memory and conversion time of variable length event data
+held as a list of Python lists, as an object array of NumPy arrays, and
+as a RaggedArray.
+
+    python bench/bench_ragged.py [rows]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import datashape
+from datashape import RaggedArray
+
+
+def traced(f):
+    tracemalloc.start()
+    start = time.time()
+    result = f()
+    elapsed = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def main(rows=100000):
+    rng = random.Random(0)
+    lengths = [rng.randint(0, 40) for i in range(rows)]
+    print('datashape %s, %d rows, %d values' %
+          (datashape.__version__, rows, sum(lengths)))
+
+    lists, t, size = traced(lambda: [[rng.random() for i in range(n)]
+                                     for n in lengths])
+    print('list of lists        %8.3f s %10d bytes' % (t, size))
+
+    def object_array():
+        a = np.empty(rows, dtype=object)
+        a[:] = [np.array(x) for x in lists]
+        return a
+    objs, t, size = traced(object_array)
+    print('object array         %8.3f s %10d bytes' % (t, size))
+
+    ragged, t, size = traced(
+        lambda: RaggedArray.from_lists(lists, 'var * var * float64'))
+    print('ragged from lists    %8.3f s %10d bytes' % (t, size))
+    print('ragged nbytes                  %10d bytes' % ragged.nbytes)
+
+    start = time.time()
+    padded = ragged.to_padded()
+    print('ragged to padded     %8.3f s' % (time.time() - start))
+    start = time.time()
+    RaggedArray.from_padded(padded, ragged.lengths)
+    print('ragged from padded   %8.3f s' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
@@ -0,0 +1,39 @@
+"""
+Times the coercion cost between two wide record datashapes, the first
+time and once memoized.
+
+    python bench/bench_record_coercion.py [fields]
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+import time
+
+import datashape
+from datashape import coercion_cost, dshape
+
+
+def main(fields=2000):
+    types = ['int32', 'option[float32]', 'string[8]', '3 * int16',
+             '{a: int8, b: datetime}']
+    wider = ['int64', 'option[float64]', 'string', '3 * int32',
+             '{a: int16, b: datetime}']
+    a = dshape('{%s}' % ', '.join('f%d: %s' % (i, types[i % len(types)])
+                                  for i in range(fields)))
+    b = dshape('{%s}' % ', '.join('f%d: %s' % (i, wider[i % len(wider)])
+                                  for i in range(fields)))
+    print('datashape %s, %d fields' % (datashape.__version__, fields))
+
+    start = time.time()
+    cost = coercion_cost(a, b)
+    print('%-10s %10.3f ms  cost %g' % ('first', (time.time() - start) * 1e3,
+                                        cost))
+    start = time.time()
+    for _ in range(1000):
+        coercion_cost(a, b)
+    print('%-10s %10.3f ms' % ('memoized', (time.time() - start)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
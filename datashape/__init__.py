@@ -7,9 +7,18 @@ from .typesets import *
 from .type_symbol_table import *
 from .overload_resolver import *
 from .util import *
-from .coercion import coercion_cost
+from .coercion import coercion_cost, coercion_costs, coercion_path
+from .bundle import Bundle, save_bundle
+from .layout import Layout, memory_layout, view
+from .arrayfile import ArrayFile, save_array
+from .ragged import RaggedArray
+from .option import OptionArray, to_numpy_option
+from .sizing import nbytes, nbytes_many
+from .discovery import discover, discover_value, join
+from .csvfile import infer_csv, read_csv
+from .jsonfile import read_jsonl
 from .error import (DataShapeSyntaxError, OverloadError, UnificationError,
-                    CoercionError)
+                    CoercionError, LayoutError)
 
 __version__ = '0.1.1-dev'
 
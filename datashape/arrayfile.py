@@ -0,0 +1,230 @@
+"""
+A self-describing file format for fixed size arrays.
+
+An array file holds a header describing the array, followed by the raw
+array data in the C layout of its datashape (see datashape.layout), in
+little-endian byte order whatever the byte order of the host.
+Opening one maps the file and views the data in place as a NumPy array,
+so nothing is parsed or copied however large the array is. Values can
+be appended along the leading dimension without rewriting the file.
+
+The header is made of little-endian fields,
+
+    magic, format version    b'DSARRAY\\0' and 1
+    alignment, itemsize      the layout of one element of the array
+    count                    the length of the leading dimension
+    data offset, ds length   where the data starts, and the length of
+                             the element datashape string
+    datashape                the UTF-8 element datashape string, i.e.
+                             the datashape without the leading dimension
+
+and the data starts at a multiple of 64 bytes or the alignment.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import mmap
+import struct
+
+import numpy as np
+
+from . import coretypes as ct
+from .layout import memory_layout, view
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['ArrayFile', 'save_array']
+
+_MAGIC = b'DSARRAY\0'
+_VERSION = 1
+# magic, version, alignment, itemsize, count, data offset, ds length
+_header = struct.Struct('<8sIIQQQI')
+_count = struct.Struct('<Q')
+_COUNT_OFFSET = 24
+# The data offset is at least this aligned, for vectorized loads
+_DATA_ALIGNMENT = 64
+
+
+def _element_dshape(ds):
+    """Splits a datashape into its leading dimension and the rest."""
+    if not isinstance(ds, ct.DataShape) or len(ds) < 2:
+        raise ValueError('An array file needs a datashape with at least '
+                         'one dimension, not %s' % ds)
+    if not isinstance(ds[0], ct.Fixed):
+        raise ValueError('The leading dimension of %s is not fixed' % ds)
+    return ds[0].val, ct.DataShape(*ds.parameters[1:])
+
+
+def save_array(path, data, ds=None):
+    """
+    Writes an array to a new array file.
+
+    Parameters
+    ----------
+    path : str
+        The file to write.
+    data : array_like
+        The array values. Records are matched to the fields of the
+        datashape by position.
+    ds : Mono or string, optional
+        The datashape of the array, which must have at least one
+        dimension and a fixed layout. By default it is the datashape
+        of np.asarray(data).
+    """
+    if ds is None:
+        data = np.asarray(data)
+        ds = ct.from_numpy(data.shape, data.dtype)
+    elif isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    count, elem = _element_dshape(ds)
+    lay = memory_layout(elem)
+    ds_bytes = str(elem).encode('utf-8')
+    header_size = _header.size + len(ds_bytes)
+    alignment = max(_DATA_ALIGNMENT, lay.alignment)
+    data_offset = -(-header_size // alignment) * alignment
+    with open(path, 'wb') as f:
+        f.write(_header.pack(_MAGIC, _VERSION, lay.alignment, lay.itemsize,
+                             0, data_offset, len(ds_bytes)))
+        f.write(ds_bytes)
+        f.write(b'\0' * (data_offset - header_size))
+    with ArrayFile(path, 'r+') as af:
+        af.append(data, count)
+
+
+class ArrayFile(object):
+    """
+    An array file written by save_array, memory mapped.
+
+    Parameters
+    ----------
+    path : str
+        The array file to open.
+    mode : 'r' or 'r+', optional
+        With 'r+', the array is writable, and writes to it go to the
+        file, and values can be appended.
+
+    Attributes
+    ----------
+    element_dshape : DataShape
+        The datashape of one element along the leading dimension.
+    count : int
+        The length of the leading dimension.
+    array : numpy.ndarray
+        A view of the array data in the mapped file.
+    """
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'r+'):
+            raise ValueError("Array file mode must be 'r' or 'r+', not %r"
+                             % (mode,))
+        self.path = path
+        self.mode = mode
+        self._file = open(path, 'rb' if mode == 'r' else 'r+b')
+        try:
+            head = self._file.read(_header.size)
+            if len(head) < _header.size or head[:8] != _MAGIC:
+                raise ValueError('%r is not a datashape array file' % path)
+            (magic, version, alignment, itemsize, self.count,
+             self._data_offset, ds_len) = _header.unpack(head)
+            if version != _VERSION:
+                raise ValueError('Unsupported datashape array file version '
+                                 '%d in %r' % (version, path))
+            self.element_dshape = dshape(
+                self._file.read(ds_len).decode('utf-8'))
+            self._layout = memory_layout(self.element_dshape)
+            if (self._layout.itemsize, self._layout.alignment) != (itemsize,
+                                                                   alignment):
+                raise ValueError('The layout of %s in %r does not match '
+                                 'its header' % (self.element_dshape, path))
+        except Exception:
+            self._file.close()
+            raise
+        self._mm = None
+        self._map()
+
+    def _map(self):
+        # A file which only has a header can still be mapped
+        access = mmap.ACCESS_READ if self.mode == 'r' else mmap.ACCESS_WRITE
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=access)
+        self.array = view(self._mm, self.element_dshape,
+                          offset=self._data_offset, count=self.count,
+                          byteorder='<')
+
+    @property
+    def dshape(self):
+        """The datashape of the whole array."""
+        return ct.DataShape(ct.Fixed(self.count),
+                            *self.element_dshape.parameters)
+
+    def append(self, data, count=None):
+        """
+        Appends values along the leading dimension.
+
+        The data is written after the existing values, then the count
+        in the header is updated, so a reader never sees a partially
+        written value. The array attribute is replaced by a view of the
+        grown array. Views taken before remain valid, but don't grow.
+
+        Parameters
+        ----------
+        data : array_like
+            The values, shaped as count elements of element_dshape. Data
+            of another shape raises ValueError, rather than being
+            broadcast.
+        count : int, optional
+            The number of elements in data, by default len(data).
+        """
+        if self.mode != 'r+':
+            raise ValueError("Array file %r is not open for appending "
+                             "(mode 'r+')" % self.path)
+        if count is None:
+            count = len(data)
+        # Convert to the file's layout in a buffer, then write that
+        buf = bytearray(self._layout.itemsize * count)
+        values = view(buf, self.element_dshape, count=count, byteorder='<')
+        data = np.asarray(data, dtype=values.dtype)
+        if data.shape != values.shape:
+            raise ValueError('Cannot append data of shape %s as %d values '
+                             'of %s' % (data.shape, count,
+                                        self.element_dshape))
+        values[...] = data
+        f = self._file
+        f.seek(self._data_offset + self.count * self._layout.itemsize)
+        f.write(buf)
+        f.flush()
+        f.seek(_COUNT_OFFSET)
+        f.write(_count.pack(self.count + count))
+        f.flush()
+        self.count += count
+        self._release()
+        self._map()
+
+    def flush(self):
+        """Writes changes made through the array back to the file."""
+        if self.mode == 'r+':
+            self._mm.flush()
+
+    def _release(self):
+        # Arrays viewing the map keep it alive, and it is unmapped once
+        # they are gone
+        self.array = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._mm = None
+
+    def close(self):
+        """Closes the file, and unmaps it once no array views it."""
+        if self._mm is not None:
+            self.flush()
+            self._release()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return 'ArrayFile(%r, dshape="%s")' % (self.path, self.dshape)
@@ -0,0 +1,422 @@
+"""
+A compact binary file format holding a catalog of named datashapes.
+
+A bundle is written once by save_bundle, then opened with Bundle, which
+maps the file read-only and only decodes a datashape the first time it
+is looked up. Opening a bundle therefore costs the same whatever the
+size of the catalog, and any number of processes can share the pages
+of one bundle file.
+
+The file is made of little-endian 32-bit words, laid out as
+
+    header      magic, format version, the number of strings, types
+                and entries, and the byte offsets of each section
+    strings     the offset of each string in the string data, followed
+                by an end offset, then the UTF-8 string data
+    types       the offset of each type in the type data, then the type
+                data, where a type is an opcode followed by operands
+                referring to strings and other types by index
+    entries     (name, type) index pairs, sorted by the UTF-8 bytes of
+                the name so names can be found by binary search
+
+Each distinct type is stored once, so types shared within or between
+datashapes are also shared when decoded.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import mmap
+import struct
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from . import coretypes as ct
+from .py2help import unicode
+
+__all__ = ['Bundle', 'save_bundle']
+
+_MAGIC = b'DSBUNDLE'
+_VERSION = 2
+# magic, version, string/type/entry counts, section offsets
+_header = struct.Struct('<8sIIIIQQQQQ')
+_word = struct.Struct('<I')
+_pair = struct.Struct('<II')
+
+# Stands in for None and missing string or type operands
+_NONE = 0xffffffff
+
+# Type opcodes
+(_DATASHAPE, _CTYPE, _FIXED, _VAR, _ELLIPSIS, _TYPEVAR, _STRING, _RECORD,
+ _TUPLE, _FUNCTION, _OPTION, _DATE, _TIME, _DATETIME, _UNITS, _BYTES,
+ _JSON, _NULL, _TIMEDELTA, _DATETIME_UNIT) = range(20)
+
+# Types which have no parameters
+_unit_opcodes = {ct.Var: _VAR, ct.Date: _DATE, ct.Bytes: _BYTES,
+                 ct.JSON: _JSON, ct.Null: _NULL}
+_unit_types = dict((op, cls) for cls, op in _unit_opcodes.items())
+
+
+def _children(t):
+    """Returns the types a type refers to."""
+    cls = type(t)
+    if cls is ct.DataShape or cls is ct.Function:
+        return t.parameters
+    elif cls is ct.Record:
+        return t.types
+    elif cls is ct.Tuple:
+        return t.dshapes
+    elif cls is ct.Option:
+        return (t.ty,)
+    elif cls is ct.Units:
+        return (t.tp,)
+    elif cls is ct.Ellipsis and t.typevar is not None:
+        return (t.typevar,)
+    else:
+        return ()
+
+
+class _Encoder(object):
+    """Assigns indices to the strings and types written to a bundle."""
+    def __init__(self):
+        self.strings = []
+        self.string_index = {}
+        # The encoded words of each type, and the index of each type
+        # object, keyed by id since types are interned
+        self.types = []
+        self.type_index = {}
+        # Keeps the indexed types alive, so their ids stay unique
+        self.keep = []
+
+    def string(self, s):
+        if s is None:
+            return _NONE
+        s = unicode(s)
+        try:
+            return self.string_index[s]
+        except KeyError:
+            self.string_index[s] = len(self.strings)
+            self.strings.append(s)
+            return len(self.strings) - 1
+
+    def type(self, root):
+        """Encodes root and the types it refers to, returning its index."""
+        # A post-order walk with an explicit stack, so deeply nested
+        # datashapes don't hit the recursion limit
+        stack = [(root, False)]
+        while stack:
+            t, ready = stack.pop()
+            if id(t) in self.type_index:
+                continue
+            if not ready:
+                stack.append((t, True))
+                stack.extend((c, False) for c in _children(t))
+                continue
+            self.type_index[id(t)] = len(self.types)
+            self.types.append(self.encode(t))
+            self.keep.append(t)
+        return self.type_index[id(root)]
+
+    def encode(self, t):
+        """Returns the words for t, whose children are already indexed."""
+        index = self.type_index
+        cls = type(t)
+        if cls is ct.DataShape:
+            return ([_DATASHAPE, self.string(t.name), len(t.parameters)] +
+                    [index[id(p)] for p in t.parameters])
+        elif cls is ct.CType:
+            return [_CTYPE, self.string(t.name)]
+        elif cls is ct.Fixed:
+            return [_FIXED, t.val & 0xffffffff, t.val >> 32]
+        elif cls in _unit_opcodes:
+            return [_unit_opcodes[cls]]
+        elif cls is ct.Ellipsis:
+            typevar = t.typevar
+            return [_ELLIPSIS, _NONE if typevar is None else index[id(typevar)]]
+        elif cls is ct.TypeVar:
+            return [_TYPEVAR, self.string(t.symbol)]
+        elif cls is ct.String:
+            # The length plus one over two words, so any 64-bit length
+            # is distinct from 0 for none
+            n = 0 if t.fixlen is None else t.fixlen + 1
+            return [_STRING, n & 0xffffffff, n >> 32, self.string(t.encoding)]
+        elif cls is ct.Record:
+            words = [_RECORD, len(t.parameters[0])]
+            for n, ft in t.parameters[0]:
+                words.append(self.string(n))
+                words.append(index[id(ft)])
+            return words
+        elif cls is ct.Tuple:
+            return ([_TUPLE, len(t.dshapes)] +
+                    [index[id(d)] for d in t.dshapes])
+        elif cls is ct.Function:
+            return ([_FUNCTION, len(t.parameters)] +
+                    [index[id(p)] for p in t.parameters])
+        elif cls is ct.Option:
+            return [_OPTION, index[id(t.ty)]]
+        elif cls is ct.Time:
+            return [_TIME, self.string(t.tz)]
+        elif cls is ct.DateTime:
+            if t.unit == u'us':
+                return [_DATETIME, self.string(t.tz)]
+            return [_DATETIME_UNIT, self.string(t.tz), self.string(t.unit)]
+        elif cls is ct.TimeDelta:
+            return [_TIMEDELTA, self.string(t.unit)]
+        elif cls is ct.Units:
+            return [_UNITS, self.string(t.unit), index[id(t.tp)]]
+        else:
+            raise TypeError('Cannot save datashape type %r to a bundle' % t)
+
+
+def _pack_words(words):
+    return struct.pack('<%dI' % len(words), *words)
+
+
+def save_bundle(path, dshapes):
+    """
+    Writes a catalog of datashapes to a bundle file.
+
+    Parameters
+    ----------
+    path : str
+        The file to write.
+    dshapes : dict or iterable of (name, datashape) pairs
+        The datashapes to save, by name.
+    """
+    if isinstance(dshapes, Mapping):
+        dshapes = dshapes.items()
+    enc = _Encoder()
+    entries = {}
+    for name, ds in dshapes:
+        entries[unicode(name)] = enc.type(ds)
+    entries = sorted((name.encode('utf-8'), enc.string(name), t)
+                     for name, t in entries.items())
+
+    string_data = [s.encode('utf-8') for s in enc.strings]
+    string_offsets = [0]
+    for s in string_data:
+        string_offsets.append(string_offsets[-1] + len(s))
+    string_data = b''.join(string_data)
+    # Pad to keep the following sections aligned
+    string_data += b'\0' * (-len(string_data) % 4)
+
+    type_offsets = [0]
+    for words in enc.types:
+        type_offsets.append(type_offsets[-1] + 4 * len(words))
+    type_data = b''.join(_pack_words(words) for words in enc.types)
+
+    strings_off = _header.size
+    string_data_off = strings_off + 4 * len(string_offsets)
+    types_off = string_data_off + len(string_data)
+    type_data_off = types_off + 4 * len(enc.types)
+    entries_off = type_data_off + len(type_data)
+    with open(path, 'wb') as f:
+        f.write(_header.pack(_MAGIC, _VERSION, len(enc.strings),
+                             len(enc.types), len(entries),
+                             strings_off, string_data_off, types_off,
+                             type_data_off, entries_off))
+        f.write(_pack_words(string_offsets))
+        f.write(string_data)
+        f.write(_pack_words(type_offsets[:-1]))
+        f.write(type_data)
+        f.write(b''.join(_pair.pack(s, t) for key, s, t in entries))
+
+
+class Bundle(Mapping):
+    """
+    A read-only mapping from names to the datashapes of a bundle file
+    written by save_bundle.
+
+    The file is memory mapped, and each datashape is decoded from it
+    the first time it is looked up.
+
+    Parameters
+    ----------
+    path : str
+        The bundle file to open.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = _header.unpack_from(self._mm, 0)
+        except struct.error:
+            header = (None,)
+        if header[0] != _MAGIC:
+            self._mm.close()
+            raise ValueError('%r is not a datashape bundle' % path)
+        if header[1] != _VERSION:
+            self._mm.close()
+            raise ValueError('Unsupported datashape bundle version %d in %r'
+                             % (header[1], path))
+        (self._nstrings, self._ntypes, self._nentries, self._strings_off,
+         self._string_data_off, self._types_off, self._type_data_off,
+         self._entries_off) = header[2:]
+        # The strings and types decoded so far, by index
+        self._strings = {}
+        self._types = {}
+
+    def close(self):
+        """Unmaps the bundle file."""
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _word(self, offset):
+        return _word.unpack_from(self._mm, offset)[0]
+
+    def _string_bytes(self, i):
+        start, end = _pair.unpack_from(self._mm, self._strings_off + 4 * i)
+        return self._mm[self._string_data_off + start:
+                        self._string_data_off + end]
+
+    def _string(self, i):
+        if i == _NONE:
+            return None
+        try:
+            return self._strings[i]
+        except KeyError:
+            s = self._strings[i] = self._string_bytes(i).decode('utf-8')
+            return s
+
+    def _entry(self, i):
+        return _pair.unpack_from(self._mm, self._entries_off + 8 * i)
+
+    def _type_words(self, i):
+        """Returns the opcode and operands of type i."""
+        offset = self._type_data_off + self._word(self._types_off + 4 * i)
+        op = self._word(offset)
+        if op in (_DATASHAPE, _RECORD, _TUPLE, _FUNCTION):
+            # Counted lists of operands
+            nfixed = 2 if op == _DATASHAPE else 1
+            head = struct.unpack_from('<%dI' % nfixed, self._mm, offset + 4)
+            n = head[-1] * (2 if op == _RECORD else 1)
+            return (op,) + head + struct.unpack_from('<%dI' % n, self._mm,
+                                                     offset + 4 + 4 * nfixed)
+        nargs = {_CTYPE: 1, _FIXED: 2, _ELLIPSIS: 1, _TYPEVAR: 1,
+                 _STRING: 3, _OPTION: 1, _TIME: 1, _DATETIME: 1,
+                 _UNITS: 2, _TIMEDELTA: 1, _DATETIME_UNIT: 2}.get(op, 0)
+        return (op,) + struct.unpack_from('<%dI' % nargs, self._mm, offset + 4)
+
+    def _type_children(self, words):
+        op = words[0]
+        if op == _DATASHAPE:
+            return words[3:]
+        elif op == _RECORD:
+            return words[3::2]
+        elif op == _TUPLE or op == _FUNCTION:
+            return words[2:]
+        elif op == _OPTION:
+            return words[1:]
+        elif op == _UNITS:
+            return words[2:]
+        elif op == _ELLIPSIS and words[1] != _NONE:
+            return words[1:]
+        return ()
+
+    def _build(self, words):
+        """Builds a type, once the types it refers to are decoded."""
+        op = words[0]
+        types = self._types
+        if op == _DATASHAPE:
+            name = self._string(words[1])
+            params = [types[i] for i in words[3:]]
+            if name is None:
+                return ct.DataShape(*params)
+            return ct.DataShape(*params, name=name)
+        elif op == _CTYPE:
+            t = ct.Type.lookup_type(self._string(words[1]))
+            if type(t) is not ct.CType:
+                raise ValueError('%r is not a registered ctype'
+                                 % self._string(words[1]))
+            return t
+        elif op == _FIXED:
+            return ct.Fixed(words[1] | (words[2] << 32))
+        elif op in _unit_types:
+            return _unit_types[op]()
+        elif op == _ELLIPSIS:
+            return ct.Ellipsis(None if words[1] == _NONE else types[words[1]])
+        elif op == _TYPEVAR:
+            return ct.TypeVar(self._string(words[1]))
+        elif op == _STRING:
+            n = words[1] | words[2] << 32
+            if n == 0:
+                return ct.String(self._string(words[3]))
+            return ct.String(n - 1, self._string(words[3]))
+        elif op == _RECORD:
+            return ct.Record([(self._string(words[i]), types[words[i + 1]])
+                              for i in range(2, len(words), 2)])
+        elif op == _TUPLE:
+            return ct.Tuple([types[i] for i in words[2:]])
+        elif op == _FUNCTION:
+            return ct.Function(*[types[i] for i in words[2:]])
+        elif op == _OPTION:
+            return ct.Option(types[words[1]])
+        elif op == _TIME:
+            return ct.Time(self._string(words[1]))
+        elif op == _DATETIME:
+            return ct.DateTime(self._string(words[1]))
+        elif op == _DATETIME_UNIT:
+            return ct.DateTime(self._string(words[1]),
+                               self._string(words[2]))
+        elif op == _TIMEDELTA:
+            return ct.TimeDelta(self._string(words[1]))
+        elif op == _UNITS:
+            return ct.Units(self._string(words[1]), types[words[2]])
+        else:
+            raise ValueError('Invalid opcode %d in datashape bundle' % op)
+
+    def _type(self, index):
+        """Decodes a type, and any types it refers to not yet decoded."""
+        types = self._types
+        stack = [(index, None)]
+        while stack:
+            i, words = stack.pop()
+            if i in types:
+                continue
+            if words is None:
+                words = self._type_words(i)
+                stack.append((i, words))
+                stack.extend((c, None) for c in self._type_children(words)
+                             if c not in types)
+            else:
+                types[i] = self._build(words)
+        return types[index]
+
+    def _find(self, name):
+        """Binary searches the entries for name, returning its type index."""
+        key = unicode(name).encode('utf-8')
+        lo, hi = 0, self._nentries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            s, t = self._entry(mid)
+            mid_key = self._string_bytes(s)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return t
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        return self._type(self._find(name))
+
+    def __contains__(self, name):
+        try:
+            self._find(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for i in range(self._nentries):
+            yield self._string(self._entry(i)[0])
+
+    def __len__(self):
+        return self._nentries
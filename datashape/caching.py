@@ -0,0 +1,106 @@
+"""
+Bounded memoization helpers shared by the datashape caches.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+from collections import namedtuple, OrderedDict
+
+__all__ = ['CacheInfo', 'LRUCache']
+
+CacheInfo = namedtuple('CacheInfo',
+                       'hits, misses, evictions, maxsize, currsize')
+
+
+class LRUCache(object):
+    """
+    A thread-safe, bounded, least recently used mapping with hit, miss
+    and eviction counters.
+
+    Parameters
+    ----------
+    maxsize : int
+        The maximum number of entries held. A maxsize of 0 disables
+        the cache, so every lookup is a miss and nothing is stored.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._maxsize = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resize(maxsize)
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def resize(self, maxsize):
+        """
+        Changes the maximum number of entries, evicting the least
+        recently used ones if the cache is now over its bound.
+        """
+        maxsize = int(maxsize)
+        if maxsize < 0:
+            raise ValueError('Cache size must be nonnegative, not %d' %
+                             maxsize)
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, marking it as the most
+        recently used entry, or default if it is not present.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Stores value for key, evicting the oldest entry if needed."""
+        with self._lock:
+            if self._maxsize == 0:
+                return
+            self._data.pop(key, None)
+            self._data[key] = value
+            self._evict()
+
+    def discard(self, predicate):
+        """Removes every entry whose key satisfies predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """Returns a CacheInfo snapshot of the counters."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self._maxsize, len(self._data))
+
+    def _evict(self):
+        # Must be called with the lock held
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
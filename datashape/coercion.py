@@ -7,73 +7,188 @@ to figure out whether this is possible in the face of polymorphic overloads.
 
 from __future__ import absolute_import, division, print_function
 
-from collections import defaultdict
+import numpy as np
 
+from .caching import LRUCache
 from .error import CoercionError
 from .coretypes import CType, TypeVar, Mono
 from .typesets import complexes, floating, signed, unsigned
 from .coretypes import Implements, Fixed, Var, DataShape
+from .coretypes import (DateTime, Option, Record, String, Tuple,
+                        _datetime_units)
 from . import coretypes
 
 inf = float('inf')
 
 
 class CoercionTable(object):
-    """Table to hold coercion rules"""
+    """
+    Table to hold coercion rules.
+
+    Each CType in a rule gets a small integer id, and the rules are kept
+    as a dense matrix of costs between ids, with inf where there is no
+    rule. The cost of a coercion is that of the cheapest chain of rules,
+    found for all pairs at once by the Floyd-Warshall algorithm the
+    first time a cost is looked up after rules have changed. The first
+    step of each cheapest chain is kept alongside, in a matrix of next
+    hops, so the chain itself can be followed.
+    """
 
     def __init__(self):
-        self.table = {}
-        self.srcs = defaultdict(set)
-        self.dsts = defaultdict(set)
-
-    def _reflexivity(self, a):
-        if (a, a) not in self.table:
-            self.table[a, a] = 0
+        self.ids = {}
+        # Types are hash-consed, so ids are found by identity before
+        # falling back to CType's slower equality
+        self._ids_by_identity = {}
+        self.types = []
+        self._rules = np.zeros((0, 0))
+        self._direct = []
+        self._costs = None
+        self._next = None
+        self._rows = None
+        self._padded = None
+        self._paths = {}
+
+    def type_id(self, t):
+        """Returns the id of a CType, giving it one if it has none."""
+        i = self.ids.get(t)
+        if i is None:
+            i = self.ids[t] = self._ids_by_identity[id(t)] = len(self.types)
+            self.types.append(t)
+            n = len(self.types)
+            rules = np.full((n, n), inf)
+            rules[:-1, :-1] = self._rules
+            rules[i, i] = 0
+            self._rules = rules
+        return i
 
     def add_coercion(self, src, dst, cost, transitive=True):
         """
-        Add a coercion rule
+        Add a coercion rule. Rules which are not transitive are only
+        used on their own, never in a chain with other rules.
         """
         assert cost >= 0, 'Raw coercion costs must be nonnegative'
-        if (src, dst) not in self.table:
-            self.srcs[dst].add(src)
-            self.dsts[src].add(dst)
-            self._reflexivity(src)
-            self._reflexivity(dst)
-            if src != dst:
-                self.table[src, dst] = cost
-                if transitive:
-                    transitivity(src, dst, self)
+        i, j = self.type_id(src), self.type_id(dst)
+        if transitive:
+            self._rules[i, j] = min(self._rules[i, j], cost)
         else:
-            # Add the cost for the shortest path for the coercion
-            self.table[src, dst] = min(self.table[src, dst], cost)
+            self._direct.append((i, j, cost))
+        self._costs = self._next = self._rows = self._padded = None
+        self._paths = {}
+
+    def _close(self):
+        """Finds the cheapest chains of rules between all type ids."""
+        costs = self._rules.copy()
+        n = len(costs)
+        # The type id after the first step from i towards j, or -1
+        hops = np.where(np.isfinite(costs), np.arange(n), -1)
+        for k in range(n):
+            through = costs[:, k, None] + costs[None, k, :]
+            better = through < costs
+            costs[better] = through[better]
+            hops[better] = np.broadcast_to(hops[:, k, None], (n, n))[better]
+        for i, j, cost in self._direct:
+            if cost < costs[i, j]:
+                costs[i, j] = cost
+                hops[i, j] = j
+        self._costs, self._next = costs, hops
+
+    @property
+    def costs(self):
+        """The matrix of the cheapest coercion costs between type ids."""
+        if self._costs is None:
+            self._close()
+        return self._costs
+
+    @property
+    def next_hops(self):
+        """
+        The matrix of the type id reached by the first step of the
+        cheapest coercion between type ids, or -1 where there is none.
+        """
+        if self._next is None:
+            self._close()
+        return self._next
 
     def coercion_cost(self, src, dst):
         """
-        Determine a coercion cost for coercing type `a` to type `b`
+        Determine a coercion cost for coercing type `a` to type `b`,
+        raising KeyError if there is none.
+        """
+        if self._rows is None:
+            # Indexing lists of floats is quicker than indexing NumPy
+            # for one value at a time
+            self._rows = self.costs.tolist()
+        by_identity = self._ids_by_identity
+        i = by_identity.get(id(src))
+        if i is None:
+            i = self.ids[src]
+        j = by_identity.get(id(dst))
+        if j is None:
+            j = self.ids[dst]
+        cost = self._rows[i][j]
+        if cost == inf:
+            raise KeyError((src, dst))
+        return cost
+
+    def type_ids(self, types):
+        """
+        Returns the ids of a sequence of types as an array, with -1 for
+        each type not in the table.
         """
-        return self.table[src, dst]
+        by_identity, ids = self._ids_by_identity, self.ids
+        result = np.empty(len(types), dtype=np.intp)
+        for k, t in enumerate(types):
+            i = by_identity.get(id(t))
+            if i is None:
+                try:
+                    i = ids.get(t, -1)
+                except TypeError:
+                    # Unhashable, so not in the table
+                    i = -1
+            result[k] = i
+        return result
+
+    def costs_by_id(self, src_ids, dst_ids):
+        """
+        Returns the coercion costs between arrays of type ids, with inf
+        where there is no coercion or an id is -1.
+        """
+        costs = self.costs
+        if self._padded is None:
+            # An extra row and column of inf, which the id -1 indexes
+            n = len(costs)
+            self._padded = np.full((n + 1, n + 1), inf)
+            self._padded[:n, :n] = costs
+        return self._padded[src_ids, dst_ids]
+
+    def coercion_path(self, src, dst):
+        """
+        Returns the cheapest chain of coercions from type `src` to type
+        `dst`, as a tuple of the types from src to dst, raising KeyError
+        if there is none. Paths are cached until rules change.
+        """
+        by_identity = self._ids_by_identity
+        key = (by_identity.get(id(src)), by_identity.get(id(dst)))
+        if None in key:
+            key = (self.ids[src], self.ids[dst])
+        path = self._paths.get(key)
+        if path is None:
+            i, j = key
+            hops = self.next_hops
+            if hops[i, j] < 0:
+                raise KeyError((src, dst))
+            path = [i]
+            while i != j:
+                i = int(hops[i, j])
+                path.append(i)
+            path = self._paths[key] = tuple(self.types[k] for k in path)
+        return path
 
 
 _table = CoercionTable()
 add_coercion = _table.add_coercion
 coercion_cost_table = _table.coercion_cost
-
-#------------------------------------------------------------------------
-# Coercion invariants
-#------------------------------------------------------------------------
-
-def transitivity(a, b, table=_table):
-    """Enforce coercion rule transitivity"""
-    # (src, a) in R and (a, b) in R => (src, b) in R
-    for src in table.srcs[a]:
-        table.add_coercion(src, b, table.coercion_cost(src, a) +
-                                   table.coercion_cost(a, b))
-
-    # (a, b) in R and (b, dst) in R => (a, dst) in R
-    for dst in table.dsts[b]:
-        table.add_coercion(a, dst, table.coercion_cost(a, b) +
-                                   table.coercion_cost(b, dst))
+coercion_path_table = _table.coercion_path
 
 #------------------------------------------------------------------------
 # Coercion function
@@ -130,6 +245,11 @@ def dtype_coercion_cost(src, dst):
             return coercion_cost_table(src, dst)
         except KeyError:
             return inf
+    elif _is_structural(src, dst):
+        try:
+            return _structural_coercion_cost(src, dst)
+        except CoercionError:
+            return inf
     else:
         return inf
 
@@ -150,6 +270,57 @@ def coercion_cost(a, b, seen=None):
     return _coercion_cost(_strip_datashape(a), _strip_datashape(b), seen)
 
 
+def coercion_costs(srcs, dsts):
+    """
+    Determine the coercion costs from each type in `srcs` to the type at
+    the same position in `dsts`, as a float64 array, with inf for pairs
+    which can't be coerced.
+
+    Pairs of scalar types are looked up in the coercion table all at
+    once by their integer type ids. Other pairs get the cost
+    coercion_cost gives them.
+
+    >>> from datashape import dshapes
+    >>> coercion_costs(dshapes('int8', 'float32', '2 * int32'),
+    ...                dshapes('int16', 'int32', '3 * 2 * int64'))
+    array([1. , inf, 1.2])
+    """
+    srcs = [_strip_datashape(a) for a in srcs]
+    dsts = [_strip_datashape(b) for b in dsts]
+    if len(srcs) != len(dsts):
+        raise ValueError('Expected as many destination types as source '
+                         'types, not %d and %d' % (len(dsts), len(srcs)))
+    src_ids = _table.type_ids(srcs)
+    dst_ids = _table.type_ids(dsts)
+    costs = _table.costs_by_id(src_ids, dst_ids)
+    for k in np.nonzero((src_ids < 0) | (dst_ids < 0))[0]:
+        try:
+            costs[k] = _coercion_cost(srcs[k], dsts[k])
+        except (CoercionError, TypeError):
+            pass
+    return costs
+
+
+def coercion_path(a, b):
+    """
+    Determine the cheapest chain of coercions from scalar type `a` to
+    type `b`, as a tuple of the types from `a` to `b`.
+
+    >>> from datashape import dshape
+    >>> coercion_path(dshape('uint8'), dshape('float32'))
+    (ctype("uint8"), ctype("int16"), ctype("float32"))
+    """
+    a, b = _strip_datashape(a), _strip_datashape(b)
+    if a == b:
+        return (a,)
+    elif isinstance(a, CType) and isinstance(b, CType):
+        try:
+            return coercion_path_table(a, b)
+        except KeyError:
+            pass
+    raise CoercionError(a, b)
+
+
 def _coercion_cost(a, b, seen=None):
     # TODO: Cost functions for conversion between type constructors in the
     # lattice (implement a "type join")
@@ -190,11 +361,132 @@ def _coercion_cost(a, b, seen=None):
     elif isinstance(a, DataShape) and isinstance(b, DataShape):
         return (dimlist_coercion_cost(a[:-1], b[:-1]) +
                 dtype_coercion_cost(a[-1], b[-1]))
+    elif _is_structural(a, b):
+        return _structural_coercion_cost(a, b, seen)
     else:
         raise TypeError(('Unhandled coercion cost case of ' +
                          '%s and %s') % (a, b))
 
 
+#------------------------------------------------------------------------
+# Structural coercions
+#------------------------------------------------------------------------
+
+# Costs between types built of other types, keyed by the ids of the two
+# types, which are held in the values so the ids stay theirs. None
+# marks pairs with no coercion.
+_structural_cache = LRUCache(4096)
+
+
+def _is_structural(a, b):
+    """Whether the cost of coercing a to b depends on their structure."""
+    return isinstance(a, Option) or isinstance(b, Option) or (
+        type(a) is type(b) and isinstance(a, (Record, Tuple, String,
+                                              DateTime)))
+
+
+def _structural_coercion_cost(a, b, seen=None):
+    """
+    Cost of coercing one record, tuple, string, datetime or option type
+    to another, raising CoercionError if there is none. Costs between
+    concrete types are memoized.
+    """
+    if not (a.is_concrete and b.is_concrete):
+        # Type variables make the cost depend on seen
+        return _structural_cost(a, b, seen)
+    key = (id(a), id(b))
+    cached = _structural_cache.get(key)
+    if cached is None:
+        try:
+            cost = _structural_cost(a, b, seen)
+        except CoercionError:
+            cost = None
+        cached = (a, b, cost)
+        _structural_cache.put(key, cached)
+    if cached[2] is None:
+        raise CoercionError(a, b)
+    return cached[2]
+
+
+def _structural_cost(a, b, seen):
+    if isinstance(b, Option):
+        # A value may always become optional, but an optional value
+        # can't lose its option
+        if isinstance(a, Option):
+            return coercion_cost(a.ty, b.ty, seen)
+        return 0.1 + coercion_cost(a, b.ty, seen)
+    elif isinstance(a, Record):
+        # Fields are matched by name, as record equality does
+        fields = b.fields
+        if len(a.names) != len(fields) or not all(name in fields
+                                                   for name in a.names):
+            raise CoercionError(a, b)
+        return sum(coercion_cost(t, fields[name], seen)
+                   for name, t in zip(a.names, a.types))
+    elif isinstance(a, Tuple):
+        if len(a.dshapes) != len(b.dshapes):
+            raise CoercionError(a, b)
+        return sum(coercion_cost(x, y, seen)
+                   for x, y in zip(a.dshapes, b.dshapes))
+    elif isinstance(a, String):
+        return _string_coercion_cost(a, b)
+    elif isinstance(a, DateTime):
+        if a.tz == b.tz:
+            cost = 0
+        elif a.tz is not None and b.tz is not None:
+            # The same instant in another time zone
+            cost = 0.1
+        else:
+            # Taking a naive datetime to be in a time zone, or dropping it
+            cost = 1
+        if a.unit != b.unit:
+            # A finer unit holds every value exactly, if its range is
+            # wide enough, and a coarser one truncates them
+            finer = (_datetime_units.index(b.unit) >
+                     _datetime_units.index(a.unit))
+            cost += 0.1 if finer and b.unit in _wide_datetime_units else 1
+        return cost
+    raise CoercionError(a, b)
+
+
+# The datetime units whose int64 counts span hundreds of thousands of
+# years around 1970. Nanoseconds span only 1678 to 2262, and finer units
+# less, so values of coarser units may overflow them.
+_wide_datetime_units = frozenset([u'h', u'm', u's', u'ms', u'us'])
+
+# The most code units of each encoding one character takes
+_max_code_units = {u'A': 1, u'U8': 4, u'U16': 2, u'U32': 1}
+
+
+def _string_coercion_cost(a, b):
+    """
+    Cost of coercing one string type to another. Strings may be
+    lengthened, or made variable length, and ASCII ones given a Unicode
+    encoding, while Unicode strings may change encoding. A fixed length
+    destination must hold every string of the source, which in another
+    encoding may take up to four code units per character of the
+    source's length.
+    """
+    cost = 0
+    if a.encoding != b.encoding:
+        if b.encoding == u'A':
+            raise CoercionError(a, b)
+        cost += 0.1 if a.encoding == u'A' else 0.2
+    if a.fixlen != b.fixlen or a.encoding != b.encoding:
+        if a.fixlen is None and b.fixlen is not None:
+            raise CoercionError(a, b)
+        if b.fixlen is not None:
+            # Each code unit of the source is at most one character
+            needed = a.fixlen
+            if a.encoding != b.encoding and a.encoding != u'A':
+                needed *= _max_code_units[b.encoding]
+            if b.fixlen < needed:
+                raise CoercionError(a, b)
+        if a.fixlen != b.fixlen:
+            cost += 0.1
+    return cost
+
+
 def termsize(term):
     """Determine the size of a type term"""
     if isinstance(term, Mono):
@@ -8,11 +8,16 @@ shape and data type.
 
 import ctypes
 import datetime
+import hashlib
 import operator
+import struct
+import weakref
+from collections import namedtuple
 
 import numpy as np
 
-from .py2help import _inttypes, _strtypes, unicode
+from .caching import LRUCache
+from .py2help import _inttypes, _strtypes, unicode, with_metaclass
 
 
 # Classes of unit types.
@@ -20,16 +25,255 @@ DIMENSION = 1
 MEASURE = 2
 
 
+# Hash-consing table holding a weak reference to every live interned
+# type, so structurally identical types are shared. Each reference is
+# both key and value, and compares by the intern keys of the types, so
+# entries don't keep the keys themselves.
+_intern_table = {}
+
+
+def _drop_interned(ref, table=_intern_table):
+    # Called when an interned type dies. A dead reference only compares
+    # equal to itself, so this drops exactly its own entry.
+    table.pop(ref, None)
+
+
+class _InternRef(weakref.ref):
+    """
+    A weak reference to a type in the intern table, hashing and
+    comparing as the type's intern key. The key is kept only while
+    looking the type up, and computed again to compare with an entry.
+    """
+    __slots__ = ('_hash', '_key')
+
+    def __new__(cls, obj, key):
+        self = weakref.ref.__new__(cls, obj, _drop_interned)
+        self._hash = hash(key)
+        self._key = key
+        return self
+
+    # weakref.ref.__init__ only checks it gets an object and at most one
+    # other argument, so it is kept as is, one call less per type built
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        a, b = self(), other()
+        if a is None or b is None:
+            return False
+        return ((a._intern_key() if self._key is None else self._key) ==
+                (b._intern_key() if other._key is None else other._key))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def _intern(obj):
+    """
+    Returns the live type structurally identical to obj, or obj itself
+    after adding it to the intern table.
+    """
+    try:
+        key = obj._intern_key()
+        if key is None:
+            return obj
+        ref = _InternRef(obj, key)
+    except TypeError:
+        # Unhashable parameters, leave the object uninterned
+        return obj
+    while True:
+        found = _intern_table.setdefault(ref, ref)
+        if found is ref:
+            ref._key = None
+            return obj
+        t = found()
+        if t is not None:
+            return t
+        # The type found died since, and its entry is being dropped
+
+
+def _param_key(p):
+    """
+    The interning key of a type parameter. Type objects are keyed by
+    identity: they are themselves interned, and the parent keeps them
+    alive for as long as its own entry exists.
+    """
+    if isinstance(p, Mono):
+        return id(p)
+    elif isinstance(p, (tuple, list)):
+        return (type(p), tuple(_param_key(x) for x in p))
+    else:
+        # Include the type so that e.g. 1, 1.0 and True stay distinct
+        hash(p)
+        return (type(p), p)
+
+
+# 128-bit digests for Mono.fingerprint
+if hasattr(hashlib, 'blake2b'):
+    def _new_fingerprint_hash():
+        return hashlib.blake2b(digest_size=16)
+else:
+    # Python versions without blake2b
+    _new_fingerprint_hash = hashlib.md5
+
+
+def _type_params(p):
+    """Yields the type objects in a type's parameters."""
+    for x in p:
+        if isinstance(x, Mono):
+            yield x
+        elif isinstance(x, (tuple, list)):
+            for t in _type_params(x):
+                yield t
+
+
+def _hash_fingerprint_param(h, p):
+    """
+    Feeds a type parameter into the fingerprint digest h, in an
+    unambiguous encoding which doesn't depend on the process.
+    """
+    if isinstance(p, Mono):
+        h.update(b'T')
+        h.update(p._fingerprint)
+    elif p is None:
+        h.update(b'N')
+    elif isinstance(p, bool):
+        h.update(b'B1' if p else b'B0')
+    elif isinstance(p, _inttypes):
+        h.update(('I%d;' % p).encode('ascii'))
+    elif isinstance(p, _strtypes):
+        b = unicode(p).encode('utf-8')
+        h.update(b'S' + struct.pack('<Q', len(b)))
+        h.update(b)
+    elif isinstance(p, (tuple, list)):
+        h.update(('(%d;' % len(p)).encode('ascii'))
+        for x in p:
+            _hash_fingerprint_param(h, x)
+    else:
+        raise TypeError('Cannot fingerprint type parameter %r' % (p,))
+
+
+def _compute_fingerprint(root):
+    # Fingerprints are computed bottom up, each from those of the types
+    # in its parameters, with an explicit stack so deeply nested types
+    # don't hit the recursion limit
+    stack = [root]
+    while stack:
+        t = stack[-1]
+        params = t._fingerprint_parameters()
+        missing = [x for x in _type_params(params)
+                   if not _has_fingerprint(x)]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        if not _has_fingerprint(t):
+            h = _new_fingerprint_hash()
+            h.update(type(t).__name__.encode('ascii'))
+            _hash_fingerprint_param(h, params)
+            t._fingerprint = h.digest()
+    return root._fingerprint
+
+
+def _has_fingerprint(t):
+    try:
+        t._fingerprint
+        return True
+    except AttributeError:
+        return False
+
+
+# Structural properties of a type, computed once and kept in Mono._meta
+_TypeMeta = namedtuple('_TypeMeta',
+                       'ndim, has_var, has_ellipsis, free, is_concrete')
+
+
+def _compute_meta(root):
+    # Like fingerprints, computed bottom up with an explicit stack from
+    # the metadata of the types in the parameters
+    stack = [root]
+    while stack:
+        t = stack[-1]
+        children = list(_type_params(t.parameters))
+        missing = [x for x in children if not hasattr(x, '_meta')]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        if hasattr(t, '_meta'):
+            continue
+        metas = [x._meta for x in children]
+        if isinstance(t, TypeVar):
+            free = (t,)
+        elif isinstance(t, Unit):
+            free = ()
+        else:
+            # Only types directly in the parameters contribute, matching
+            # the original definition of free()
+            free = tuple(v for x in t.parameters if isinstance(x, Mono)
+                         for v in x._meta.free)
+        t._meta = _TypeMeta(
+            len(t.shape),
+            isinstance(t, (Var, Ellipsis)) or any(m.has_var for m in metas),
+            isinstance(t, Ellipsis) or any(m.has_ellipsis for m in metas),
+            free,
+            not t._symbolic and all(m.is_concrete for m in metas))
+    return root._meta
+
+
+# The attributes of types holding values computed from the others when
+# first needed, which may be set once after construction
+_cached_attrs = frozenset(['_fingerprint', '_meta', '_layout', '_fdict',
+                           '_hash'])
+# The attributes of types which pickles leave out, including the cached
+# values, as hashes differ between processes
+_unpickled_attrs = _cached_attrs | frozenset(['_frozen', '__weakref__',
+                                              '__dict__'])
+
+
+def _finish_type(obj):
+    """
+    Freezes a newly built type and returns it interned. A named
+    DataShape is registered under its name only then, so the registry
+    holds the datashape which is kept, not one discarded for an equal
+    live one.
+    """
+    object.__setattr__(obj, '_frozen', True)
+    obj = _intern(obj)
+    if isinstance(obj, DataShape) and obj.name:
+        Type._registry[obj.name] = obj
+    return obj
+
+
+def _unpickle_type(cls, state):
+    """Rebuilds a pickled type, interning it as Type.__call__ does."""
+    obj = object.__new__(cls)
+    for name, value in state.items():
+        object.__setattr__(obj, name, value)
+    return _finish_type(obj)
+
+
 class Type(type):
     _registry = {}
 
     def __new__(meta, name, bases, dct):
-        cls = type(name, bases, dct)
+        cls = type.__new__(meta, name, bases, dct)
         # Don't register abstract classes
         if not dct.get('abstract'):
             Type._registry[name] = cls
         return cls
 
+    def __call__(cls, *args, **kwargs):
+        obj = cls.__new__(cls)
+        # Set up front, so __setattr__ finds it without a failed lookup
+        object.__setattr__(obj, '_frozen', False)
+        obj.__init__(*args, **kwargs)
+        # Constructed, so its attributes can no longer be set
+        return _finish_type(obj)
+
     @classmethod
     def register(cls, name, type):
         # Don't clobber existing types.
@@ -44,20 +288,110 @@ class Type(type):
         return cls._registry[name]
 
 
-class Mono(object):
+class Mono(with_metaclass(Type, object)):
     """
     Monotype are unqualified 0 parameters.
 
     Each type must be reconstructable using its parameters:
 
         type(datashape_type)(*type.parameters)
+
+    Types are immutable and hash-consed, so constructing a type which
+    is structurally identical to a live one returns that same object.
     """
+    __slots__ = ('parameters', '_fingerprint', '_meta', '_layout',
+                 '_frozen', '__weakref__')
     composite = False
-    __metaclass__ = Type
+    # Whether the type stands for an unknown type, see is_concrete
+    _symbolic = False
 
     def __init__(self, *params):
         self.parameters = params
 
+    def __setattr__(self, name, value):
+        # A type is shared by everything holding an equal one, so once
+        # constructed only its cached values may be set, and only once.
+        # Threads may race to fill a cache, so setting one again to an
+        # equal value keeps the first.
+        if getattr(self, '_frozen', False):
+            if name not in _cached_attrs:
+                raise AttributeError('cannot set attribute %r of %s, types '
+                                     'are immutable' %
+                                     (name, type(self).__name__))
+            try:
+                old = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+            else:
+                if old == value:
+                    return
+                raise AttributeError('cannot set attribute %r of %s, types '
+                                     'are immutable' %
+                                     (name, type(self).__name__))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('cannot delete attribute %r of %s, types '
+                                 'are immutable' % (name, type(self).__name__))
+        object.__delattr__(self, name)
+
+    def __reduce__(self):
+        # Pickles the attributes, without the values cached from them,
+        # so the type unpickled in another process is interned there
+        state = dict(getattr(self, '__dict__', ()))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in _unpickled_attrs and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return (_unpickle_type, (type(self), state))
+
+    def _intern_key(self):
+        """
+        The key under which this type is interned, or None if it
+        should not be interned.
+        """
+        return (type(self), _param_key(self.parameters))
+
+    def _fingerprint_parameters(self):
+        """The parameters which determine the type's fingerprint."""
+        return self.parameters
+
+    @property
+    def fingerprint(self):
+        """
+        A 128-bit structural fingerprint of the type, as 16 bytes.
+
+        Unlike hash(), it is the same in every process, so it can key
+        caches which are shared between processes or kept on disk.
+        Types with the same structure, including the order of record
+        fields, have the same fingerprint. It is computed on first use
+        and stored on the type.
+        """
+        try:
+            return self._fingerprint
+        except AttributeError:
+            return _compute_fingerprint(self)
+
+    @property
+    def ndim(self):
+        """The number of dimensions, len(self.shape)."""
+        try:
+            return self._meta.ndim
+        except AttributeError:
+            return _compute_meta(self).ndim
+
+    @property
+    def is_concrete(self):
+        """
+        Whether the type is fully specified, containing no type
+        variables, ellipses or type sets anywhere within it.
+        """
+        try:
+            return self._meta.is_concrete
+        except AttributeError:
+            return _compute_meta(self).is_concrete
+
     @property
     def shape(self):
         return ()
@@ -101,6 +435,7 @@ class Unit(Mono):
     """
     Unit type that does not need to be reconstructed.
     """
+    __slots__ = ()
 
 
 class Ellipsis(Mono):
@@ -112,6 +447,8 @@ class Ellipsis(Mono):
         A... * float32   # float32 array w/ any number of dimensions,
                         # associated with type variable A
     """
+    __slots__ = ()
+    _symbolic = True
 
     def __init__(self, typevar=None):
         self.parameters = (typevar,)
@@ -142,6 +479,8 @@ class Null(Unit):
     """
     The null datashape.
     """
+    __slots__ = ()
+
     def __str__(self):
         return expr_string('null', None)
 
@@ -155,12 +494,16 @@ class IntegerConstant(Unit):
         1, int32   # 1 is Fixed
 
     """
+    __slots__ = ()
     cls = None
 
     def __init__(self, i):
         assert isinstance(i, _inttypes)
         self.parameters = (i,)
-        self.val = i
+
+    @property
+    def val(self):
+        return self.parameters[0]
 
     def __str__(self):
         return str(self.val)
@@ -184,11 +527,15 @@ class StringConstant(Unit):
     ::
         string(3, "utf-8")   # "utf-8" is StringConstant
     """
+    __slots__ = ()
 
     def __init__(self, i):
         assert isinstance(i, _strtypes)
         self.parameters = (i,)
-        self.val = i
+
+    @property
+    def val(self):
+        return self.parameters[0]
 
     def __str__(self):
         return repr(self.val)
@@ -207,6 +554,7 @@ class StringConstant(Unit):
 
 class Date(Unit):
     """ Date type """
+    __slots__ = ()
     cls = MEASURE
 
     def __str__(self):
@@ -218,15 +566,19 @@ class Date(Unit):
 
 class Time(Unit):
     """ Time type """
+    __slots__ = ()
     cls = MEASURE
 
     def __init__(self, tz=None):
         if tz is not None and not isinstance(tz, _strtypes):
             raise ValueError('tz parameter to time datashape must be a string')
         # TODO validate against Olson tz database
-        self.tz = tz
         self.parameters = (tz,)
 
+    @property
+    def tz(self):
+        return self.parameters[0]
+
     def __str__(self):
         if self.tz is None:
             return 'time'
@@ -237,30 +589,95 @@ class Time(Unit):
         return isinstance(other, Time) and self.tz == other.tz
 
 
+# The units of NumPy's datetime64 finer than a day, from the coarsest.
+# Coarser units are dates.
+_datetime_units = (u'h', u'm', u's', u'ms', u'us', u'ns', u'ps', u'fs',
+                   u'as')
+
+
 class DateTime(Unit):
-    """ DateTime type """
+    """ DateTime type, a count of some unit of time since the epoch """
+    __slots__ = ()
     cls = MEASURE
 
-    def __init__(self, tz=None):
+    def __init__(self, tz=None, unit=u'us'):
         if tz is not None and not isinstance(tz, _strtypes):
             raise ValueError('tz parameter to datetime datashape ' +
                              'must be a string')
+        if not isinstance(unit, _strtypes) or unit not in _datetime_units:
+            raise ValueError('unit parameter to datetime datashape must '
+                             'be one of %s, not %r' %
+                             (', '.join(_datetime_units), unit))
         # TODO validate against Olson tz database
-        self.tz = tz
-        self.parameters = (tz,)
+        # Microseconds, the default, are left out of the parameters
+        if unit == u'us':
+            self.parameters = (tz,)
+        else:
+            self.parameters = (tz, unicode(unit))
+
+    @property
+    def tz(self):
+        return self.parameters[0]
+
+    @property
+    def unit(self):
+        return self.parameters[1] if len(self.parameters) > 1 else u'us'
 
     def __str__(self):
-        if self.tz is None:
-            return 'datetime'
+        args = []
+        if self.tz is not None:
+            args.append('tz=%r' % self.tz)
+        if self.unit != u'us':
+            args.append('unit=%r' % str(self.unit))
+        if args:
+            return 'datetime[%s]' % ', '.join(args)
+        return 'datetime'
+
+    def __eq__(self, other):
+        return (isinstance(other, DateTime) and self.tz == other.tz and
+                self.unit == other.unit)
+
+    def __hash__(self):
+        return hash(('datetime', self.tz, self.unit))
+
+
+# The units of NumPy's timedelta64
+_timedelta_units = (u'Y', u'M', u'W', u'D', u'h', u'm', u's',
+                    u'ms', u'us', u'ns', u'ps', u'fs', u'as')
+
+
+class TimeDelta(Unit):
+    """ Time delta type, a count of some unit of time """
+    __slots__ = ()
+    cls = MEASURE
+
+    def __init__(self, unit=u'us'):
+        if not isinstance(unit, _strtypes) or unit not in _timedelta_units:
+            raise ValueError('unit parameter to timedelta datashape must '
+                             'be one of %s, not %r' %
+                             (', '.join(_timedelta_units), unit))
+        self.parameters = (unicode(unit),)
+
+    @property
+    def unit(self):
+        return self.parameters[0]
+
+    def __str__(self):
+        if self.unit == u'us':
+            return 'timedelta'
         else:
-            return 'datetime[tz=%r]' % self.tz
+            return 'timedelta[unit=%r]' % str(self.unit)
 
     def __eq__(self, other):
-        return isinstance(other, DateTime) and self.tz == other.tz
+        return isinstance(other, TimeDelta) and self.unit == other.unit
+
+    def __hash__(self):
+        return hash(('timedelta', self.unit))
 
 
 class Units(Unit):
     """ Units type for values with physical units """
+    __slots__ = ()
     cls = MEASURE
 
     def __init__(self, unit, tp=None):
@@ -272,10 +689,16 @@ class Units(Unit):
         elif not isinstance(tp, DataShape):
             raise ValueError('tp parameter to units datashape ' +
                              'must be a datashape type')
-        self.unit = unit
-        self.tp = tp
         self.parameters = (unit, tp)
 
+    @property
+    def unit(self):
+        return self.parameters[0]
+
+    @property
+    def tp(self):
+        return self.parameters[1]
+
     def __str__(self):
         if self.tp == DataShape(float64):
             return 'units[%r]' % (self.unit)
@@ -290,6 +713,7 @@ class Units(Unit):
 
 class Bytes(Unit):
     """ Bytes type """
+    __slots__ = ()
     cls = MEASURE
 
     def __str__(self):
@@ -319,6 +743,7 @@ _canonical_string_encodings = {
 
 class String(Unit):
     """ String container """
+    __slots__ = ('fixlen', 'encoding')
     cls = MEASURE
 
     def __init__(self, fixlen=None, encoding=None):
@@ -370,6 +795,13 @@ class String(Unit):
         # Put it in a canonical form
         self.encoding = _canonical_string_encodings[self.encoding]
 
+    def _intern_key(self):
+        return (String,) + self.parameters
+
+    def _fingerprint_parameters(self):
+        # The parameters keep the encoding as given, e.g. 'ascii' or 'A'
+        return (self.fixlen, self.encoding)
+
     def __str__(self):
         if self.fixlen is None and self.encoding == 'U8':
             return 'string'
@@ -398,9 +830,9 @@ class String(Unit):
 class DataShape(Mono):
     """The DataShape class, implementation for generic composite
     datashape objects"""
-
+    __slots__ = ('name', '_hash')
     __metaclass__ = Type
-    composite = False
+    composite = True
 
     def __init__(self, *parameters, **kwds):
         if len(parameters) > 0:
@@ -417,12 +849,11 @@ class DataShape(Mono):
         else:
             raise ValueError(('the data shape should be constructed from 2 or'
                             ' more parameters, only got %s') % (len(parameters)))
-        self.composite = True
 
         name = kwds.get('name')
         if name:
+            # Registered by Type.__call__, once interned
             self.name = name
-            self.__metaclass__._registry[name] = self
         else:
             self.name = None
 
@@ -445,8 +876,17 @@ class DataShape(Mono):
 
         return res
 
+    def _intern_key(self):
+        # The name changes how the datashape prints, so is part of the key
+        if all(isinstance(p, Mono) for p in self.parameters):
+            # Compact key for the usual case of all type parameters
+            return (DataShape, self.name) + tuple(map(id, self.parameters))
+        return (DataShape, self.name, _param_key(self.parameters))
+
     def __eq__(self, other):
-        if isinstance(other, DataShape):
+        if self is other:
+            return True
+        elif isinstance(other, DataShape):
             return self.parameters == other.parameters
         elif isinstance(other, Mono):
             return False
@@ -455,7 +895,11 @@ class DataShape(Mono):
                             'type %s to datashape') % type(other))
 
     def __hash__(self):
-        return hash(tuple(a for a in self))
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(self.parameters)
+            return self._hash
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -499,6 +943,7 @@ class Option(Mono):
     Measure types which may or may not hold data. Makes no
     indication of how this is implemented in memory.
     """
+    __slots__ = ()
 
     def __init__(self, ds):
         if isinstance(ds, DataShape) and len(ds) == 1:
@@ -508,7 +953,13 @@ class Option(Mono):
             raise TypeError('Option only takes measure argument')
 
         self.parameters = (ds,)
-        self.ty = ds
+
+    @property
+    def ty(self):
+        return self.parameters[0]
+
+    def _intern_key(self):
+        return (Option, id(self.parameters[0]))
 
     def __str__(self):
         return 'option[%s]' % str(self.ty)
@@ -517,7 +968,9 @@ class Option(Mono):
         return str(self)
 
     def __eq__(self, other):
-        if type(other) is Option:
+        if self is other:
+            return True
+        elif type(other) is Option:
             return self.ty == other.ty
         else:
             return False
@@ -533,15 +986,19 @@ class CType(Unit):
     """
     Symbol for a sized type mapping uniquely to a native type.
     """
+    __slots__ = ('_itemsize', '_alignment')
     cls = MEASURE
 
     def __init__(self, name, itemsize, alignment):
-        self.name = name
         self._itemsize = itemsize
         self._alignment = alignment
         Type.register(name, self)
         self.parameters = (name,)
 
+    @property
+    def name(self):
+        return self.parameters[0]
+
     @classmethod
     def from_numpy_dtype(self, dt):
         """
@@ -602,6 +1059,7 @@ class Fixed(Unit):
     """
     Fixed dimension.
     """
+    __slots__ = ()
     cls = DIMENSION
 
     def __init__(self, i):
@@ -611,8 +1069,14 @@ class Fixed(Unit):
         if i < 0:
             raise ValueError('Fixed dimensions must be positive')
 
-        self.val = i
-        self.parameters = (self.val,)
+        self.parameters = (int(i),)
+
+    def _intern_key(self):
+        return (Fixed, self.parameters[0])
+
+    @property
+    def val(self):
+        return self.parameters[0]
 
     def __index__(self):
         return self.val
@@ -637,6 +1101,7 @@ class Fixed(Unit):
 
 class Var(Unit):
     """ Variable dimension """
+    __slots__ = ()
     cls = DIMENSION
 
     def __str__(self):
@@ -653,15 +1118,20 @@ class TypeVar(Unit):
     """
     A free variable in the signature. Not user facing.
     """
+    __slots__ = ()
+    _symbolic = True
     # cls could be MEASURE or DIMENSION, depending on context
 
     def __init__(self, symbol):
         if not symbol[0].isupper():
             raise ValueError(('TypeVar symbol %r does not ' +
                               'begin with a capital') % symbol)
-        self.symbol = symbol
         self.parameters = (symbol,)
 
+    @property
+    def symbol(self):
+        return self.parameters[0]
+
     def __repr__(self):
         return "TypeVar(%s)" % (str(self),)
 
@@ -683,6 +1153,7 @@ class Implements(Mono):
     Type representing a constraint on the subtype term (which must be a
     TypeVar), namely that it must belong to a given type set.
     """
+    __slots__ = ()
 
     @property
     def typevar(self):
@@ -700,6 +1171,8 @@ class Function(Mono):
     """
     Used for function signatures.
     """
+    __slots__ = ('_hash',)
+
     def __init__(self, *parameters):
         self.parameters = parameters
 
@@ -712,14 +1185,18 @@ class Function(Mono):
         return self.parameters[:-1]
 
     def __eq__(self, other):
-        return (isinstance(other, type(self)) and
-                self.parameters == other.parameters)
+        return self is other or (isinstance(other, type(self)) and
+                                 self.parameters == other.parameters)
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return hash(('Function',) + self.parameters)
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(('Function',) + self.parameters)
+            return self._hash
 
     # def __repr__(self):
     #     return " -> ".join(map(repr, self.parameters))
@@ -733,6 +1210,7 @@ class Record(Mono):
     """
     A composite data structure of ordered fields mapped to types.
     """
+    __slots__ = ('_fdict', '_hash')
     cls = MEASURE
 
     def __init__(self, fields):
@@ -746,49 +1224,64 @@ class Record(Mono):
         # preserved. Using RecordDecl there is some magic to also
         # ensure that the fields align in the order they are
         # declared.
-        self.__fnames = [n for n, t in fields]
-        self.__ftypes = [t if isinstance(t, DataShape) else DataShape(t)
-                         for n, t in fields]
-        self.__fields = tuple(zip(self.__fnames, self.__ftypes))
-        self.__fdict = dict(self.__fields)
-        self.parameters = (self.__fields,)
+        self.parameters = (tuple((n, t if isinstance(t, DataShape)
+                                     else DataShape(t))
+                                 for n, t in fields),)
+
+    def _intern_key(self):
+        # Flattened (name, id(type)) pairs
+        key = [Record]
+        for n, t in self.parameters[0]:
+            key.append(n)
+            key.append(id(t))
+        return tuple(key)
 
     @property
     def fields(self):
-        return self.__fdict
+        # The name -> type index is only built when first needed
+        try:
+            return self._fdict
+        except AttributeError:
+            self._fdict = dict(self.parameters[0])
+            return self._fdict
 
     @property
     def names(self):
-        return self.__fnames
+        return [n for n, t in self.parameters[0]]
 
     @property
     def types(self):
-        return self.__ftypes
+        return [t for n, t in self.parameters[0]]
 
-    def to_numpy_dtype(self):
+    def to_numpy_dtype(self, align=False):
         """
         To Numpy record dtype.
+
+        With align=True, fields are padded to their C alignment, as in
+        the layout computed by datashape.layout.
         """
-        dk = self.__fnames
-        dv = map(to_numpy_dtype, self.__ftypes)
-        # Need to cast to a list for python 3,
-        # because zip returns an iterator
-        return np.dtype(list(zip(dk, dv)))
+        return to_numpy(self, align=align)[1]
 
     def __getitem__(self, key):
-        return self.__fdict[key]
+        return self.fields[key]
 
     def __eq__(self, other):
-        if isinstance(other, Record):
-            return self.__fdict == other.__fdict
+        if self is other:
+            return True
+        elif isinstance(other, Record):
+            return self.fields == other.fields
         else:
             return False
 
     def __hash__(self):
-        return hash(self.__fields)
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(self.parameters[0])
+            return self._hash
 
     def __str__(self):
-        return record_string(self.__fnames, self.__ftypes)
+        return record_string(self.names, self.types)
 
     def __repr__(self):
         return ''.join(["dshape(\"", str(self).encode('unicode_escape').decode('ascii'), "\")"])
@@ -798,6 +1291,7 @@ class Tuple(Mono):
     """
     A product type.
     """
+    __slots__ = ('_hash',)
     cls = MEASURE
 
     def __init__(self, dshapes):
@@ -807,24 +1301,29 @@ class Tuple(Mono):
         dshapes : list of dshapes
             The datashapes which make up the tuple.
         """
-        self.__dshapes = tuple(dshapes)
-        self.parameters = (dshapes,)
+        self.parameters = (tuple(dshapes),)
 
     @property
     def dshapes(self):
-        return self.__dshapes
+        return self.parameters[0]
 
     def __eq__(self, other):
-        if isinstance(other, Tuple):
-            return self.__dshapes == other.__dshapes
+        if self is other:
+            return True
+        elif isinstance(other, Tuple):
+            return self.dshapes == other.dshapes
         else:
             return False
 
     def __hash__(self):
-        return hash(self.__dshapes)
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(self.dshapes)
+            return self._hash
 
     def __str__(self):
-        return '(' + ', '.join(str(x) for x in self.__dshapes) + ')'
+        return '(' + ', '.join(str(x) for x in self.dshapes) + ')'
 
     def __repr__(self):
         return ''.join(["dshape(\"", str(self).encode('unicode_escape').decode('ascii'), "\")"])
@@ -832,6 +1331,7 @@ class Tuple(Mono):
 
 class JSON(Mono):
     """ JSON measure """
+    __slots__ = ()
     cls = MEASURE
 
     def __init__(self):
@@ -882,6 +1382,7 @@ complex_ = complex_float64
 date_ = Date()
 time_ = Time()
 datetime_ = DateTime()
+timedelta_ = TimeDelta()
 
 c_byte = int8
 c_short = int16
@@ -945,76 +1446,163 @@ class NotNumpyCompatible(Exception):
     """
     pass
 
-def to_numpy_dtype(ds):
+# Bounded memos of to_numpy and from_numpy results
+_to_numpy_cache = LRUCache(1024)
+_from_numpy_cache = LRUCache(1024)
+
+
+def to_numpy_dtype(ds, align=False):
     """ Throw away the shape information and just return the
     measure as NumPy dtype instance."""
-    return to_numpy(ds)[1]
+    return to_numpy(ds, align=align)[1]
 
-def to_numpy(ds):
+
+def to_numpy(ds, align=False, byteorder='='):
     """
     Downcast a datashape object into a Numpy (shape, dtype) tuple if
     possible.
 
+    Records and tuples become structured dtypes, with the dimensions of
+    their fields as subarrays. Dates become datetime64[D], and datetimes
+    and timedeltas datetime64 and timedelta64 of the same unit.
+    Results are memoized, so repeat conversions are a lookup.
+
+    Parameters
+    ----------
+    ds : Mono
+        The datashape.
+    align : bool, optional
+        Whether structured dtypes pad their fields to C alignment.
+    byteorder : {'=', '<', '>'}, optional
+        The byte order of the dtype, native by default.
+
     >>> from datashape import dshape, to_numpy
     >>> to_numpy(dshape('5 * 5 * int32'))
     ((5, 5), dtype('int32'))
     """
-
-    shape = tuple()
-    dtype = None
-
-    #assert isinstance(ds, DataShape)
-
+    if not isinstance(ds, Mono):
+        raise NotNumpyCompatible('%r is not a datashape type' % (ds,))
+    key = (ds.fingerprint, bool(align), byteorder)
+    result = _to_numpy_cache.get(key)
+    if result is None:
+        result = _to_numpy(ds, align, byteorder)
+        _to_numpy_cache.put(key, result)
+    return result
+
+
+def _to_numpy(ds, align, byteorder):
+    shape = ()
     if isinstance(ds, DataShape):
         # The datashape dimensions
-        for dim in ds[:-1]:
-            if isinstance(dim, IntegerConstant):
-                shape += (dim,)
-            elif isinstance(dim, Fixed):
+        for dim in ds.shape:
+            if isinstance(dim, (Fixed, IntegerConstant)):
                 shape += (dim.val,)
             elif isinstance(dim, TypeVar):
                 shape += (-1,)
             else:
                 raise NotNumpyCompatible('DataShape dimension %s is not NumPy-compatible' % dim)
-
-        # The datashape measure
-        msr = ds[-1]
+        msr = ds.measure
     else:
         msr = ds
 
-    if isinstance(msr, CType):
-        dtype = msr.to_numpy_dtype()
-    elif isinstance(msr, Record):
-        dtype = msr.to_numpy_dtype()
-    else:
-        raise NotNumpyCompatible('DataShape measure %s is not NumPy-compatible' % msr)
-
-    if type(dtype) != np.dtype:
-        raise NotNumpyCompatible('Internal Error: Failed to produce NumPy dtype')
+    dtype = _numpy_measure(msr, align)
+    if byteorder != '=':
+        dtype = dtype.newbyteorder(byteorder)
     return (shape, dtype)
 
 
+def _numpy_measure(msr, align):
+    """The NumPy dtype of a datashape measure."""
+    if isinstance(msr, CType):
+        return msr.to_numpy_dtype()
+    elif isinstance(msr, (Record, Tuple)):
+        if isinstance(msr, Record):
+            items = msr.parameters[0]
+        else:
+            items = [('f%d' % i, t) for i, t in enumerate(msr.dshapes)]
+        fields = []
+        for name, t in items:
+            shape, dtype = to_numpy(t, align)
+            if -1 in shape:
+                raise NotNumpyCompatible('Field %s of %s has a symbolic '
+                                         'dimension' % (name, msr))
+            fields.append((str(name), dtype, shape) if shape
+                          else (str(name), dtype))
+        return np.dtype(fields, align=bool(align))
+    elif isinstance(msr, String) and msr.fixlen is not None:
+        if msr.encoding == u'A':
+            return np.dtype('S%d' % msr.fixlen)
+        elif msr.encoding == u'U32':
+            return np.dtype('U%d' % msr.fixlen)
+    elif isinstance(msr, Date):
+        return np.dtype('M8[D]')
+    elif isinstance(msr, DateTime) and msr.tz is None:
+        return np.dtype('M8[%s]' % msr.unit)
+    elif isinstance(msr, TimeDelta):
+        return np.dtype('m8[%s]' % msr.unit)
+    elif isinstance(msr, Option):
+        raise NotNumpyCompatible('DataShape measure %s has no single NumPy '
+                                 'dtype, see datashape.to_numpy_option' % msr)
+    raise NotNumpyCompatible('DataShape measure %s is not NumPy-compatible' % msr)
+
+
 def from_numpy(shape, dt):
     """
     Upcast a (shape, dtype) tuple if possible.
 
+    Structured dtypes become records, including nested ones and
+    subarray fields. datetime64 and timedelta64 become datetime and
+    timedelta of the same unit, except that datetime64 of days, or of
+    weeks, months or years, become date, which to_numpy makes
+    datetime64[D], holding the same dates. The byte order and any
+    padding of the dtype are not part of the datashape, so a dtype of
+    another byte order, or with C alignment, comes back from to_numpy
+    given them as its byteorder and align. Results are memoized.
+
     >>> from datashape import from_numpy
     >>> from numpy import dtype
     >>> from_numpy((5, 5), dtype('int32'))
     dshape("5 * 5 * int32")
     """
     dtype = np.dtype(dt)
-
-    if dtype.kind == 'S':
+    key = (tuple(shape), dtype)
+    result = _from_numpy_cache.get(key)
+    if result is None:
+        result = _from_numpy(tuple(shape), dtype)
+        _from_numpy_cache.put(key, result)
+    return result
+
+
+def _from_numpy(shape, dtype):
+    if dtype.subdtype is not None:
+        # A subarray dtype adds its dimensions to the shape
+        base, subshape = dtype.subdtype
+        return from_numpy(shape + subshape, base)
+
+    if dtype.names is not None:
+        measure = Record([(name, from_numpy((), dtype.fields[name][0]))
+                          for name in dtype.names])
+    elif dtype.kind == 'S':
         measure = String(dtype.itemsize, 'A')
     elif dtype.kind == 'U':
-        measure = String(dtype.itemsize / 4, 'U8')
-    elif dtype.fields:
-        field_items = [(name, dtype.fields[name]) for name in dtype.names]
-        rec = [(a,CType.from_numpy_dtype(b[0])) for a,b in field_items]
-        measure = Record(rec)
+        measure = String(dtype.itemsize // 4, 'U32')
+    elif dtype.kind in 'Mm':
+        unit = np.datetime_data(dtype)[0]
+        if unit == 'generic':
+            raise NotNumpyCompatible('NumPy dtype %s has no time unit' %
+                                     dtype)
+        elif dtype.kind == 'm':
+            measure = TimeDelta(unit)
+        elif unit in ('Y', 'M', 'W', 'D'):
+            measure = date_
+        else:
+            measure = DateTime(unit=unit)
     else:
-        measure = CType.from_numpy_dtype(dtype)
+        try:
+            measure = CType.from_numpy_dtype(dtype)
+        except KeyError:
+            raise NotNumpyCompatible('NumPy dtype %s has no datashape '
+                                     'equivalent' % dtype)
 
     if shape == ():
         return measure
@@ -1025,11 +1613,15 @@ def from_numpy(shape, dt):
 def typeof(obj):
     """
     Return a datashape ctype for a python scalar.
+
+    For the datashape of collections, see discovery.discover.
     """
     if hasattr(obj, "dshape"):
         return obj.dshape
     elif isinstance(obj, np.ndarray):
         return from_numpy(obj.shape, obj.dtype)
+    elif isinstance(obj, bool):
+        return DataShape(bool_)
     elif isinstance(obj, _inttypes):
         return DataShape(int_)
     elif isinstance(obj, float):
@@ -1039,9 +1631,13 @@ def typeof(obj):
     elif isinstance(obj, _strtypes):
         return DataShape(string)
     elif isinstance(obj, datetime.timedelta):
-        return DataShape(timedelta64)
+        return DataShape(timedelta_)
     elif isinstance(obj, datetime.datetime):
-        return DataShape(datetime64)
+        return DataShape(datetime_)
+    elif isinstance(obj, datetime.date):
+        return DataShape(date_)
+    elif isinstance(obj, datetime.time):
+        return DataShape(time_)
     else:
         return DataShape(pyobj)
 
@@ -1074,13 +1670,11 @@ def free(ds):
     """
     Return the free variables (TypeVar) of a datashape type (Mono).
     """
-    if isinstance(ds, TypeVar):
-        return [ds]
-    elif isinstance(ds, Mono) and not isinstance(ds, Unit):
-        result = []
-        for x in ds.parameters:
-            result.extend(free(x))
-        return result
+    if isinstance(ds, Mono):
+        try:
+            return list(ds._meta.free)
+        except AttributeError:
+            return list(_compute_meta(ds).free)
     else:
         return []
 
@@ -0,0 +1,436 @@
+"""
+Reads CSV files into NumPy structured arrays, driven by a datashape.
+
+Reading is in two steps, with the datashape as the contract between
+them. infer_csv looks at a bounded sample of rows and discovers a
+``var * { ... }`` record datashape, typing each cell as discovery does
+and joining the types of a column. read_csv then parses the whole file
+in chunks of a fixed number of lines, each into a structured array of
+the record's fields, optionally in a pool of worker processes. Only a
+few chunks are held at a time, so memory does not grow with the size of
+the file.
+
+Option fields hold their values in the structured array, with zero or
+empty values where they are missing, and a validity bitmap alongside, as
+an OptionArray does.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import csv
+import io
+import multiprocessing
+import re
+from collections import deque, namedtuple
+from itertools import islice
+
+import numpy as np
+
+from . import coretypes as ct
+from .discovery import (_discover_string, _null, _nothing, _resolve,
+                        _string, join)
+from .option import OptionArray, _pack
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['infer_csv', 'read_csv', 'Chunk']
+
+
+#------------------------------------------------------------------------
+# Chunks
+#------------------------------------------------------------------------
+
+class Chunk(namedtuple('Chunk', 'values, validity')):
+    """
+    A chunk of rows of a record datashape.
+
+    Attributes
+    ----------
+    values : numpy.ndarray
+        A structured array of the rows. Option fields hold their values,
+        and zero or empty where they are missing. Unbounded strings are
+        Python objects.
+    validity : dict
+        The packed validity bitmap of each option field, by name.
+    """
+    __slots__ = ()
+
+    def column(self, name):
+        """
+        Returns a field of the rows, as an OptionArray if it is an
+        option field.
+        """
+        if name in self.validity:
+            return OptionArray(self.values[name], self.validity[name])
+        return self.values[name]
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _record_fields(ds):
+    """
+    The fields of a record datashape, or of an array of records, as a
+    list of (name, measure, dtype, optional) tuples.
+    """
+    if isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    m = ds.measure if isinstance(ds, ct.DataShape) else ds
+    if not isinstance(m, ct.Record):
+        raise TypeError('Expected a record datashape, not %s' % ds)
+    fields = []
+    for name, t in m.parameters[0]:
+        if len(t) != 1:
+            raise TypeError('Field %s of %s is not a scalar' % (name, ds))
+        m = t.measure
+        optional = isinstance(m, ct.Option)
+        if optional:
+            m = m.ty
+        if isinstance(m, ct.String) and m.fixlen is None:
+            dtype = np.dtype(object)
+        elif isinstance(m, ct.String) and m.encoding not in (u'A', u'U32'):
+            # NumPy has no UTF-8 or UTF-16 strings, but n characters
+            # hold any string of n code units
+            dtype = np.dtype('U%d' % m.fixlen)
+        else:
+            try:
+                dtype = ct.to_numpy_dtype(m)
+            except ct.NotNumpyCompatible:
+                raise TypeError('Field %s of %s has no NumPy dtype' %
+                                (name, ds))
+        fields.append((str(name), m, dtype, optional))
+    return fields
+
+
+def _ordered_map(func, tasks, processes):
+    """
+    Yields func of each task, in order, running them in a pool of
+    processes which is never more than a few tasks ahead.
+
+    Pool.imap would read all of the tasks up front, holding the whole
+    input in memory.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+#------------------------------------------------------------------------
+# Inference
+#------------------------------------------------------------------------
+
+_bool_strings = {'true': True, 'false': False}
+
+# Numbers in the forms the columns are parsed from, without the spaces
+# and underscores int() and float() would also accept
+_int_re = re.compile(r'[-+]?[0-9]+$')
+_float_re = re.compile(r'[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+                       r'|[-+]?(?i:inf|infinity|nan)$')
+
+
+def _cell_type(s):
+    """The type of a CSV cell, as discovery gives it."""
+    if not s:
+        return _null
+    if _int_re.match(s) and -2**63 <= int(s) < 2**63:
+        return _discover_int
+    elif _float_re.match(s):
+        return _discover_float
+    elif s.lower() in _bool_strings:
+        return _discover_bool
+    t = _discover_string(s.strip())
+    if t == _discover_datetime and _has_utc_offset(s.strip()):
+        # Reading it as a datetime would shift it to UTC
+        return _string
+    return t
+
+
+_discover_int = ct.DataShape(ct.int64)
+_discover_float = ct.DataShape(ct.float64)
+_discover_bool = ct.DataShape(ct.bool_)
+_discover_datetime = ct.DataShape(ct.datetime_)
+
+
+def _has_utc_offset(s):
+    """
+    Whether an ISO 8601 datetime string ends in a UTC offset, such as
+    +05:00, other than Z.
+    """
+    return '+' in s[10:] or '-' in s[10:]
+
+
+_date_itemsize = np.dtype('U10').itemsize
+
+
+def _datetime_strings(column):
+    """
+    Prepares an array of ISO 8601 strings for conversion to datetime64,
+    returning it and the mask of strings with a UTC offset. A trailing Z
+    is dropped, as datetimes without a time zone are in UTC. NumPy would
+    convert other offsets to UTC, with a warning, so they are rejected.
+    """
+    if column.dtype.itemsize <= _date_itemsize:
+        # Dates, with no room for a time or an offset
+        return column, np.zeros(len(column), dtype=bool)
+    column = np.char.rstrip(column, 'Z')
+    rest = np.char.ljust(column, 10)
+    offset = ((np.char.find(rest, '+', 10) >= 0) |
+              (np.char.find(rest, '-', 10) >= 0))
+    return column, offset
+
+
+def _open(path_or_file, encoding):
+    if isinstance(path_or_file, _strtypes):
+        return io.open(path_or_file, 'r', encoding=encoding, newline=''), True
+    return path_or_file, False
+
+
+def infer_csv(path_or_file, sample=1000, header=True, encoding='utf-8',
+              **fmtparams):
+    """
+    Returns the datashape of a CSV file, ``var * { ... }``, from its
+    first rows.
+
+    Empty cells are missing values, making their fields options. Other
+    cells are integers, floats, true or false, ISO 8601 dates and
+    datetimes, or strings, and the types of a column are joined as
+    discovery.join does. Datetimes with a UTC offset other than Z are
+    strings, as datetime holds no offset.
+
+    Parameters
+    ----------
+    path_or_file : str or file
+        The path of the file, or a file open for reading text.
+    sample : int, optional
+        The number of rows to look at, after the header.
+    header : bool, optional
+        Whether the first row holds the field names. Without a header
+        the fields are named f0, f1, and so on.
+    encoding : str, optional
+        The encoding of the file, when given its path.
+    fmtparams
+        The dialect and formatting parameters of csv.reader.
+
+    >>> import io
+    >>> infer_csv(io.StringIO(u'id,score\\n1,0.5\\n2,\\n'))
+    dshape("var * { id : int64, score : option[float64] }")
+    """
+    f, close = _open(path_or_file, encoding)
+    try:
+        rows = csv.reader(f, **fmtparams)
+        names = next(rows, None) if header else None
+        types = None if names is None else [_nothing] * len(names)
+        for row in islice(rows, sample):
+            if types is None and row:
+                types = [_nothing] * len(row)
+                names = ['f%d' % i for i in range(len(row))]
+            if not row:
+                # A blank line, which is an empty cell of a single column
+                if types is None or len(types) != 1:
+                    continue
+                row = ['']
+            if len(row) != len(types):
+                raise ValueError('CSV row %d has %d cells, not %d' %
+                                 (rows.line_num, len(row), len(types)))
+            types = [t if t is u else join(t, u)
+                     for t, u in zip(types, map(_cell_type, row))]
+    finally:
+        if close:
+            f.close()
+    if names is None:
+        raise ValueError('CSV file has no rows')
+    return ct.DataShape(ct.Var(), ct.Record(
+        [(name, _resolve(t)) for name, t in zip(names, types)]))
+
+
+#------------------------------------------------------------------------
+# Chunked reading
+#------------------------------------------------------------------------
+
+def _parse_column(cells, m, dtype):
+    """
+    Parses a column of cells into an array of dtype, returning it and
+    the mask of empty cells.
+    """
+    if dtype == object:
+        column = np.empty(len(cells), dtype=object)
+        column[:] = cells
+        return column, column == ''
+    column = np.array(cells, dtype=np.str_)
+    missing = column == ''
+    if isinstance(m, ct.String):
+        return column.astype(dtype), missing
+    if dtype.kind == 'b':
+        lower = np.char.lower(np.char.strip(column))
+        values = lower == 'true'
+        bad = ~(values | (lower == 'false') | missing)
+        if not bad.any():
+            return values, missing
+    else:
+        if dtype.kind == 'M':
+            column, offset = _datetime_strings(column)
+            if offset.any():
+                i = int(np.argmax(offset))
+                raise ValueError('Could not parse %r as %s, which has no UTC '
+                                 'offset' % (cells[i], m))
+        column[missing] = 'NaT' if dtype.kind in 'Mm' else '0'
+        try:
+            return column.astype(dtype), missing
+        except (ValueError, OverflowError):
+            bad = np.array([not _parses(s, dtype) for s in column])
+    i = int(np.argmax(bad))
+    raise ValueError('Could not parse %r as %s' % (cells[i], m))
+
+
+def _parses(s, dtype):
+    try:
+        np.array([s]).astype(dtype)
+        return True
+    except (ValueError, OverflowError):
+        return False
+
+
+def _rows(reader, width):
+    """
+    The rows of a csv.reader, without blank lines, which are empty
+    cells when there is a single column.
+    """
+    if width == 1:
+        return [row or [''] for row in reader]
+    return [row for row in reader if row]
+
+
+def _parse_chunk(task):
+    """Parses a chunk of CSV text into a Chunk of the datashape."""
+    text, ds_str, fmtparams = task
+    fields = _record_fields(dshape(ds_str))
+    rows = _rows(csv.reader(io.StringIO(text), **fmtparams), len(fields))
+    for row in rows:
+        if len(row) != len(fields):
+            raise ValueError('CSV row %r has %d cells, not %d' %
+                             (row, len(row), len(fields)))
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    values = np.empty(len(rows), dtype=[(name, dtype)
+                                        for name, _, dtype, _ in fields])
+    validity = {}
+    for (name, m, dtype, optional), cells in zip(fields, columns):
+        try:
+            column, missing = _parse_column(list(cells), m, dtype)
+        except ValueError as e:
+            raise ValueError('Field %s: %s' % (name, e))
+        values[name] = column
+        if optional:
+            validity[name] = _pack(~missing)
+        elif missing.any() and dtype != object and not isinstance(
+                m, ct.String):
+            raise ValueError('Field %s of type %s has a missing value' %
+                             (name, m))
+    return Chunk(values, validity)
+
+
+def _text_chunks(f, chunksize, quotechar):
+    """
+    Yields the text of chunksize lines at a time, with more to keep any
+    row with a quoted line break whole.
+    """
+    while True:
+        text = ''.join(islice(f, chunksize))
+        if not text:
+            return
+        # An odd number of quotes leaves a quoted field open
+        if quotechar is not None and text.count(quotechar) % 2:
+            lines = [text]
+            quotes = 1
+            while quotes % 2:
+                line = next(f, None)
+                if line is None:
+                    break
+                lines.append(line)
+                quotes += line.count(quotechar)
+            text = ''.join(lines)
+        yield text
+
+
+def read_csv(path_or_file, ds=None, chunksize=65536, processes=1,
+             header=True, sample=1000, encoding='utf-8', **fmtparams):
+    """
+    Reads a CSV file in chunks of rows, each parsed into a Chunk of a
+    structured array and the validity bitmaps of its option fields.
+
+    Parameters
+    ----------
+    path_or_file : str or file
+        The path of the file, or a file open for reading text. To infer
+        the datashape of a file, it must be seekable, and is read from
+        where it is after inference goes back to it.
+    ds : DataShape or str, optional
+        The record datashape of the rows, by default inferred from the
+        first sample rows with infer_csv. Fields may be booleans,
+        numbers, strings, dates, datetimes and options of those. Fixed
+        length strings are truncated as NumPy does.
+    chunksize : int, optional
+        The number of lines in each chunk, which is the number of rows
+        unless rows have quoted line breaks.
+    processes : int, optional
+        The number of worker processes parsing chunks, by default one,
+        parsing in this process. None uses every CPU.
+    header : bool, optional
+        Whether the first row holds the field names, and is skipped.
+    sample : int, optional
+        The number of rows to infer the datashape from.
+    encoding : str, optional
+        The encoding of the file, when given its path.
+    fmtparams
+        The dialect and formatting parameters of csv.reader.
+
+    Empty cells are missing values of option fields, and empty strings
+    otherwise. Cells which don't parse as their field's type raise
+    ValueError, as do datetimes with a UTC offset other than Z.
+    """
+    if ds is None:
+        start = None
+        if not isinstance(path_or_file, _strtypes):
+            # Inference reads rows from the file, which must then be
+            # read again from the same place
+            if not (hasattr(path_or_file, 'seekable') and
+                    path_or_file.seekable()):
+                raise TypeError('Inferring the datashape of a CSV file '
+                                'needs a path or a seekable file')
+            start = path_or_file.tell()
+        ds = infer_csv(path_or_file, sample=sample, header=header,
+                       encoding=encoding, **fmtparams)
+        if start is not None:
+            path_or_file.seek(start)
+    elif isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    # Checks the datashape before any work starts
+    _record_fields(ds)
+    ds_str = str(ds.measure if isinstance(ds, ct.DataShape) else ds)
+    quotechar = csv.reader(io.StringIO(), **fmtparams).dialect.quotechar
+
+    f, close = _open(path_or_file, encoding)
+    try:
+        if header:
+            next(csv.reader(f, **fmtparams), None)
+        tasks = ((text, ds_str, fmtparams)
+                 for text in _text_chunks(f, chunksize, quotechar))
+        for chunk in _ordered_map(_parse_chunk, tasks, processes):
+            yield chunk
+    finally:
+        if close:
+            f.close()
@@ -0,0 +1,325 @@
+"""
+Discovers the datashape of Python data, such as a list of dicts parsed
+from JSON.
+
+The type of each value is inferred on its own, then the types are
+combined with join, which finds the least general type holding values of
+both. Because types are hash-consed, rows of the same structure give the
+very same type object, and joining it into the running result is a
+single identity check. Memory is bounded by the size of the type, not of
+the data, so iterators of any length can be streamed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import random
+import re
+from itertools import islice
+
+import numpy as np
+
+from . import coretypes as ct
+from .caching import LRUCache
+from .error import UnificationError
+from .promotion import promote_dtypes
+from .py2help import _inttypes, _strtypes
+
+__all__ = ['discover', 'discover_value', 'join']
+
+
+#------------------------------------------------------------------------
+# Types of single values
+#------------------------------------------------------------------------
+
+class _Nothing(ct.Unit):
+    """
+    The type of no values, such as the elements of an empty list. It
+    joins with any type to that type.
+    """
+    __slots__ = ()
+    cls = ct.MEASURE
+
+    def __str__(self):
+        return 'nothing'
+
+
+_null = ct.DataShape(ct.Null())
+_nothing = ct.DataShape(_Nothing())
+
+# The measures of Python scalar types. bool comes first as it is a
+# subclass of int.
+_scalar_types = [(bool, ct.bool_), (float, ct.float64),
+                 (complex, ct.complex128),
+                 (datetime.datetime, ct.datetime_), (datetime.date, ct.date_),
+                 (datetime.time, ct.time_),
+                 (datetime.timedelta, ct.timedelta_)]
+_scalar_types[1:1] = [(t, ct.int64) for t in _inttypes]
+
+# Exact Python type to datashape, for the common case
+_scalar_dshapes = dict((t, ct.DataShape(m)) for t, m in _scalar_types)
+_string = ct.DataShape(ct.string)
+
+_date_re = re.compile(r'\d{4}-\d\d-\d\d$')
+_datetime_re = re.compile(r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d(:\d\d(\.\d+)?)?'
+                          r'(Z|[+-]\d\d:?\d\d)?$')
+
+
+# Building a type costs more than looking it up, so the types of dicts
+# and lists are kept, keyed by the ids of the types they hold. Those
+# types are held in the values, so the ids stay theirs.
+_record_cache = LRUCache(1024)
+_var_cache = LRUCache(1024)
+
+
+def _discover_string(s):
+    """Strings in ISO 8601 form are dates and datetimes."""
+    if len(s) >= 10 and s[4:5] == '-':
+        if _date_re.match(s):
+            return _scalar_dshapes[datetime.date]
+        elif _datetime_re.match(s):
+            return _scalar_dshapes[datetime.datetime]
+    return _string
+
+
+def _discover(x):
+    """The type of a value, which may hold null and nothing."""
+    t = _scalar_dshapes.get(type(x))
+    if t is not None:
+        return t
+    elif x is None:
+        return _null
+    elif isinstance(x, _strtypes):
+        return _discover_string(x)
+    elif isinstance(x, dict):
+        names = tuple(x)
+        types = tuple(map(_discover, x.values()))
+        key = names + tuple(map(id, types))
+        cached = _record_cache.get(key)
+        if cached is None:
+            cached = (types, ct.DataShape(ct.Record(
+                [(k if isinstance(k, _strtypes) else str(k), t)
+                 for k, t in zip(names, types)])))
+            _record_cache.put(key, cached)
+        return cached[1]
+    elif isinstance(x, list):
+        t = _nothing
+        for v in x:
+            t = join(t, _discover(v))
+        cached = _var_cache.get(id(t))
+        if cached is None:
+            cached = (t, ct.DataShape(ct.Var(), *t.parameters))
+            _var_cache.put(id(t), cached)
+        return cached[1]
+    elif isinstance(x, tuple):
+        return ct.DataShape(ct.Tuple([_discover(v) for v in x]))
+    elif isinstance(x, np.ndarray):
+        return ct.DataShape(*_parts(ct.from_numpy(x.shape, x.dtype)))
+    elif isinstance(x, np.generic):
+        return ct.DataShape(ct.from_numpy((), x.dtype))
+    for cls, m in _scalar_types:
+        if isinstance(x, cls):
+            return ct.DataShape(m)
+    return _string
+
+
+def discover_value(x):
+    """
+    Returns the type of a single Python value.
+
+    None is an option, lists are var dimensions, tuples are tuple types
+    and dicts are records, with the fields in the order of their keys.
+    Strings of ISO 8601 dates and datetimes are dates and datetimes.
+    Other objects are strings.
+
+    >>> discover_value({'name': 'Alice', 'scores': [1.5, 2.0]})
+    dshape("{ name : string, scores : var * float64 }")
+    """
+    return _resolve(_discover(x))
+
+
+def _parts(t):
+    """The dimensions and measure of a type, as a tuple."""
+    return t.parameters if isinstance(t, ct.DataShape) else (t,)
+
+
+def _resolve(t):
+    """
+    Replaces null, where only None was seen, with option[string], and nothing
+    with string.
+    """
+    parts = _parts(t)
+    m = _resolve_measure(parts[-1])
+    return t if m is parts[-1] else ct.DataShape(*parts[:-1] + (m,))
+
+
+def _resolve_measure(m):
+    if isinstance(m, ct.Null):
+        return ct.Option(ct.string)
+    elif isinstance(m, _Nothing):
+        return ct.string
+    elif isinstance(m, ct.Option):
+        ty = _resolve_measure(m.ty)
+        return m if ty is m.ty else ct.Option(ty)
+    elif isinstance(m, ct.Record):
+        return ct.Record([(n, _resolve(t)) for n, t in m.parameters[0]])
+    elif isinstance(m, ct.Tuple):
+        return ct.Tuple([_resolve(t) for t in m.dshapes])
+    return m
+
+
+#------------------------------------------------------------------------
+# Type join
+#------------------------------------------------------------------------
+
+# Joins of types, keyed by the ids of the two types. The types are held
+# in the value, so the ids stay theirs.
+_join_cache = LRUCache(1024)
+
+
+def join(a, b):
+    """
+    Returns the least general type which holds the values of both a and
+    b.
+
+    Numbers promote as in NumPy, options join the types they hold,
+    dates join datetimes to datetimes, and records join field by field,
+    with the measures of fields missing from either made options.
+    Dimensions of different sizes join to var. Types which don't
+    otherwise join are strings.
+
+    >>> from datashape import dshape
+    >>> join(dshape('{a: int64}'), dshape('{a: float64, b: string}'))
+    dshape("{ a : float64, b : option[string] }")
+    """
+    if a is b:
+        return a
+    key = (id(a), id(b))
+    cached = _join_cache.get(key)
+    if cached is not None:
+        return cached[2]
+    pa, pb = _parts(a), _parts(b)
+    if isinstance(pa[-1], _Nothing) and len(pa) <= len(pb):
+        result = ct.DataShape(*pb)
+    elif isinstance(pb[-1], _Nothing) and len(pb) <= len(pa):
+        result = ct.DataShape(*pa)
+    elif len(pa) != len(pb):
+        result = _string
+    else:
+        dims = [x if x == y else ct.Var() for x, y in zip(pa[:-1], pb[:-1])]
+        result = ct.DataShape(*dims + [_join_measures(pa[-1], pb[-1])])
+    _join_cache.put(key, (a, b, result))
+    return result
+
+
+def _optional(m):
+    if isinstance(m, (ct.Option, ct.Null)):
+        return m
+    return ct.Option(m)
+
+
+def _join_measures(a, b):
+    if a == b:
+        return a
+    elif isinstance(a, ct.Null):
+        return _optional(b)
+    elif isinstance(b, ct.Null):
+        return _optional(a)
+    elif isinstance(a, ct.Option) or isinstance(b, ct.Option):
+        a = a.ty if isinstance(a, ct.Option) else a
+        b = b.ty if isinstance(b, ct.Option) else b
+        return ct.Option(_join_measures(a, b))
+    elif isinstance(a, ct.CType) and isinstance(b, ct.CType):
+        try:
+            return promote_dtypes(a, b)
+        except (UnificationError, TypeError):
+            return ct.string
+    elif (isinstance(a, (ct.Date, ct.DateTime)) and
+          isinstance(b, (ct.Date, ct.DateTime))):
+        return ct.datetime_
+    elif isinstance(a, ct.Record) and isinstance(b, ct.Record):
+        fa, fb = dict(a.parameters[0]), dict(b.parameters[0])
+        fields = []
+        for name, t in a.parameters[0] + tuple(f for f in b.parameters[0]
+                                               if f[0] not in fa):
+            if name in fa and name in fb:
+                t = join(fa[name], fb[name])
+            elif len(t) == 1:
+                # Records without the field hold a missing value, while
+                # a missing array is taken to be empty
+                t = ct.DataShape(_optional(t.measure))
+            fields.append((name, t))
+        return ct.Record(fields)
+    elif (isinstance(a, ct.Tuple) and isinstance(b, ct.Tuple) and
+          len(a.dshapes) == len(b.dshapes)):
+        return ct.Tuple([join(x, y) for x, y in zip(a.dshapes, b.dshapes)])
+    return ct.string
+
+
+#------------------------------------------------------------------------
+# Discovery over collections
+#------------------------------------------------------------------------
+
+def _sample_rows(data, sample):
+    """Picks sample rows spread over a sequence, in order."""
+    n = len(data)
+    if sample is None or sample >= n:
+        return iter(data), n
+    rng = random.Random(0)
+    # Take the first rows too, which often show all the fields
+    head = min(sample // 2, n)
+    picks = sorted(rng.sample(range(head, n), sample - head))
+    return (data[i] for i in list(range(head)) + picks), n
+
+
+def discover(data, sample=None, stable=None):
+    """
+    Returns the datashape of a collection of rows, ``N * T``.
+
+    Parameters
+    ----------
+    data : sequence or iterable
+        The rows, such as dicts or lists.
+    sample : int, optional
+        The most rows to look at. Of a sequence, half are taken from its
+        start and the rest at random. Of an iterator, the first ones are
+        taken.
+    stable : int, optional
+        Stop once this many rows in a row have not changed the type.
+
+    The leading dimension is the length of a sequence. For an iterator
+    it is the number of rows if all were seen, otherwise var. Stopping
+    early takes one more row from the iterator, to tell which.
+
+    >>> discover([{'id': 1, 'when': '2014-05-01'},
+    ...           {'id': 2, 'when': None, 'tags': ['x']}])
+    dshape("2 * { id : int64, when : option[date], tags : var * string }")
+    """
+    try:
+        rows, n = _sample_rows(data, sample)
+    except TypeError:
+        it = iter(data)
+        rows, n = (it if sample is None else islice(it, sample)), None
+    result = _nothing
+    unchanged = seen = 0
+    for row in rows:
+        seen += 1
+        t = _discover(row)
+        if t is not result:
+            t = join(result, t)
+            if t is not result:
+                result = t
+                unchanged = 0
+                continue
+        unchanged += 1
+        if stable is not None and unchanged >= stable:
+            break
+    if n is None:
+        stopped = (stable is not None and unchanged >= stable) or (
+            sample is not None and seen >= sample)
+        # Stopping early left rows out only if one more follows
+        exhausted = not stopped or next(it, _nothing) is _nothing
+        dim = ct.Fixed(seen) if exhausted else ct.Var()
+    else:
+        dim = ct.Fixed(n)
+    return ct.DataShape(dim, *_resolve(result).parameters)
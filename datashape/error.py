@@ -38,8 +38,6 @@ class CustomSyntaxError(DataShapeException):
         self.line = text[linestart:lineend]
         self.col_offset = lexpos - linestart
 
-        print(str(self)) # REMOVEME
-
     def __str__(self):
         pointer = ' '*self.col_offset + '^'
 
@@ -70,6 +68,9 @@ class DataShapeError(DataShapeTypeError):
 class UnificationError(DataShapeTypeError):
     """Raised when two DataShape types cannot be unified"""
 
+class LayoutError(DataShapeTypeError):
+    """Raised when a type has no fixed memory layout"""
+
 class CoercionError(DataShapeTypeError):
     """Raised when we can't coerce a type to another type"""
     def __init__(self, src, dst):
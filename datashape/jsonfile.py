@@ -0,0 +1,386 @@
+"""
+Reads JSON lines, one JSON object per line, into NumPy structured arrays
+of a record datashape.
+
+Lines written by one program usually have the same keys in the same
+order. The datashape and the keys of a chunk's first line are compiled
+into a regular expression matching a whole line, with a group per field
+which only matches JSON values of the field's type. One findall over
+the chunk gives the text of every field of every row, and each column is
+converted from its text at once with NumPy, without building a dict per
+row. Chunks with any line the expression doesn't match, as when keys
+are missing, reordered or hold arrays or objects, are instead parsed a
+line at a time with the json module, pulling each field out of the rows
+and converting it a column at a time.
+
+Chunks are Chunk tuples, as csvfile.read_csv gives, with missing and
+null values of option fields marked in validity bitmaps.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import json
+import re
+from itertools import islice
+from operator import itemgetter, methodcaller
+
+import numpy as np
+
+from . import coretypes as ct
+from .caching import LRUCache
+from .csvfile import Chunk, _datetime_strings, _ordered_map, _record_fields
+from .option import _pack
+from .py2help import _inttypes, _strtypes, unicode
+from .util import dshape
+
+__all__ = ['read_jsonl']
+
+
+# The values put where fields are missing, by NumPy dtype kind, so the
+# columns convert
+_fills = {'b': False, 'i': 0, 'u': 0, 'f': 0.0, 'c': 0j, 'M': 'NaT',
+          'm': 'NaT', 'U': '', 'S': b''}
+
+# The Python types JSON values of each kind of field may have
+_bool_types = frozenset([bool])
+_int_types = frozenset(_inttypes)
+_float_types = _int_types | frozenset([float])
+_str_types = frozenset([unicode])
+
+
+def _value_types(m, dt):
+    """The Python types the JSON values of a field may have."""
+    if dt.kind == 'b':
+        return _bool_types
+    elif dt.kind in 'iu':
+        return _int_types
+    elif dt.kind in 'fc':
+        return _float_types
+    elif dt.kind == 'm':
+        return _int_types | _str_types
+    return _str_types
+
+
+# The field decoders of record datashapes, by datashape string
+_decoder_cache = LRUCache(64)
+
+
+def _decoders(ds_str):
+    """
+    Compiles a record datashape into the structured dtype of its rows
+    and a (name, getter, measure, dtype, value types, fill, optional)
+    tuple per field.
+    """
+    result = _decoder_cache.get(ds_str)
+    if result is None:
+        fields = _record_fields(dshape(ds_str))
+        dtype = np.dtype([(name, dt) for name, _, dt, _ in fields])
+        result = (dtype, [(name, methodcaller('get', name), m, dt,
+                           _value_types(m, dt), _fills.get(dt.kind),
+                           optional)
+                          for name, m, dt, optional in fields])
+        _decoder_cache.put(ds_str, result)
+    return result
+
+
+# JSON values, as regular expressions matching their text
+_json_string = r'"[^"\\\x00-\x1f]*(?:\\.[^"\\\x00-\x1f]*)*"'
+_json_int = r'-?(?:0|[1-9][0-9]*)'
+_json_number = _json_int + r'(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?'
+_json_scalar = '|'.join([_json_string, _json_number, 'true', 'false',
+                         'null'])
+# The JSON values of fields of each NumPy dtype kind
+_kind_patterns = {'b': 'true|false', 'i': _json_int, 'u': _json_int,
+                  'f': _json_number, 'U': _json_string, 'S': _json_string,
+                  'O': _json_string, 'M': _json_string}
+_ws = '[ \t\r]*'
+
+# The line patterns of record datashapes, by datashape string and keys
+_line_cache = LRUCache(64)
+
+
+def _line_pattern(ds_str, keys):
+    """
+    Compiles the regular expression matching lines of a record
+    datashape with the given keys, in order, and a group per field. Its
+    groups are in the order of the keys, given by the list of their
+    fields' indices in the datashape. Returns None if the fields can't
+    be matched this way, as when one is missing.
+    """
+    key = (ds_str, keys)
+    result = _line_cache.get(key)
+    if result is None:
+        dtype, decoders = _decoders(ds_str)
+        index = dict((d[0], i) for i, d in enumerate(decoders))
+        order = [index[k] for k in keys if k in index]
+        patterns = []
+        for k in keys:
+            if k in index:
+                name, _, _, dt, _, _, optional = decoders[index[k]]
+                value = _kind_patterns.get(dt.kind)
+                if value is None:
+                    break
+                value = '(%s%s)' % (value, '|null' if optional else '')
+            else:
+                value = '(?:%s)' % _json_scalar
+            patterns.append(re.escape(json.dumps(k)) + _ws + ':' + _ws +
+                            value)
+        else:
+            if len(set(keys)) == len(keys) and len(order) == len(decoders):
+                result = (re.compile('^' + _ws + '\\{' + _ws +
+                                     (_ws + ',' + _ws).join(patterns) +
+                                     _ws + '\\}' + _ws + '$', re.M), order)
+        if result is None:
+            result = (None, None)
+        _line_cache.put(key, result)
+    return result
+
+
+def _keys(line):
+    """
+    The keys of the JSON object on a line, or None if it is not an
+    object or has an array or object value.
+    """
+    try:
+        pairs = _pairs_decode(line)
+    except ValueError:
+        return None
+    if type(pairs) is not tuple or any(type(v) in _nested_types
+                                       for k, v in pairs):
+        return None
+    return tuple(k for k, v in pairs)
+
+
+# json.loads giving objects as tuples of (key, value) pairs, and arrays
+# as lists
+_pairs_decode = json.JSONDecoder(object_pairs_hook=tuple).decode
+_nested_types = frozenset([tuple, list])
+
+
+def _parse_fields(lines, ds_str):
+    """
+    Finds the text of each field of a list of JSON lines with a line
+    pattern, returning a column of texts per field in the datashape's
+    order, or None if a line doesn't match.
+    """
+    keys = _keys(lines[0])
+    if keys is None:
+        return None
+    pattern, order = _line_pattern(ds_str, keys)
+    if pattern is None:
+        return None
+    matches = pattern.findall('\n'.join(lines))
+    if len(matches) != len(lines):
+        return None
+    if len(order) == 1:
+        matches = [(m,) for m in matches]
+    columns = [None] * len(order)
+    for i, column in zip(order, zip(*matches)):
+        columns[i] = column
+    return columns
+
+
+def _strings(texts):
+    """The strings in the texts of JSON strings, as a list."""
+    if '\\' in ''.join(texts):
+        return [_json_decode(t) if '\\' in t else t[1:-1] for t in texts]
+    return list(map(_unquote, texts))
+
+
+_unquote = itemgetter(slice(1, -1))
+_is_null = 'null'.__eq__
+_is_true = 'true'.__eq__
+
+
+def _convert_texts(texts, name, m, dt):
+    """
+    Converts the texts of the JSON values of a field, as _parse_fields
+    gives them, into an array of dt and the mask of its missing values.
+    Numbers and strings are converted by the int, float and str methods
+    mapped over the texts, which is faster than NumPy's conversions of
+    string arrays.
+    """
+    n = len(texts)
+    kind = dt.kind
+    missing = np.fromiter(map(_is_null, texts), dtype=bool, count=n)
+    if missing.any():
+        fill = '""' if kind in 'USOM' else '0'
+        texts = [fill if t == 'null' else t for t in texts]
+    if kind == 'b':
+        return np.fromiter(map(_is_true, texts), dtype=bool, count=n), missing
+    elif kind in 'USOM':
+        strings = _strings(texts)
+        if kind == 'M':
+            column = _datetimes(np.array(strings, dtype=np.str_), name, m)
+            column[missing] = 'NaT'
+        elif kind == 'O':
+            column = np.empty(n, dtype=object)
+            column[:] = strings
+            return column, missing
+        else:
+            column = strings
+    else:
+        column = map(int if kind in 'iu' else float, texts)
+    try:
+        if kind in 'iuf':
+            return np.fromiter(column, dtype=dt, count=n), missing
+        return np.asarray(column, dtype=dt), missing
+    except (ValueError, TypeError, OverflowError) as e:
+        raise ValueError('Field %s of type %s: %s' % (name, m, e))
+
+
+def _text_lines(lines, encoding):
+    """The lines of a chunk which aren't blank, as text."""
+    if bytes in set(map(type, lines)):
+        lines = [line.decode(encoding) if isinstance(line, bytes) else line
+                 for line in lines]
+    return list(filter(unicode.strip, lines))
+
+
+def _decode(lines):
+    """
+    Parses a list of JSON lines. Each line is parsed on its own, as
+    joining them into one JSON array would accept lines holding several
+    objects, or objects split over lines.
+    """
+    rows = list(map(_json_decode, lines))
+    if set(map(type, rows)) - _dict_types:
+        bad = next(row for row in rows if type(row) is not dict)
+        raise ValueError('JSON line %s is not an object' % json.dumps(bad))
+    return rows
+
+
+_dict_types = frozenset([dict])
+# json.loads without its checks of the argument
+_json_decode = json.JSONDecoder().decode
+
+
+def _datetimes(column, name, m):
+    """
+    Prepares an array of date and datetime strings of a field for
+    conversion, rejecting those with a UTC offset other than Z.
+    """
+    column, offset = _datetime_strings(column)
+    if offset.any():
+        raise ValueError('Field %s of type %s has the value %s, with a UTC '
+                         'offset' % (name, m, json.dumps(
+                             str(column[int(np.argmax(offset))]))))
+    return column
+
+
+def _parse_rows(lines, values, decoders):
+    """
+    Parses JSON lines into dicts, filling the structured array values
+    from them a column at a time, and returns the Chunk.
+    """
+    rows = _decode(lines)
+    n = len(rows)
+    validity = {}
+    for name, getter, m, dt, value_types, fill, optional in decoders:
+        column = np.fromiter(map(getter, rows), dtype=object, count=n)
+        missing = np.equal(column, None)
+        if optional:
+            validity[name] = _pack(~missing)
+        elif missing.any():
+            raise ValueError('Field %s of type %s is missing or null in '
+                             'JSON line %s' % (name, m, json.dumps(
+                                 rows[int(np.argmax(missing))])))
+        # NumPy would convert values of the wrong type, such as 1.7 or
+        # true to an integer, so their types are checked first
+        present = column[~missing] if optional else column
+        wrong = set(map(type, present)) - value_types
+        if wrong:
+            bad = next(x for x in present if type(x) in wrong)
+            raise ValueError('Field %s of type %s has the value %s' %
+                             (name, m, json.dumps(bad)))
+        if dt.kind == 'O':
+            values[name] = column
+            continue
+        if fill is not None:
+            column[missing] = fill
+        if dt.kind == 'M':
+            column = _datetimes(column.astype(np.str_), name, m)
+        try:
+            values[name] = column.astype(dt)
+        except (ValueError, TypeError, OverflowError) as e:
+            raise ValueError('Field %s of type %s: %s' % (name, m, e))
+    return Chunk(values, validity)
+
+
+def _parse_chunk(task):
+    """Parses a chunk of JSON lines into a Chunk of the datashape."""
+    lines, ds_str, encoding = task
+    lines = _text_lines(lines, encoding)
+    dtype, decoders = _decoders(ds_str)
+    values = np.empty(len(lines), dtype=dtype)
+    columns = _parse_fields(lines, ds_str) if lines else None
+    if columns is None:
+        return _parse_rows(lines, values, decoders)
+    validity = {}
+    for (name, _, m, dt, _, _, optional), texts in zip(decoders, columns):
+        column, missing = _convert_texts(texts, name, m, dt)
+        if optional:
+            validity[name] = _pack(~missing)
+        values[name] = column
+    return Chunk(values, validity)
+
+
+def read_jsonl(source, ds, chunksize=65536, processes=1, encoding='utf-8'):
+    """
+    Reads JSON lines in chunks, each parsed into a Chunk of a structured
+    array and the validity bitmaps of its option fields.
+
+    Parameters
+    ----------
+    source : str, file or iterable
+        The path of the file, a file open for reading, or an iterable of
+        lines, as text or bytes. Blank lines are skipped.
+    ds : DataShape or str
+        The record datashape of the rows. Fields may be booleans,
+        numbers, strings, dates, datetimes and options of those. Fixed
+        length strings, string[n], are truncated as NumPy does, and
+        other strings are Python objects.
+    chunksize : int, optional
+        The number of lines in each chunk, including blank ones.
+    processes : int, optional
+        The number of worker processes parsing chunks, by default one,
+        parsing in this process. None uses every CPU.
+    encoding : str, optional
+        The encoding of the lines, when given a path or bytes.
+
+    Fields which are missing from a line, or null, are missing values of
+    option fields. Other fields raise ValueError, as do values of the
+    wrong JSON type for their field, such as 1.5 or true for an integer
+    or a number for a string, and strings which don't parse as dates or
+    are datetimes with a UTC offset other than Z.
+    Keys not in the datashape are ignored.
+
+    >>> chunk, = read_jsonl(['{"id": 1, "tag": "a"}', '{"id": 2}'],
+    ...                     '{id: int32, tag: option[string[4]]}')
+    >>> chunk.values['id']
+    array([1, 2], dtype=int32)
+    >>> chunk.column('tag')[1] is None
+    True
+    """
+    if isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    m = ds.measure if isinstance(ds, ct.DataShape) else ds
+    ds_str = str(m)
+    # Checks the datashape before any work starts
+    _decoders(ds_str)
+
+    close = isinstance(source, _strtypes)
+    if close:
+        source = io.open(source, 'r', encoding=encoding)
+    try:
+        lines = iter(source)
+        tasks = iter(lambda: (list(islice(lines, chunksize)), ds_str,
+                              encoding), ([], ds_str, encoding))
+        for chunk in _ordered_map(_parse_chunk, tasks, processes):
+            # A chunk of only blank lines has no rows
+            if len(chunk):
+                yield chunk
+    finally:
+        if close:
+            source.close()
@@ -0,0 +1,306 @@
+"""
+The C memory layout of datashape types.
+
+Computes the itemsize, alignment, strides, field offsets and padding of
+any type whose size is fixed: C types, fixed length strings, records and
+tuples of those, and datashapes whose dimensions are all fixed. Records
+and tuples are laid out like C structs, each field at the next offset
+which is a multiple of its alignment, which is also what NumPy does for
+``np.dtype(..., align=True)``.
+
+A buffer holding data in this layout can be viewed as a NumPy array
+without copying it.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import coretypes as ct
+from .error import LayoutError
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['Layout', 'memory_layout', 'view']
+
+
+# Bytes per code unit of each canonical string encoding
+_string_unit_size = {u'A': 1, u'U8': 1, u'U16': 2, u'U32': 4}
+
+
+class Layout(namedtuple('Layout',
+                        'itemsize, alignment, shape, strides, offsets, '
+                        'padding')):
+    """
+    The memory layout of a datashape type.
+
+    Attributes
+    ----------
+    itemsize : int
+        The total size in bytes, including every element of the
+        dimensions and any trailing padding.
+    alignment : int
+        The alignment in bytes of the start of the data.
+    shape : tuple of int
+        The fixed dimensions, empty for a measure.
+    strides : tuple of int
+        The byte strides of the dimensions.
+    offsets : tuple of int
+        For a record or tuple, or a datashape of one, the byte offset of
+        each field within an element. Empty for other types.
+    padding : tuple of int
+        The padding bytes after each field in offsets. The last entry is
+        the padding at the end of the element.
+    """
+    __slots__ = ()
+
+
+def _c_strides(shape, itemsize):
+    strides = []
+    for dim in reversed(shape):
+        strides.append(itemsize)
+        itemsize *= dim
+    return tuple(reversed(strides))
+
+
+def _f_strides(shape, itemsize):
+    strides = []
+    for dim in shape:
+        strides.append(itemsize)
+        itemsize *= dim
+    return tuple(strides)
+
+
+def _round_up(n, alignment):
+    return (n + alignment - 1) // alignment * alignment
+
+
+def _struct_layout(fields):
+    offsets = []
+    ends = []
+    alignment = 1
+    offset = 0
+    for f in fields:
+        offset = _round_up(offset, f.alignment)
+        offsets.append(offset)
+        offset += f.itemsize
+        ends.append(offset)
+        alignment = max(alignment, f.alignment)
+    itemsize = _round_up(offset, alignment)
+    padding = tuple(start - end for start, end in
+                    zip(offsets[1:] + [itemsize], ends))
+    return Layout(itemsize, alignment, (), (), tuple(offsets), padding)
+
+
+def _layout_children(t):
+    """The types whose layouts make up the layout of t."""
+    if isinstance(t, ct.DataShape):
+        return (t.measure,)
+    elif isinstance(t, ct.Record):
+        return t.types
+    elif isinstance(t, ct.Tuple):
+        return t.dshapes
+    else:
+        return ()
+
+
+def _build_layout(t, children):
+    if isinstance(t, ct.DataShape):
+        shape = []
+        for dim in t.shape:
+            if not isinstance(dim, ct.Fixed):
+                raise LayoutError('Datashape %s has dimension %s, which is '
+                                  'not fixed' % (t, dim))
+            shape.append(dim.val)
+        shape = tuple(shape)
+        elem = children[0]
+        count = 1
+        for dim in shape:
+            count *= dim
+        return Layout(elem.itemsize * count, elem.alignment, shape,
+                      _c_strides(shape, elem.itemsize), elem.offsets,
+                      elem.padding)
+    elif isinstance(t, (ct.Record, ct.Tuple)):
+        return _struct_layout(children)
+    elif isinstance(t, ct.CType):
+        return Layout(t.itemsize, t.c_alignment, (), (), (), ())
+    elif isinstance(t, ct.String) and t.fixlen is not None:
+        unit = _string_unit_size[t.encoding]
+        return Layout(t.fixlen * unit, unit, (), (), (), ())
+    else:
+        raise LayoutError('Type %s does not have a fixed memory layout' % t)
+
+
+def _compute_layout(root):
+    # Bottom up with an explicit stack, so deeply nested types don't hit
+    # the recursion limit. Each layout is stored on its type.
+    stack = [root]
+    while stack:
+        t = stack[-1]
+        if hasattr(t, '_layout'):
+            stack.pop()
+            continue
+        children = _layout_children(t)
+        missing = [c for c in children if not hasattr(c, '_layout')]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        t._layout = _build_layout(t, [c._layout for c in children])
+    return root._layout
+
+
+def memory_layout(ds, order='C'):
+    """
+    Returns the memory layout of a fixed size datashape type.
+
+    The layout is computed once per type and cached on it.
+
+    Parameters
+    ----------
+    ds : Mono
+        The type. Every dimension must be fixed, and every measure a C
+        type, a fixed length string, or a record or tuple of those.
+    order : 'C' or 'F', optional
+        Whether the dimensions are laid out in C (row-major) or Fortran
+        (column-major) order. Only the strides differ.
+
+    Returns
+    -------
+    Layout
+
+    >>> from datashape import dshape
+    >>> lay = memory_layout(dshape('2 * {a: int8, b: int32}'))
+    >>> lay.itemsize, lay.strides, lay.offsets, lay.padding
+    (16, (8,), (0, 4), (3, 0))
+    """
+    try:
+        lay = ds._layout
+    except AttributeError:
+        lay = _compute_layout(ds)
+    if order == 'C':
+        return lay
+    elif order == 'F':
+        if not lay.shape:
+            return lay
+        return lay._replace(strides=_f_strides(lay.shape, lay.strides[-1]))
+    else:
+        raise ValueError("Layout order must be 'C' or 'F', not %r" % (order,))
+
+
+#------------------------------------------------------------------------
+# Zero-copy views
+#------------------------------------------------------------------------
+
+def _layout_dtype(t):
+    """
+    The NumPy dtype of a fixed size type, with exactly the offsets and
+    itemsize of its layout.
+    """
+    if isinstance(t, ct.DataShape):
+        dt = _layout_dtype(t.measure)
+        shape = memory_layout(t).shape
+        return np.dtype((dt, shape)) if shape else dt
+    elif isinstance(t, (ct.Record, ct.Tuple)):
+        lay = memory_layout(t)
+        if isinstance(t, ct.Record):
+            names, types = t.names, t.types
+        else:
+            types = t.dshapes
+            names = ['f%d' % i for i in range(len(types))]
+        return np.dtype({'names': names,
+                         'formats': [_layout_dtype(x) for x in types],
+                         'offsets': list(lay.offsets),
+                         'itemsize': lay.itemsize,
+                         'aligned': True})
+    elif isinstance(t, ct.String):
+        memory_layout(t)
+        if t.encoding == u'U32':
+            return np.dtype('U%d' % t.fixlen)
+        elif t.encoding == u'U16':
+            # NumPy has no UTF-16 strings, so expose the code units
+            return np.dtype((np.uint16, t.fixlen))
+        else:
+            return np.dtype('S%d' % t.fixlen)
+    else:
+        memory_layout(t)
+        return t.to_numpy_dtype()
+
+
+def view(buffer, ds, offset=0, count=None, byteorder='='):
+    """
+    Views the data in a buffer as a NumPy array, without copying it.
+
+    The data must be in the C layout of the datashape, as given by
+    memory_layout. The array shares memory with the buffer, and is
+    writable if the buffer is.
+
+    Parameters
+    ----------
+    buffer : object supporting the buffer protocol
+        e.g. bytes, bytearray, a contiguous memoryview, or an mmap.
+    ds : Mono or string
+        The fixed size datashape of the data.
+    offset : int, optional
+        The byte offset in the buffer at which the data starts. The
+        address there must be a multiple of the datashape's alignment.
+    count : int, optional
+        If given, the buffer holds this many consecutive values of the
+        datashape, which become a new leading dimension of the array.
+        A count of -1 takes as many as the rest of the buffer holds.
+    byteorder : {'=', '<', '>'}, optional
+        The byte order of the values in the buffer, by default native.
+
+    Returns
+    -------
+    numpy.ndarray
+
+    >>> import numpy as np
+    >>> buf = np.arange(7, dtype='int32').tobytes()
+    >>> view(buf, '3 * int32', offset=4).tolist()
+    [1, 2, 3]
+    >>> view(buf, '3 * int32', offset=4, count=-1).tolist()
+    [[1, 2, 3], [4, 5, 6]]
+    """
+    if isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    lay = memory_layout(ds)
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    if offset < 0 or offset > len(raw):
+        raise ValueError('Offset %d is outside the buffer of %d bytes' %
+                         (offset, len(raw)))
+    if count is None:
+        shape, strides = lay.shape, lay.strides
+        nbytes = lay.itemsize
+    else:
+        if count == -1:
+            if lay.itemsize == 0:
+                raise ValueError('Cannot take count=-1 values of %s, '
+                                 'which has size 0' % ds)
+            count, rest = divmod(len(raw) - offset, lay.itemsize)
+            if rest:
+                raise ValueError('The %d bytes after offset %d are not a '
+                                 'whole number of %s values' %
+                                 (len(raw) - offset, offset, ds))
+        elif count < 0:
+            raise ValueError('Count must be nonnegative or -1, not %d' %
+                             count)
+        shape = (count,) + lay.shape
+        strides = (lay.itemsize,) + lay.strides
+        nbytes = lay.itemsize * count
+    if offset + nbytes > len(raw):
+        raise ValueError('Buffer of %d bytes is too small for %s at '
+                         'offset %d, which needs %d bytes' %
+                         (len(raw), ds, offset, offset + nbytes))
+    address = raw.__array_interface__['data'][0] + offset
+    if address % lay.alignment:
+        raise ValueError('Data at offset %d is not aligned to the %d '
+                         'bytes required by %s' %
+                         (offset, lay.alignment, ds))
+    dtype = _layout_dtype(ds.measure)
+    if byteorder != '=':
+        dtype = dtype.newbyteorder(byteorder)
+    return np.ndarray(shape, dtype, buffer=raw, offset=offset,
+                      strides=strides)
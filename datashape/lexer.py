@@ -5,19 +5,39 @@ Lexer for the datashape grammar.
 from __future__ import absolute_import, division, print_function
 
 import re
-import ast
+import array
 import collections
 
 from . import error
+from .py2help import unicode
 
 # This is updated to include all the token names from _tokens,
 # where e.g. _tokens[NAME_LOWER-1] is the entry for NAME_LOWER
-__all__ = ['lex', 'Token']
+__all__ = ['lex', 'lex_all', 'is_token_prefix', 'Token', 'TokenArrays']
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+# The escapes allowed by the STRING token, other than \uXXXX
+_str_escapes = {u'"': u'"', u"'": u"'", u'b': u'\b', u'f': u'\f',
+                u'n': u'\n', u'r': u'\r', u't': u'\t'}
+_str_escape_re = re.compile(r'\\(?:u([0-9a-fA-F]{4})|(.))')
+
+def _str_unescape(m):
+    if m.group(1):
+        return unichr(int(m.group(1), 16))
+    return _str_escapes[m.group(2)]
 
 def _str_val(s):
-    # Use the Python parser via the ast module to parse the string,
-    # since the string_escape and unicode_escape codecs do the wrong thing
-    return ast.parse('u' + s).body[0].value.s
+    # The STRING regex only admits \uXXXX and the escapes in _str_escapes,
+    # so they can be decoded directly instead of by a codec, which would
+    # also interpret other escapes
+    body = unicode(s[1:-1])
+    if u'\\' not in body:
+        return body
+    return _str_escape_re.sub(_str_unescape, body)
 
 # A list of the token names, corresponding regex, and value extraction function
 _tokens = [
@@ -54,8 +74,25 @@ _tokens_re = re.compile('|'.join('(' + tok[1] + ')' for tok in _tokens),
                         re.MULTILINE)
 _whitespace_re = re.compile(_whitespace, re.MULTILINE)
 
+# Matches the whitespace before a token, then either the token, the
+# start of an invalid token, or the end of the string
+_bulk_re = re.compile(_whitespace + '(?:' +
+                      ''.join('(' + tok[1] + ')|' for tok in _tokens) +
+                      r'([^\s#])|(\Z))', re.MULTILINE)
+_INVALID = len(_tokens) + 1
+_END = len(_tokens) + 2
+
+# Matches the start of a token which was cut off by the end of the
+# string, as when lexing a partially received stream
+_token_prefix_re = re.compile(r'(?:\.\.?|-|' +
+    r'''"(?:[^"\n\r\\]|\\u[0-9a-fA-F]{4}|\\["bfnrt])*(?:\\(?:u[0-9a-fA-F]{0,3})?)?|''' +
+    r''''(?:[^'\n\r\\]|\\u[0-9a-fA-F]{4}|\\['bfnrt])*(?:\\(?:u[0-9a-fA-F]{0,3})?)?)\Z''')
+
 Token = collections.namedtuple('Token', 'id, name, span, val')
 
+TokenArrays = collections.namedtuple('TokenArrays',
+                                     'ids, starts, ends, values, error_pos')
+
 def lex(ds_str):
     """A generator which lexes a datashape string into a
     sequence of tokens.
@@ -99,3 +136,52 @@ def lex(ds_str):
         if m:
             pos = m.end()
 
+
+def lex_all(ds_str, pos=0):
+    """Lexes a whole datashape string in one pass into parallel
+    arrays, instead of one Token object per token. Lexing starts at
+    offset pos, which must be the start of the string or the end of
+    a token, and the offsets of the tokens are from the string's start.
+
+    Returns a TokenArrays(ids, starts, ends, values, error_pos) tuple.
+    The token ids, start and end offsets are compact arrays, and values
+    is a list holding each token's value or None. If an invalid token
+    is found, lexing stops there and error_pos is its offset, otherwise
+    error_pos is None. This lets a parser report a syntax error it finds
+    earlier in the string first, as it would with lex().
+    """
+    ids = array.array('b')
+    starts = array.array('l')
+    ends = array.array('l')
+    values = []
+    error_pos = None
+    # Bound methods, since this loop runs once per token
+    add_id, add_start, add_end = ids.append, starts.append, ends.append
+    add_value = values.append
+    for m in _bulk_re.finditer(ds_str, pos):
+        id = m.lastindex
+        start, end = m.span(id)
+        if id <= NAME_OTHER:
+            add_value(ds_str[start:end])
+        elif id == INTEGER:
+            add_value(int(ds_str[start:end]))
+        elif id == STRING:
+            add_value(_str_val(ds_str[start:end]))
+        elif id == _INVALID:
+            error_pos = start
+            break
+        elif id == _END:
+            break
+        else:
+            add_value(None)
+        add_id(id)
+        add_start(start)
+        add_end(end)
+    return TokenArrays(ids, starts, ends, values, error_pos)
+
+
+def is_token_prefix(ds_str, pos):
+    """Returns True if the invalid token lex_all stopped at, at offset
+    pos, may still become a valid token if more text is appended.
+    """
+    return _token_prefix_re.match(ds_str, pos) is not None
@@ -0,0 +1,236 @@
+"""
+Storage for arrays of optional values, of datashape ``N * option[T]``.
+
+An OptionArray holds the values in a NumPy array of T, with whatever
+happens to be in the slots of missing values, and a validity bitmap,
+where bit i is set if value i is present. The bitmap is packed eight
+values to a byte, least significant bit first, as in Apache Arrow, and
+any bits past the last value are zero.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from . import coretypes as ct
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['OptionArray', 'to_numpy_option', 'null_count', 'bitmap_and',
+           'bitmap_or']
+
+
+#------------------------------------------------------------------------
+# Bitmap kernels
+#------------------------------------------------------------------------
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    # NumPy before 2.0
+    _popcount_table = np.array([bin(i).count('1') for i in range(256)],
+                               dtype=np.uint8)
+
+    def _popcount(a):
+        return _popcount_table[a]
+
+
+def _pack(valid):
+    return np.packbits(valid, bitorder='little')
+
+
+def _unpack(bitmap, length):
+    return np.unpackbits(bitmap, count=length,
+                         bitorder='little').view(np.bool_)
+
+
+def null_count(bitmap, length):
+    """Returns the number of unset bits among the first length bits."""
+    full, rest = divmod(length, 8)
+    valid = int(_popcount(bitmap[:full]).sum(dtype=np.int64))
+    if rest:
+        valid += int(_popcount(bitmap[full] & ((1 << rest) - 1)))
+    return length - valid
+
+
+def bitmap_and(*bitmaps):
+    """
+    Combines validity bitmaps so a value is valid where it is valid in
+    all of them.
+    """
+    return np.bitwise_and.reduce(bitmaps)
+
+
+def bitmap_or(*bitmaps):
+    """
+    Combines validity bitmaps so a value is valid where it is valid in
+    any of them.
+    """
+    return np.bitwise_or.reduce(bitmaps)
+
+
+def to_numpy_option(ds):
+    """
+    Describes the NumPy buffers of an OptionArray of datashape
+    ``N * option[T]``, as a pair of (shape, dtype) tuples, one for the
+    values and one for the validity bitmap.
+
+    A single dtype can't hold a packed bitmap, so to_numpy rejects
+    option types.
+
+    >>> from datashape import dshape
+    >>> to_numpy_option(dshape('10 * option[int32]'))
+    (((10,), dtype('int32')), ((2,), dtype('uint8')))
+    """
+    if isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    if not isinstance(ds, ct.DataShape) or not isinstance(ds.measure,
+                                                          ct.Option):
+        raise TypeError('Expected an option datashape, not %s' % ds)
+    shape, dtype = ct.to_numpy(ct.DataShape(*ds.shape + (ds.measure.ty,)))
+    if -1 in shape:
+        size = -1
+    else:
+        size = 1
+        for dim in shape:
+            size *= dim
+        size = (size + 7) // 8
+    return (shape, dtype), ((size,), np.dtype(np.uint8))
+
+
+#------------------------------------------------------------------------
+# Option arrays
+#------------------------------------------------------------------------
+
+class OptionArray(object):
+    """
+    A one dimensional array of optional values, of datashape
+    ``N * option[T]``.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        The N values. Those which are missing can hold anything.
+    validity : numpy.ndarray of uint8
+        The packed validity bitmap, of at least (N + 7) // 8 bytes.
+    """
+    def __init__(self, values, validity):
+        values = np.asarray(values)
+        validity = np.ascontiguousarray(validity, dtype=np.uint8)
+        if values.ndim != 1:
+            raise ValueError('Option array values must be one dimensional')
+        if len(validity) < (len(values) + 7) // 8:
+            raise ValueError('A validity bitmap of %d bytes is too short '
+                             'for %d values' % (len(validity), len(values)))
+        self.values = values
+        self.validity = validity
+
+    @classmethod
+    def from_mask(cls, values, valid):
+        """Builds an option array from values and a boolean validity mask."""
+        return cls(values, _pack(np.asarray(valid, dtype=np.bool_)))
+
+    @classmethod
+    def from_masked(cls, array):
+        """Builds an option array from a NumPy masked array."""
+        return cls.from_mask(np.ma.getdata(array),
+                             ~np.ma.getmaskarray(array))
+
+    @classmethod
+    def from_sentinel(cls, values, sentinel):
+        """
+        Builds an option array from values where sentinel marks those
+        which are missing. A sentinel of NaN or NaT matches any NaN or
+        NaT.
+        """
+        values = np.asarray(values)
+        if values.dtype.kind in 'Mm' and np.isnat(np.asarray(sentinel,
+                                                            values.dtype)):
+            valid = ~np.isnat(values)
+        elif isinstance(sentinel, float) and np.isnan(sentinel):
+            valid = ~np.isnan(values)
+        else:
+            valid = values != sentinel
+        return cls.from_mask(values, valid)
+
+    @classmethod
+    def from_objects(cls, objs, dtype=None):
+        """
+        Builds an option array from a sequence where None marks the
+        missing values.
+        """
+        valid = np.fromiter((x is not None for x in objs), dtype=np.bool_,
+                            count=len(objs))
+        present = np.array([x for x in objs if x is not None], dtype=dtype)
+        values = np.zeros(len(objs), dtype=present.dtype)
+        values[valid] = present
+        return cls(values, _pack(valid))
+
+    @property
+    def dshape(self):
+        """The datashape, N * option[T]."""
+        return ct.DataShape(ct.Fixed(len(self)),
+                            ct.Option(ct.from_numpy((), self.values.dtype)))
+
+    @property
+    def null_count(self):
+        """The number of missing values."""
+        return null_count(self.validity, len(self))
+
+    @property
+    def nbytes(self):
+        """The bytes used by the values and the validity bitmap."""
+        return self.values.nbytes + (len(self) + 7) // 8
+
+    def valid_mask(self):
+        """Unpacks the validity bitmap into a boolean array."""
+        return _unpack(self.validity, len(self))
+
+    def to_masked(self):
+        """Converts to a NumPy masked array."""
+        return np.ma.MaskedArray(self.values, mask=~self.valid_mask())
+
+    def to_sentinel(self, sentinel):
+        """Returns a copy of the values with sentinel where missing."""
+        return np.where(self.valid_mask(), self.values,
+                        np.asarray(sentinel, dtype=self.values.dtype))
+
+    def to_objects(self):
+        """Returns an object array with None where missing."""
+        out = self.values.astype(object)
+        out[~self.valid_mask()] = None
+        return out
+
+    def filter(self, selection):
+        """
+        Returns the option array of the values where the boolean
+        selection is true.
+        """
+        selection = np.asarray(selection, dtype=np.bool_)
+        if selection.shape != self.values.shape:
+            raise ValueError('Selection of shape %s does not match %d '
+                             'values' % (selection.shape, len(self)))
+        return OptionArray(self.values[selection],
+                           _pack(self.valid_mask()[selection]))
+
+    def dropna(self):
+        """Returns the values which are present."""
+        return self.values[self.valid_mask()]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        """The value at i, or None if it is missing."""
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Index %d is out of range for %d values' %
+                             (i, len(self)))
+        if self.validity[i >> 3] & (1 << (i & 7)):
+            return self.values[i]
+        return None
+
+    def __repr__(self):
+        return 'OptionArray(dshape="%s")' % self.dshape
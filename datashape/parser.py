@@ -1,97 +1,119 @@
 """
 Parser for the datashape grammar.
+
+The parser is predictive: every decision is made by looking at most two
+tokens past the current one, together with the symbol table, so it never
+backtracks. Nested constructs are parsed with an explicit stack of frames
+instead of recursion, so the nesting depth of a datashape is not limited
+by Python's recursion limit.
 """
 
 from __future__ import absolute_import, division, print_function
 
+import array
+import codecs
+import mmap
+import re
+
 from . import lexer, error
+from .py2help import unicode, RecursionError
 # TODO: Remove coretypes dependency, make 100% of interaction through
 #       the type symbol table
 from . import coretypes
 
-__all__ = ['parse']
+__all__ = ['parse', 'parse_ast', 'ast_to_type', 'ast_ndim', 'ast_has_var',
+           'ast_field_names', 'PushParser', 'iterparse']
 
 class DataShapeParser(object):
     """A DataShape parser object."""
-    def __init__(self, ds_str, sym):
+    def __init__(self, ds_str, sym, tokens=None):
         # The datashape string being parsed
         self.ds_str = ds_str
         # Symbol tables for dimensions, dtypes, and type constructors for each
         self.sym = sym
-        # The lexer
-        self.lex = lexer.lex(ds_str)
-        # The array of tokens self.lex has already produced
-        self.tokens = []
-        # The token currently being examined, and
-        # the end position, set when self.lex is exhausted
-        self.pos = -1
-        self.end_pos = None
-        # Advance to the first token
-        self.advance_tok()
+        # The token arrays of the whole string, as produced by lexer.lex_all
+        if tokens is None:
+            tokens = lexer.lex_all(ds_str)
+        self.ids = tokens.ids
+        self.starts = tokens.starts
+        self.ends = tokens.ends
+        self.values = tokens.values
+        # Position just past the last token, which is either the end
+        # of the string or an invalid token reported only once reached
+        self.ntokens = len(tokens.ids)
+        self.lex_error_pos = tokens.error_pos
+        if self.lex_error_pos is None and self.ntokens > 0:
+            self.eof_start = tokens.ends[-1]
+        else:
+            self.eof_start = self.lex_error_pos or 0
+        # Set when the parser looks at the end of the tokens, which
+        # for a partially received stream means more may follow
+        self.hit_end = False
+        # The token currently being examined, its id, and the end
+        # position, which is None if there is an invalid token
+        self.pos = 0
+        self.end_pos = self.ntokens if self.lex_error_pos is None else None
+        self.tok_id = self._id_at(0)
+
+    def _id_at(self, pos):
+        """Returns the id of the token at pos, None for the end of the
+        string, or raises the lexer error if pos reaches an invalid token.
+        """
+        if pos < self.ntokens:
+            return self.ids[pos]
+        elif self.lex_error_pos is not None:
+            raise error.DataShapeSyntaxError(self.lex_error_pos, '<nofile>',
+                                             self.ds_str,
+                                             'Invalid DataShape token')
+        else:
+            self.hit_end = True
+            return None
 
     def advance_tok(self):
         """Advances self.pos by one, if it is not already at the end."""
-        if self.pos != self.end_pos:
-            self.pos = self.pos + 1
-            try:
-                # If self.pos has not been backtracked,
-                # we need to request a new token from the lexer
-                if self.pos >= len(self.tokens):
-                    self.tokens.append(next(self.lex))
-            except StopIteration:
-                # Create an EOF token, whose span starts at the
-                # end of the last token to use for error messages
-                if len(self.tokens) > 0:
-                    span = (self.tokens[self.pos-1].span[1],)*2
-                else:
-                    span = (0, 0)
-                self.tokens.append(lexer.Token(None, None, span, None))
-                self.end_pos = self.pos
+        pos = self.pos
+        if pos != self.end_pos:
+            pos += 1
+            self.pos = pos
+            # The common case of _id_at, inline as it runs per token
+            if pos < self.ntokens:
+                self.tok_id = self.ids[pos]
+            else:
+                self.tok_id = self._id_at(pos)
+
+    def peek_id(self, n=1):
+        """Returns the id of the token n positions past the current one."""
+        return self._id_at(self.pos + n)
+
+    @property
+    def tok_val(self):
+        """The value of the current token."""
+        if self.pos < self.ntokens:
+            return self.values[self.pos]
+        return None
+
+    @property
+    def tok_start(self):
+        """The offset in the string at which the current token starts."""
+        if self.pos < self.ntokens:
+            return self.starts[self.pos]
+        return self.eof_start
 
     @property
     def tok(self):
-        return self.tokens[self.pos]
+        """The current token as a lexer.Token, built on demand."""
+        if self.pos < self.ntokens:
+            pos = self.pos
+            id = self.ids[pos]
+            span = (self.starts[pos], self.ends[pos])
+            return lexer.Token(id, lexer._tokens[id - 1][0],
+                               span, self.values[pos])
+        return lexer.Token(None, None, (self.eof_start,)*2, None)
 
     def raise_error(self, errmsg):
-        raise error.DataShapeSyntaxError(self.tok.span[0], '<nofile>',
+        raise error.DataShapeSyntaxError(self.tok_start, '<nofile>',
                                          self.ds_str, errmsg)
 
-    def parse_homogeneous_list(self, parse_item, sep_tok_id, errmsg,
-                               trailing_sep=False):
-        """
-        <item>_list : <item> <SEP> <item>_list
-                    | <item>
-
-        Returns a list of <item>s, or None.
-        """
-        saved_pos = self.pos
-        # Parse zero or more "<item> <SEP>" repetitions
-        items = []
-        item = True
-        while item is not None:
-            # Parse the <item>
-            item = parse_item()
-            if item is not None:
-                items.append(item)
-                if self.tok.id == sep_tok_id:
-                    # If a <SEP> is next, there are more items
-                    self.advance_tok()
-                else:
-                    # Otherwise we've reached the end
-                    return items
-            else:
-                if len(items) > 0:
-                    if trailing_sep:
-                        return items
-                    else:
-                        # If we already saw "<item> <SEP>" at least once,
-                        # we can point at the more specific position within
-                        # the list of <item>s where the error occurred
-                        self.raise_error(errmsg)
-                else:
-                    self.pos = saved_pos
-                    return None
-
     def syntactic_sugar(self, symdict, name, dshapemsg, error_pos=None):
         """
         Looks up a symbol in the provided symbol table dictionary for
@@ -120,6 +142,29 @@ class DataShapeParser(object):
             self.raise_error(('Symbol table missing "%s" ' +
                              'entry for %s') % (name, dshapemsg))
 
+    def build_datashape(self, dims, dtype):
+        """Builds the datashape for a list of dims and a dtype."""
+        return coretypes.DataShape(*(dims + [dtype]))
+
+    def run(self, frame):
+        """
+        Runs the frame, and all the frames it pushes for nested
+        constructs, to completion. Returns the result of the frame.
+        """
+        stack = [frame]
+        value = None
+        while stack:
+            top = stack[-1]
+            child = top.step(self, value)
+            if child is None:
+                # The frame is complete, hand its result to its parent
+                stack.pop()
+                value = top.result
+            else:
+                stack.append(child)
+                value = None
+        return value
+
     def parse_datashape(self):
         """
         datashape : dim ASTERISK datashape
@@ -127,36 +172,7 @@ class DataShapeParser(object):
 
         Returns a datashape object or None.
         """
-        saved_pos = self.pos
-        # Parse zero or more "dim ASTERISK" repetitions
-        dims = []
-        dim = True
-        while dim is not None:
-            dim_saved_pos = self.pos
-            # Parse the dim
-            dim = self.parse_dim()
-            if dim is not None:
-                if self.tok.id == lexer.ASTERISK:
-                    # If an asterisk is next, we're good
-                    self.advance_tok()
-                    dims.append(dim)
-                else:
-                    # Otherwise try a dtype
-                    dim = None
-                    self.pos = dim_saved_pos
-        # Parse the dtype
-        dtype = self.parse_dtype()
-        if dtype:
-            return coretypes.DataShape(*(dims + [dtype]))
-        else:
-            if len(dims) > 0:
-                # If we already saw "dim ASTERISK" at least once,
-                # we can point at the more specific position within
-                # the datashape where the error occurred
-                self.raise_error('Expected a dtype')
-            else:
-                self.pos = saved_pos
-                return None
+        return self.run(_DatashapeFrame())
 
     def parse_dim(self):
         """
@@ -171,75 +187,73 @@ class DataShapeParser(object):
         type : NAME_LOWER
         type_constr : NAME_LOWER LBRACKET type_arg_list RBRACKET
 
-        Returns a the dim object, or None.
+        Parses a "dim ASTERISK" pair, returning the dim object, a frame
+        for a dim type constructor, or None without consuming any tokens
+        if no "dim ASTERISK" pair starts here.
         TODO: Support type constructors
         """
-        saved_pos = self.pos
-        tok = self.tok
-        if tok.id == lexer.NAME_UPPER:
-            val = tok.val
-            self.advance_tok()
-            if self.tok.id == lexer.ELLIPSIS:
-                self.advance_tok()
+        tok_id = self.tok_id
+        tok_val = self.tok_val
+        if tok_id == lexer.NAME_UPPER:
+            next_id = self.peek_id()
+            if next_id == lexer.ELLIPSIS:
+                asterisk = self.peek_id(2) == lexer.ASTERISK
                 # TypeVars ellipses are treated as the "ellipsis" dim
                 tconstr = self.syntactic_sugar(self.sym.dim_constr, 'ellipsis',
-                                               'TypeVar... dim constructor',
-                                               saved_pos)
-                return tconstr(val)
-            elif self.tok.id == lexer.ASTERISK:
+                                               'TypeVar... dim constructor')
+                if asterisk:
+                    self.advance_tok()
+                    self.advance_tok()
+                    self.advance_tok()
+                    return tconstr(tok_val)
+            elif next_id == lexer.ASTERISK:
                 # Using a lookahead check for '*' after the TypeVar, so that
                 # the error message would be about a dtype problem instead
                 # of a dim problem when 'typevar' isn't in the symbol table
                 #
                 # TypeVars are treated as the "typevar" dim
                 tconstr = self.syntactic_sugar(self.sym.dim_constr, 'typevar',
-                                               'TypeVar dim constructor',
-                                               saved_pos)
-                return tconstr(val)
-            else:
-                self.pos = saved_pos
-                return None
-        elif tok.id == lexer.NAME_LOWER:
-            name = tok.val
-            self.advance_tok()
-            if self.tok.id == lexer.LBRACKET:
-                dim_constr = self.sym.dim_constr.get(name)
+                                               'TypeVar dim constructor')
+                self.advance_tok()
+                self.advance_tok()
+                return tconstr(tok_val)
+            return None
+        elif tok_id == lexer.NAME_LOWER:
+            next_id = self.peek_id()
+            if next_id == lexer.LBRACKET:
+                dim_constr = self.sym.dim_constr.get(tok_val)
                 if dim_constr is None:
-                    self.pos = saved_pos
                     return None
                 self.advance_tok()
-                args = self.parse_type_arg_list()
-                if self.tok.id == lexer.RBRACKET:
-                    self.advance_tok()
-                    raise RuntimeError('dim type constructors not actually supported yet')
-                else:
-                    self.raise_error('Expected a closing "]"')
-            else:
-                dim = self.sym.dim.get(name)
-                if dim is not None:
-                    return dim
-                else:
-                    self.pos = saved_pos
-                    return None
-        elif tok.id == lexer.INTEGER:
-            val = tok.val
-            self.advance_tok()
+                self.advance_tok()
+                return _TypeConstrFrame(dim_constr, True)
+            dim = self.sym.dim.get(tok_val)
+            if dim is not None and next_id == lexer.ASTERISK:
+                self.advance_tok()
+                self.advance_tok()
+                return dim
+            return None
+        elif tok_id == lexer.INTEGER:
             # If the token after the INTEGER is not ASTERISK,
             # it cannot be a dim, so skip it
-            if self.tok.id != lexer.ASTERISK:
-                self.pos = saved_pos
+            if self.peek_id() != lexer.ASTERISK:
                 return None
+            self.advance_tok()
             # Integers are treated as "fixed" dimensions
             tconstr = self.syntactic_sugar(self.sym.dim_constr, 'fixed',
                                            'integer dimensions')
-            return tconstr(val)
-        elif tok.id == lexer.ELLIPSIS:
             self.advance_tok()
+            return tconstr(tok_val)
+        elif tok_id == lexer.ELLIPSIS:
+            asterisk = self.peek_id() == lexer.ASTERISK
             # Ellipses are treated as the "ellipsis" dim
             dim = self.syntactic_sugar(self.sym.dim, 'ellipsis',
-                                           '... dim',
-                                           saved_pos)
-            return dim
+                                       '... dim')
+            if asterisk:
+                self.advance_tok()
+                self.advance_tok()
+                return dim
+            return None
         else:
             return None
 
@@ -257,297 +271,368 @@ class DataShapeParser(object):
         struct_type : LBRACE ...
         funcproto_or_tuple_type : LPAREN ...
 
-        Returns a the dtype object, or None.
+        Returns the dtype object, a frame for a dtype which has nested
+        datashapes, or None without consuming any tokens.
         """
-        saved_pos = self.pos
-        tok = self.tok
-        if tok.id == lexer.NAME_UPPER:
-            val = tok.val
+        tok_id = self.tok_id
+        tok_val = self.tok_val
+        if tok_id == lexer.NAME_UPPER:
+            saved_pos = self.pos
             self.advance_tok()
             # TypeVars are treated as the "typevar" dtype
             tconstr = self.syntactic_sugar(self.sym.dtype_constr, 'typevar',
                                            'TypeVar dtype constructor',
                                            saved_pos)
-            return tconstr(val)
-        elif tok.id == lexer.NAME_LOWER:
-            name = tok.val
-            self.advance_tok()
-            if self.tok.id == lexer.LBRACKET:
-                dtype_constr = self.sym.dtype_constr.get(name)
+            return tconstr(tok_val)
+        elif tok_id == lexer.NAME_LOWER:
+            if self.peek_id() == lexer.LBRACKET:
+                dtype_constr = self.sym.dtype_constr.get(tok_val)
                 if dtype_constr is None:
-                    self.pos = saved_pos
                     return None
                 self.advance_tok()
-                args, kwargs = self.parse_type_arg_list()
-                if self.tok.id == lexer.RBRACKET:
-                    if len(args) == 0 and len(kwargs) == 0:
-                        self.raise_error('Expected at least one type ' +
-                                         'constructor argument')
-                    self.advance_tok()
-                    return dtype_constr(*args, **kwargs)
-                else:
-                    self.raise_error('Invalid type constructor argument')
-            else:
-                dtype = self.sym.dtype.get(name)
-                if dtype is not None:
-                    return dtype
-                else:
-                    self.pos = saved_pos
-                    return None
-        elif tok.id == lexer.LBRACE:
-            return self.parse_struct_type()
-        elif tok.id == lexer.LPAREN:
-            return self.parse_funcproto_or_tuple_type()
+                self.advance_tok()
+                return _TypeConstrFrame(dtype_constr, False)
+            dtype = self.sym.dtype.get(tok_val)
+            if dtype is not None:
+                self.advance_tok()
+            return dtype
+        elif tok_id == lexer.LBRACE:
+            return _StructFrame()
+        elif tok_id == lexer.LPAREN:
+            return _FuncprotoOrTupleFrame()
         else:
             return None
 
-    def parse_type_arg_list(self):
-        """
-        type_arg_list : type_arg COMMA type_arg_list
-                      | type_kwarg_list
-                      | type_arg
-        type_kwarg_list : type_kwarg COMMA type_kwarg_list
-                        | type_kwarg
-
-        Returns a tuple (args, kwargs), or (None, None).
+    def parse_scalar_list(self, tok_id, errmsg):
         """
-        # Parse zero or more "type_arg COMMA" repetitions
-        args = []
-        arg = True
-        while arg is not None:
-            # Parse the type_arg
-            arg = self.parse_type_arg()
-            if arg is not None:
-                if self.tok.id == lexer.COMMA:
-                    # If a comma is next, there are more args
-                    self.advance_tok()
-                    args.append(arg)
-                else:
-                    # Otherwise we've reached the end, and there
-                    # were no keyword args
-                    args.append(arg)
-                    return (args, {})
-            else:
-                break
-        kwargs = self.parse_homogeneous_list(self.parse_type_kwarg, lexer.COMMA,
-                                           'Expected another keyword argument, ' +
-                                           'positional arguments cannot follow ' +
-                                           'keyword arguments')
-        return (args, dict(kwargs) if kwargs else {})
+        integer_list : INTEGER COMMA integer_list
+                     | INTEGER
+        string_list : STRING COMMA string_list
+                    | STRING
 
-    def parse_type_arg(self):
-        """
-        type_arg : datashape
-                 | INTEGER
-                 | STRING
-                 | list_type_arg
-        list_type_arg : LBRACKET RBRACKET
-                      | LBRACKET datashape_list RBRACKET
-                      | LBRACKET integer_list RBRACKET
-                      | LBRACKET string_list RBRACKET
-
-        Returns a type_arg value, or None.
+        Returns a list of the values of tok_id tokens, or None.
         """
-        ds = self.parse_datashape()
-        if ds is not None:
-            return ds
-        if self.tok.id in [lexer.INTEGER, lexer.STRING]:
-            val = self.tok.val
+        if self.tok_id != tok_id:
+            return None
+        items = []
+        while True:
+            items.append(self.tok_val)
             self.advance_tok()
-            return val
-        elif self.tok.id == lexer.LBRACKET:
+            if self.tok_id != lexer.COMMA:
+                return items
             self.advance_tok()
-            val = self.parse_datashape_list()
-            if val is None:
-                val = self.parse_integer_list()
-            if val is None:
-                val = self.parse_string_list()
-            if self.tok.id == lexer.RBRACKET:
-                self.advance_tok()
-                return [] if val is None else val
-            else:
-                if val is None:
-                    self.raise_error('Expected a type constructor argument ' +
-                                     'or a closing "]"')
-                else:
-                    self.raise_error('Expected a "," or a closing "]"')
-        else:
-            return None
+            if self.tok_id != tok_id:
+                # If we already saw "<item> <SEP>" at least once,
+                # we can point at the more specific position within
+                # the list of <item>s where the error occurred
+                self.raise_error(errmsg)
 
-    def parse_type_kwarg(self):
-        """
-        type_kwarg : NAME_LOWER EQUAL type_arg
 
-        Returns a (name, type_arg) tuple, or None.
-        """
-        if self.tok.id != lexer.NAME_LOWER:
-            return None
-        saved_pos = self.pos
-        name = self.tok.val
-        self.advance_tok()
-        if self.tok.id != lexer.EQUAL:
-            self.pos = saved_pos
-            return None
-        self.advance_tok()
-        arg = self.parse_type_arg()
-        if arg is not None:
-            return (name, arg)
-        else:
-            # After "NAME_LOWER EQUAL", a type_arg is required.
-            self.raise_error('Expected a type constructor argument')
+class _Frame(object):
+    """
+    A partially parsed grammar construct on the DataShapeParser stack.
 
-    def parse_datashape_list(self):
-        """
-        datashape_list : datashape COMMA datashape_list
-                       | datashape
+    The parser calls step(parser, value) to advance it, where value is
+    the result of the most recent frame the step pushed, or None on the
+    first call. step either returns a new frame to push, or None when
+    the construct is complete and self.result holds its value.
+    """
+    __slots__ = ('state', 'result')
 
-        Returns a list of datashape type objects, or None.
-        """
-        return self.parse_homogeneous_list(self.parse_datashape, lexer.COMMA,
-                                           'Expected another datashape, ' +
-                                           'type constructor parameter ' +
-                                           'lists must have uniform type')
+    def __init__(self):
+        self.state = 0
+        self.result = None
 
-    def parse_integer(self):
-        """
-        integer : INTEGER
-        """
-        if self.tok.id == lexer.INTEGER:
-            val = self.tok.val
-            self.advance_tok()
-            return val
+
+class _DatashapeFrame(_Frame):
+    """
+    datashape : dim ASTERISK datashape
+              | dtype
+
+    The result is a datashape object, or None if no datashape
+    starts at the current token.
+    """
+    __slots__ = ('dims',)
+
+    def step(self, p, value):
+        if self.state == 0:
+            # Parse zero or more "dim ASTERISK" repetitions
+            self.dims = []
+            dim = p.parse_dim()
+            while dim is not None:
+                if isinstance(dim, _Frame):
+                    # Dim type constructors raise an error when complete
+                    self.state = 2
+                    return dim
+                self.dims.append(dim)
+                dim = p.parse_dim()
+            # Parse the dtype
+            value = p.parse_dtype()
+            if isinstance(value, _Frame):
+                self.state = 1
+                return value
+        if value:
+            self.result = p.build_datashape(self.dims, value)
+        elif len(self.dims) > 0:
+            # If we already saw "dim ASTERISK" at least once,
+            # we can point at the more specific position within
+            # the datashape where the error occurred
+            p.raise_error('Expected a dtype')
+        return None
+
+
+class _TypeArgFrame(_Frame):
+    """
+    type_arg : datashape
+             | INTEGER
+             | STRING
+             | list_type_arg
+    list_type_arg : LBRACKET RBRACKET
+                  | LBRACKET datashape_list RBRACKET
+                  | LBRACKET integer_list RBRACKET
+                  | LBRACKET string_list RBRACKET
+    datashape_list : datashape COMMA datashape_list
+                   | datashape
+
+    The result is a type_arg value, or None.
+    """
+    __slots__ = ('items',)
+
+    def step(self, p, value):
+        state = self.state
+        if state == 0:
+            self.state = 1
+            return _DatashapeFrame()
+        elif state == 1:
+            if value is not None:
+                self.result = value
+            elif p.tok_id in [lexer.INTEGER, lexer.STRING]:
+                self.result = p.tok_val
+                p.advance_tok()
+            elif p.tok_id == lexer.LBRACKET:
+                p.advance_tok()
+                self.items = []
+                self.state = 2
+                return _DatashapeFrame()
+            return None
+        # state 2, an item of a datashape_list
+        if value is not None:
+            self.items.append(value)
+            if p.tok_id == lexer.COMMA:
+                p.advance_tok()
+                return _DatashapeFrame()
+            val = self.items
+        elif len(self.items) > 0:
+            p.raise_error('Expected another datashape, ' +
+                          'type constructor parameter ' +
+                          'lists must have uniform type')
         else:
+            val = p.parse_scalar_list(lexer.INTEGER,
+                                      'Expected another integer, ' +
+                                      'type constructor parameter ' +
+                                      'lists must have uniform type')
+            if val is None:
+                val = p.parse_scalar_list(lexer.STRING,
+                                          'Expected another string, ' +
+                                          'type constructor parameter ' +
+                                          'lists must have uniform type')
+        if p.tok_id == lexer.RBRACKET:
+            p.advance_tok()
+            self.result = [] if val is None else val
             return None
+        elif val is None:
+            p.raise_error('Expected a type constructor argument ' +
+                          'or a closing "]"')
+        else:
+            p.raise_error('Expected a "," or a closing "]"')
 
-    def parse_integer_list(self):
-        """
-        integer_list : INTEGER COMMA integer_list
-                     | INTEGER
 
-        Returns a list of integers, or None.
-        """
-        return self.parse_homogeneous_list(self.parse_integer, lexer.COMMA,
-                                           'Expected another integer, ' +
-                                           'type constructor parameter ' +
-                                           'lists must have uniform type')
+class _TypeConstrFrame(_Frame):
+    """
+    type_constr : NAME_LOWER LBRACKET type_arg_list RBRACKET
+    type_arg_list : type_arg COMMA type_arg_list
+                  | type_kwarg_list
+                  | type_arg
+    type_kwarg_list : type_kwarg COMMA type_kwarg_list
+                    | type_kwarg
+    type_kwarg : NAME_LOWER EQUAL type_arg
 
-    def parse_string(self):
-        """
-        string : STRING
-        """
-        if self.tok.id == lexer.STRING:
-            val = self.tok.val
-            self.advance_tok()
-            return val
+    Starts after the LBRACKET. The result is the type built by the
+    constructor.
+    """
+    __slots__ = ('constr', 'is_dim', 'args', 'kwargs', 'kwname')
+
+    def __init__(self, constr, is_dim):
+        _Frame.__init__(self)
+        self.constr = constr
+        self.is_dim = is_dim
+        self.args = []
+        self.kwargs = []
+
+    def step(self, p, value):
+        state = self.state
+        if state == 0:
+            self.state = 1
+            return _TypeArgFrame()
+        elif state == 1:
+            if value is not None:
+                self.args.append(value)
+                if p.tok_id == lexer.COMMA:
+                    # If a comma is next, there are more args
+                    p.advance_tok()
+                    return _TypeArgFrame()
+                else:
+                    # Otherwise we've reached the end, and there
+                    # were no keyword args
+                    return self.close(p)
         else:
+            # state 2, the type_arg of a type_kwarg
+            if value is None:
+                # After "NAME_LOWER EQUAL", a type_arg is required.
+                p.raise_error('Expected a type constructor argument')
+            self.kwargs.append((self.kwname, value))
+            if p.tok_id != lexer.COMMA:
+                return self.close(p)
+            p.advance_tok()
+        # Parse a type_kwarg
+        if p.tok_id == lexer.NAME_LOWER and p.peek_id() == lexer.EQUAL:
+            self.kwname = p.tok_val
+            p.advance_tok()
+            p.advance_tok()
+            self.state = 2
+            return _TypeArgFrame()
+        elif len(self.kwargs) > 0:
+            p.raise_error('Expected another keyword argument, ' +
+                          'positional arguments cannot follow ' +
+                          'keyword arguments')
+        return self.close(p)
+
+    def close(self, p):
+        if self.is_dim:
+            if p.tok_id == lexer.RBRACKET:
+                p.advance_tok()
+                raise RuntimeError('dim type constructors not actually supported yet')
+            else:
+                p.raise_error('Expected a closing "]"')
+        if p.tok_id == lexer.RBRACKET:
+            if len(self.args) == 0 and len(self.kwargs) == 0:
+                p.raise_error('Expected at least one type ' +
+                              'constructor argument')
+            p.advance_tok()
+            self.result = self.constr(*self.args, **dict(self.kwargs))
             return None
+        else:
+            p.raise_error('Invalid type constructor argument')
 
-    def parse_string_list(self):
-        """
-        string_list : STRING COMMA string_list
-                    | STRING
 
-        Returns a list of strings, or None.
-        """
-        return self.parse_homogeneous_list(self.parse_string, lexer.COMMA,
-                                           'Expected another string, ' +
-                                           'type constructor parameter ' +
-                                           'lists must have uniform type')
+class _StructFrame(_Frame):
+    """
+    struct_type : LBRACE struct_field_list RBRACE
+                | LBRACE struct_field_list COMMA RBRACE
+    struct_field : struct_field_name COLON datashape
+    struct_field_name : NAME_LOWER
+                      | NAME_UPPER
+                      | NAME_OTHER
 
-    def parse_struct_type(self):
-        """
-        struct_type : LBRACE struct_field_list RBRACE
-                    | LBRACE struct_field_list COMMA RBRACE
+    The result is a struct type.
+    """
+    __slots__ = ('start', 'names', 'types')
 
-        Returns a struct type, or None.
-        """
-        if self.tok.id != lexer.LBRACE:
-            return None
-        saved_pos = self.pos
-        self.advance_tok()
-        fields = self.parse_homogeneous_list(self.parse_struct_field, lexer.COMMA,
-                                             'Invalid field in struct',
-                                             trailing_sep=True)
-        if fields is None and self.tok.id == lexer.RBRACE:
-            self.raise_error('At least one field is required in ' +
-                             'struct datashape')
-        if self.tok.id != lexer.RBRACE:
-            self.raise_error('Invalid field in struct')
-        self.advance_tok()
-        # Split apart the names and types into separate lists,
-        # compatible with type constructor parameters
-        names = [f[0] for f in fields]
-        types = [f[1] for f in fields]
+    def step(self, p, value):
+        if self.state == 0:
+            self.start = p.pos
+            self.names = []
+            self.types = []
+            p.advance_tok()
+            self.state = 1
+        else:
+            if value is None:
+                p.raise_error('Expected the datashape of the field')
+            self.types.append(value)
+            if p.tok_id != lexer.COMMA:
+                return self.close(p)
+            p.advance_tok()
+        # Parse a struct_field, the list allows a trailing comma
+        if p.tok_id not in [lexer.NAME_LOWER, lexer.NAME_UPPER,
+                            lexer.NAME_OTHER]:
+            return self.close(p)
+        self.names.append(p.tok_val)
+        p.advance_tok()
+        if p.tok_id != lexer.COLON:
+            p.raise_error('Expected a ":" separating the field ' +
+                          'name from its datashape')
+        p.advance_tok()
+        return _DatashapeFrame()
+
+    def close(self, p):
+        if len(self.names) == 0 and p.tok_id == lexer.RBRACE:
+            p.raise_error('At least one field is required in ' +
+                          'struct datashape')
+        if p.tok_id != lexer.RBRACE:
+            p.raise_error('Invalid field in struct')
+        p.advance_tok()
         # Structs are treated as the "struct" dtype
-        tconstr = self.syntactic_sugar(self.sym.dtype_constr, 'struct',
-                                       '{...} dtype constructor', saved_pos)
-        return tconstr(names, types)
+        tconstr = p.syntactic_sugar(p.sym.dtype_constr, 'struct',
+                                    '{...} dtype constructor', self.start)
+        self.result = tconstr(self.names, self.types)
+        return None
 
-    def parse_struct_field(self):
-        """
-        struct_field : struct_field_name COLON datashape
-        struct_field_name : NAME_LOWER
-                          | NAME_UPPER
-                          | NAME_OTHER
 
-        Returns a tuple (name, datashape object) or None
-        """
-        if self.tok.id not in [lexer.NAME_LOWER, lexer.NAME_UPPER,
-                               lexer.NAME_OTHER]:
-            return None
-        name = self.tok.val
-        self.advance_tok()
-        if self.tok.id != lexer.COLON:
-            self.raise_error('Expected a ":" separating the field ' +
-                             'name from its datashape')
-        self.advance_tok()
-        ds = self.parse_datashape()
-        if ds is None:
-            self.raise_error('Expected the datashape of the field')
-        return (name, ds)
-
-    def parse_funcproto_or_tuple_type(self):
-        """
-        funcproto_or_tuple_type : tuple_type RARROW datashape
-                                | tuple_type
-        tuple_type : LPAREN tuple_item_list RPAREN
-                   | LPAREN tuple_item_list COMMA RPAREN
-                   | LPAREN RPAREN
-        tuple_item_list : datashape COMMA tuple_item_list
-                        | datashape
-
-        Returns a tuple type object, a function prototype, or None.
-        """
-        if self.tok.id != lexer.LPAREN:
-            return None
-        saved_pos = self.pos
-        self.advance_tok()
-        dshapes = self.parse_homogeneous_list(self.parse_datashape, lexer.COMMA,
-                                             'Invalid datashape in tuple',
-                                             trailing_sep=True)
-        if dshapes is None and self.tok.id == lexer.RPAREN:
-            self.raise_error('At least one datashape is required in ' +
-                             'a tuple datashape')
-        if self.tok.id != lexer.RPAREN:
-            self.raise_error('Invalid datashape in tuple')
-        self.advance_tok()
-        if self.tok.id != lexer.RARROW:
+class _FuncprotoOrTupleFrame(_Frame):
+    """
+    funcproto_or_tuple_type : tuple_type RARROW datashape
+                            | tuple_type
+    tuple_type : LPAREN tuple_item_list RPAREN
+               | LPAREN tuple_item_list COMMA RPAREN
+               | LPAREN RPAREN
+    tuple_item_list : datashape COMMA tuple_item_list
+                    | datashape
+
+    The result is a tuple type object or a function prototype.
+    """
+    __slots__ = ('start', 'dshapes')
+
+    def step(self, p, value):
+        state = self.state
+        if state == 0:
+            self.start = p.pos
+            self.dshapes = []
+            p.advance_tok()
+            self.state = 1
+            return _DatashapeFrame()
+        elif state == 1:
+            # The list allows a trailing comma
+            if value is not None:
+                self.dshapes.append(value)
+                if p.tok_id == lexer.COMMA:
+                    p.advance_tok()
+                    return _DatashapeFrame()
+            if len(self.dshapes) == 0 and p.tok_id == lexer.RPAREN:
+                p.raise_error('At least one datashape is required in ' +
+                              'a tuple datashape')
+            if p.tok_id != lexer.RPAREN:
+                p.raise_error('Invalid datashape in tuple')
+            p.advance_tok()
+            if p.tok_id == lexer.RARROW:
+                # Get the return datashape after the right arrow
+                p.advance_tok()
+                self.state = 2
+                return _DatashapeFrame()
             # Tuples are treated as the "tuple" dtype
-            tconstr = self.syntactic_sugar(self.sym.dtype_constr, 'tuple',
-                                           '(...) dtype constructor', saved_pos)
-            return tconstr(dshapes)
-        else:
-            # Get the return datashape after the right arrow
-            self.advance_tok()
-            ret_dshape = self.parse_datashape()
-            if ret_dshape is None:
-                self.raise_error('Expected function prototype return ' +
-                                 'datashape')
-            # Function Prototypes are treated as the "funcproto" dtype
-            tconstr = self.syntactic_sugar(self.sym.dtype_constr, 'funcproto',
-                                           '(...) -> ... dtype constructor',
-                                           saved_pos)
-            return tconstr(dshapes, ret_dshape)
+            tconstr = p.syntactic_sugar(p.sym.dtype_constr, 'tuple',
+                                        '(...) dtype constructor', self.start)
+            self.result = tconstr(self.dshapes)
+            return None
+        # state 2, the return datashape
+        if value is None:
+            p.raise_error('Expected function prototype return ' +
+                          'datashape')
+        # Function Prototypes are treated as the "funcproto" dtype
+        tconstr = p.syntactic_sugar(p.sym.dtype_constr, 'funcproto',
+                                    '(...) -> ... dtype constructor',
+                                    self.start)
+        self.result = tconstr(self.dshapes, value)
+        return None
 
 
 def parse(ds_str, sym):
@@ -571,3 +656,707 @@ def parse(ds_str, sym):
     if dsp.pos != dsp.end_pos:
         dsp.raise_error('Unexpected token in datashape')
     return ds
+
+
+#------------------------------------------------------------------------
+# Structure-only parsing
+#------------------------------------------------------------------------
+
+# The AST produced by parse_ast is made of tuples, tagged by their first
+# element, which record the symbol table lookups and constructor calls
+# the parser would have made:
+#
+#   ('dshape', (dim, ...), dtype)        A datashape
+#   ('dim', name), ('dtype', name)       An entry of sym.dim or sym.dtype
+#   ('dim_constr', name, args, kwargs)   A call of a sym.dim_constr or
+#   ('dtype_constr', name, args, kwargs) sym.dtype_constr entry, where
+#                                        kwargs is a sorted tuple of pairs
+#   ('struct', names, types)             A {...} struct
+#   ('tuple', dshapes)                   A (...) tuple
+#   ('funcproto', dshapes, ret)          A (...) -> ... function prototype
+#
+# Constructor arguments are integers, strings, datashape nodes, or lists
+# of these. Integer datashape dims, for example, become
+# ('dim_constr', 'fixed', (3,), ()).
+
+def _ast_constr(kind, name, *args, **kwargs):
+    return (kind, name, args, tuple(sorted(kwargs.items())))
+
+def _ast_struct(names, types):
+    return ('struct', tuple(names), tuple(types))
+
+def _ast_tuple(dshapes):
+    return ('tuple', tuple(dshapes))
+
+def _ast_funcproto(dshapes, ret):
+    return ('funcproto', tuple(dshapes), ret)
+
+_ast_sugar = {'struct': _ast_struct, 'tuple': _ast_tuple,
+              'funcproto': _ast_funcproto}
+
+
+class _ASTSymbolDict(object):
+    """
+    Stands in for one dictionary of a TypeSymbolTable, returning
+    AST nodes and node builders for the symbols it contains.
+    """
+    __slots__ = ('kind', 'symdict')
+
+    def __init__(self, kind, symdict):
+        self.kind = kind
+        self.symdict = symdict
+
+    def get(self, name, default=None):
+        if name not in self.symdict:
+            return default
+        kind = self.kind
+        if kind == 'dim' or kind == 'dtype':
+            return (kind, name)
+        elif kind == 'dtype_constr' and name in _ast_sugar:
+            return _ast_sugar[name]
+        else:
+            return lambda *args, **kwargs: _ast_constr(kind, name,
+                                                       *args, **kwargs)
+
+
+class _ASTSymbolTable(object):
+    """Stands in for a TypeSymbolTable while parsing to an AST."""
+    __slots__ = ('dim', 'dtype', 'dim_constr', 'dtype_constr')
+
+    def __init__(self, sym):
+        for kind in self.__slots__:
+            setattr(self, kind, _ASTSymbolDict(kind, getattr(sym, kind)))
+
+
+class _ASTParser(DataShapeParser):
+    """A DataShapeParser which builds AST nodes instead of types."""
+    def __init__(self, ds_str, sym, tokens=None):
+        DataShapeParser.__init__(self, ds_str, _ASTSymbolTable(sym), tokens)
+
+    def build_datashape(self, dims, dtype):
+        return ('dshape', tuple(dims), dtype)
+
+
+# Matches the whitespace before a token, then either the token, the
+# first character of an invalid token, or the end of the string
+_ast_token_re = re.compile(lexer._whitespace + '(?:(' +
+                           '|'.join(tok[1] for tok in lexer._tokens) +
+                           r')|([^\s#])|\Z)', re.MULTILINE)
+
+_lower_starts = frozenset('abcdefghijklmnopqrstuvwxyz')
+_upper_starts = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_name_starts = _lower_starts | _upper_starts | frozenset('_')
+_digit_starts = frozenset('0123456789')
+_string_starts = frozenset('"\'')
+
+
+class _Unsupported(Exception):
+    """
+    Raised by _FastASTParser for anything it doesn't parse, such as a
+    syntax error, which _ASTParser then parses or reports.
+    """
+
+
+class _FastASTParser(object):
+    """
+    Parses the common forms of datashapes straight into AST nodes.
+
+    Tokens are the strings matched by one regular expression, and told
+    apart by their first character, and the grammar is followed by
+    recursive descent, with none of the Token objects, frames and
+    symbol table stand-ins of _ASTParser. Anything unexpected, such as
+    a syntax error, a missing symbol or nesting deep enough to reach
+    the recursion limit, raises _Unsupported instead.
+    """
+    __slots__ = ('toks', 'pos', 'dim', 'dtype', 'dim_constr', 'dtype_constr')
+
+    def __init__(self, ds_str, sym):
+        toks = []
+        for tok, bad in _ast_token_re.findall(ds_str):
+            if bad:
+                raise _Unsupported
+            toks.append(tok)
+        # The match at the end of the string is an empty token, and one
+        # more lets the parser look two tokens ahead without checks
+        toks.append(u'')
+        self.toks = toks
+        self.pos = 0
+        self.dim = sym.dim
+        self.dtype = sym.dtype
+        self.dim_constr = sym.dim_constr
+        self.dtype_constr = sym.dtype_constr
+
+    def parse(self):
+        try:
+            ds = self.datashape()
+        except RecursionError:
+            raise _Unsupported
+        if self.toks[self.pos]:
+            raise _Unsupported
+        return ds
+
+    def datashape(self):
+        toks = self.toks
+        dims = []
+        while True:
+            pos = self.pos
+            tok = toks[pos]
+            c = tok[:1]
+            if toks[pos + 1] == u'*':
+                if c in _digit_starts and 'fixed' in self.dim_constr:
+                    dims.append(('dim_constr', 'fixed', (int(tok),), ()))
+                elif c in _upper_starts and 'typevar' in self.dim_constr:
+                    dims.append(('dim_constr', 'typevar', (tok,), ()))
+                elif c in _lower_starts and tok in self.dim:
+                    dims.append(('dim', tok))
+                elif tok == u'...' and 'ellipsis' in self.dim:
+                    dims.append(('dim', 'ellipsis'))
+                else:
+                    raise _Unsupported
+                self.pos = pos + 2
+            elif (toks[pos + 1] == u'...' and c in _upper_starts and
+                  toks[pos + 2] == u'*' and 'ellipsis' in self.dim_constr):
+                dims.append(('dim_constr', 'ellipsis', (tok,), ()))
+                self.pos = pos + 3
+            else:
+                return ('dshape', tuple(dims), self.dtype_())
+
+    def dtype_(self):
+        toks = self.toks
+        pos = self.pos
+        tok = toks[pos]
+        c = tok[:1]
+        if c in _upper_starts:
+            if 'typevar' not in self.dtype_constr:
+                raise _Unsupported
+            self.pos = pos + 1
+            return ('dtype_constr', 'typevar', (tok,), ())
+        elif c in _lower_starts:
+            if toks[pos + 1] == u'[':
+                if (tok in self.dim_constr or
+                        tok not in self.dtype_constr or tok in _ast_sugar):
+                    raise _Unsupported
+                self.pos = pos + 2
+                return self.constr(tok)
+            elif tok in self.dtype:
+                self.pos = pos + 1
+                return ('dtype', tok)
+        elif tok == u'{' and 'struct' in self.dtype_constr:
+            self.pos = pos + 1
+            return self.struct()
+        elif tok == u'(':
+            self.pos = pos + 1
+            return self.tuple_or_funcproto()
+        raise _Unsupported
+
+    def constr(self, name):
+        toks = self.toks
+        args = []
+        kwargs = {}
+        while True:
+            pos = self.pos
+            tok = toks[pos]
+            if (toks[pos + 1] == u'=' and tok[:1] in _lower_starts and
+                    tok not in self.dtype):
+                self.pos = pos + 2
+                kwargs[tok] = self.arg()
+            elif kwargs:
+                raise _Unsupported
+            else:
+                args.append(self.arg())
+            tok = toks[self.pos]
+            self.pos += 1
+            if tok == u']':
+                return ('dtype_constr', name, tuple(args),
+                        tuple(sorted(kwargs.items())))
+            elif tok != u',':
+                raise _Unsupported
+
+    def arg(self):
+        toks = self.toks
+        pos = self.pos
+        tok = toks[pos]
+        c = tok[:1]
+        if c in _digit_starts and toks[pos + 1] != u'*':
+            self.pos = pos + 1
+            return int(tok)
+        elif c in _string_starts:
+            self.pos = pos + 1
+            return lexer._str_val(tok)
+        elif tok != u'[':
+            return self.datashape()
+        # A list of integers, strings or datashapes
+        self.pos = pos + 1
+        items = []
+        if toks[self.pos] == u']':
+            self.pos += 1
+            return items
+        c = toks[self.pos][:1]
+        if c in _digit_starts and toks[self.pos + 1] != u'*':
+            kind = _digit_starts
+        elif c in _string_starts:
+            kind = _string_starts
+        else:
+            kind = None
+        while True:
+            tok = toks[self.pos]
+            if kind is None:
+                items.append(self.datashape())
+            elif tok[:1] in kind and toks[self.pos + 1] != u'*':
+                items.append(int(tok) if kind is _digit_starts
+                             else lexer._str_val(tok))
+                self.pos += 1
+            else:
+                raise _Unsupported
+            tok = toks[self.pos]
+            self.pos += 1
+            if tok == u']':
+                return items
+            elif tok != u',':
+                raise _Unsupported
+
+    def struct(self):
+        toks = self.toks
+        names = []
+        types = []
+        while True:
+            pos = self.pos
+            tok = toks[pos]
+            if tok[:1] not in _name_starts or toks[pos + 1] != u':':
+                raise _Unsupported
+            self.pos = pos + 2
+            names.append(tok)
+            types.append(self.datashape())
+            tok = toks[self.pos]
+            self.pos += 1
+            if tok == u',' and toks[self.pos] == u'}':
+                # A trailing comma
+                self.pos += 1
+                tok = u'}'
+            if tok == u'}':
+                return ('struct', tuple(names), tuple(types))
+            elif tok != u',':
+                raise _Unsupported
+
+    def tuple_or_funcproto(self):
+        toks = self.toks
+        dshapes = []
+        while True:
+            dshapes.append(self.datashape())
+            tok = toks[self.pos]
+            self.pos += 1
+            if tok == u',' and toks[self.pos] == u')':
+                self.pos += 1
+                tok = u')'
+            if tok == u')':
+                break
+            elif tok != u',':
+                raise _Unsupported
+        if toks[self.pos] == u'->':
+            if 'funcproto' not in self.dtype_constr:
+                raise _Unsupported
+            self.pos += 1
+            return ('funcproto', tuple(dshapes), self.datashape())
+        if 'tuple' not in self.dtype_constr:
+            raise _Unsupported
+        return ('tuple', tuple(dshapes))
+
+
+def parse_ast(ds_str, sym):
+    """Parses a single datashape from a string into a tuple-based AST,
+    without constructing any type objects.
+
+    The AST records the symbol table entries and constructors the
+    datashape uses, so errors raised by the constructors themselves, or
+    by validation, only appear once it is converted by ast_to_type.
+
+    Parameters
+    ----------
+    ds_str : string
+        The datashape string to parse.
+    sym : TypeSymbolTable
+        The symbol tables of dimensions, dtypes, and type constructors for each.
+
+    Examples
+    --------
+    >>> from datashape import sym
+    >>> parse_ast('3 * int32', sym)
+    ('dshape', (('dim_constr', 'fixed', (3,), ()),), ('dtype', 'int32'))
+    """
+    try:
+        return _FastASTParser(ds_str, sym).parse()
+    except _Unsupported:
+        pass
+    # The full parser, for the precise error
+    dsp = _ASTParser(ds_str, sym)
+    ds = dsp.parse_datashape()
+    if ds is None:
+        dsp.raise_error('Invalid datashape')
+    if dsp.pos != dsp.end_pos:
+        dsp.raise_error('Unexpected token in datashape')
+    return ds
+
+
+def _ast_children(node):
+    """Returns the datashape nodes directly inside an AST node."""
+    tag = node[0]
+    if tag == 'dshape':
+        return node[1] + (node[2],)
+    elif tag == 'dim_constr' or tag == 'dtype_constr':
+        children = []
+        for arg in node[2] + tuple(v for k, v in node[3]):
+            if isinstance(arg, tuple):
+                children.append(arg)
+            elif isinstance(arg, list):
+                children.extend(a for a in arg if isinstance(a, tuple))
+        return tuple(children)
+    elif tag == 'struct':
+        return node[2]
+    elif tag == 'tuple':
+        return node[1]
+    elif tag == 'funcproto':
+        return node[1] + (node[2],)
+    else:
+        return ()
+
+
+def _ast_build(node, children, sym):
+    """Builds the type for an AST node, given the types of its children."""
+    tag = node[0]
+    if tag == 'dshape':
+        return coretypes.DataShape(*children)
+    elif tag == 'dim':
+        return sym.dim[node[1]]
+    elif tag == 'dtype':
+        return sym.dtype[node[1]]
+    elif tag == 'dim_constr' or tag == 'dtype_constr':
+        children = iter(children)
+        def arg_value(arg):
+            if isinstance(arg, tuple):
+                return next(children)
+            elif isinstance(arg, list):
+                return [next(children) if isinstance(a, tuple) else a
+                        for a in arg]
+            else:
+                return arg
+        args = [arg_value(arg) for arg in node[2]]
+        kwargs = dict((k, arg_value(v)) for k, v in node[3])
+        return getattr(sym, tag)[node[1]](*args, **kwargs)
+    elif tag == 'struct':
+        return sym.dtype_constr['struct'](list(node[1]), children)
+    elif tag == 'tuple':
+        return sym.dtype_constr['tuple'](children)
+    elif tag == 'funcproto':
+        return sym.dtype_constr['funcproto'](children[:-1], children[-1])
+    else:
+        raise ValueError('Invalid datashape AST node %r' % (node,))
+
+
+def ast_to_type(ast, sym, memo=None):
+    """Converts an AST from parse_ast into the datashape parse() would
+    have returned for the same string.
+
+    Parameters
+    ----------
+    ast : tuple
+        The AST of a datashape.
+    sym : TypeSymbolTable
+        The symbol tables of dimensions, dtypes, and type constructors for each.
+    memo : dict, optional
+        Types already built for small AST nodes, such as the
+        ('dshape', (), ('dtype', 'int32')) of a struct field. Passing
+        the same dict when converting many ASTs against the same
+        symbol table avoids rebuilding the types they have in common.
+    """
+    if memo is None:
+        memo = {}
+    # A post-order walk with an explicit stack, so deeply nested
+    # datashapes are converted without recursion
+    stack = [(ast, None, None)]
+    built = []
+    while stack:
+        node, children, key = stack.pop()
+        if children is None:
+            children = _ast_children(node)
+            # Only nodes whose children are leaves are memoized,
+            # so hashing the key is cheap
+            key = None
+            if not any(_ast_children(child) for child in children):
+                try:
+                    key = node
+                    value = memo[key]
+                except KeyError:
+                    pass
+                except TypeError:
+                    # The node has a list argument
+                    key = None
+                else:
+                    built.append(value)
+                    continue
+            stack.append((node, children, key))
+            stack.extend((child, None, None)
+                         for child in reversed(children))
+        else:
+            n = len(built) - len(children)
+            value = _ast_build(node, built[n:], sym)
+            del built[n:]
+            built.append(value)
+            if key is not None:
+                memo[key] = value
+    return built[0]
+
+
+def ast_ndim(ast):
+    """The number of dimensions of the datashape of an AST, its ndim."""
+    return len(ast[1])
+
+
+def ast_has_var(ast):
+    """Whether the datashape of an AST has a var or ellipsis dimension
+    anywhere within it, as has_var_dim would return for its type.
+    """
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        tag = node[0]
+        if ((tag == 'dim' and node[1] in ('var', 'ellipsis')) or
+                (tag == 'dim_constr' and node[1] == 'ellipsis')):
+            return True
+        stack.extend(_ast_children(node))
+    return False
+
+
+def ast_field_names(ast):
+    """The field names of the struct datashape of an AST, as a list, or
+    None if its dtype is not a struct.
+
+    >>> from datashape import sym
+    >>> ast_field_names(parse_ast('var * {id: int64, name: string}', sym))
+    ['id', 'name']
+    """
+    dtype = ast[2]
+    if dtype[0] != 'struct':
+        return None
+    return list(dtype[1])
+
+
+class PushParser(object):
+    """
+    An incremental parser for a stream of concatenated datashapes.
+
+    Chunks of the stream are passed to feed(), which returns every
+    datashape completed by that chunk. Only the text of the datashape
+    still being received is buffered, so memory use does not depend on
+    the length of the stream. Consecutive datashapes need no separator
+    other than whitespace or comments, because the grammar determines
+    where each one ends.
+
+    Parameters
+    ----------
+    sym : TypeSymbolTable
+        The symbol tables of dimensions, dtypes, and type constructors for each.
+    encoding : str, optional
+        The encoding used to decode chunks given as bytes.
+    max_buffer : int, optional
+        The maximum number of characters buffered for one datashape.
+    """
+
+    def __init__(self, sym, encoding='utf-8', max_buffer=1 << 24):
+        self.sym = sym
+        self.max_buffer = max_buffer
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._buf = u''
+        self._closed = False
+        self._reset_tokens()
+
+    def _reset_tokens(self):
+        # The complete tokens lexed from the buffer so far, and the
+        # offset just past them, where lexing resumes
+        self._ids = array.array('b')
+        self._starts = array.array('l')
+        self._ends = array.array('l')
+        self._values = []
+        self._lexed = 0
+        # The bracket nesting depth after the last token and its id
+        self._depth = 0
+        self._last_id = None
+        # Whether a datashape may have been completed since the last
+        # attempt to parse the buffer
+        self._ready = False
+
+    def feed(self, data):
+        """
+        Appends data, which may be a str, a bytes-like object or an
+        mmap, to the stream, returning the list of datashapes it completes.
+        """
+        if self._closed:
+            raise ValueError('PushParser.feed() called after close()')
+        result = []
+        if isinstance(data, unicode):
+            self._buf += data
+            self._parse(False, result)
+        else:
+            # Decode large buffers such as an mmap a piece at a time
+            # rather than copying them whole
+            for i in range(0, len(data), _DECODE_CHUNK):
+                self._buf += self._decoder.decode(data[i:i + _DECODE_CHUNK])
+                self._parse(False, result)
+        return result
+
+    def close(self):
+        """
+        Ends the stream, returning the list of remaining datashapes.
+        Raises a DataShapeSyntaxError if the stream ends partway
+        through a datashape.
+        """
+        if self._closed:
+            return []
+        self._closed = True
+        self._buf += self._decoder.decode(b'', True)
+        result = []
+        self._parse(True, result)
+        return result
+
+    def _lex(self, final):
+        """
+        Lexes the text appended to the buffer since the last call,
+        noting whether any of it could end a datashape. Returns the
+        offset of an invalid token, or None.
+        """
+        buf = self._buf
+        tokens = lexer.lex_all(buf, self._lexed)
+        ids = tokens.ids
+        n = len(ids)
+        error_pos = tokens.error_pos
+        if not final:
+            if error_pos is not None:
+                if lexer.is_token_prefix(buf, error_pos):
+                    # The invalid token may be completed by the next chunk
+                    error_pos = None
+            elif n > 0 and tokens.ends[-1] == len(buf):
+                # So may a token reaching the end of the buffer
+                n -= 1
+        if n == 0:
+            self._ready = self._ready or error_pos is not None
+            return error_pos
+        # A datashape can only end outside of brackets, where one token
+        # follows another without joining them as '*', '->', '[' or
+        # '...' do, or when a closing bracket ends its outermost group.
+        # Otherwise, a long datashape arriving in many chunks would be
+        # parsed again from its start on every chunk.
+        depth, last_id, ready = self._depth, self._last_id, self._ready
+        for id in ids[:n]:
+            if (depth == 0 and last_id is not None and
+                    last_id not in _JOINS_NEXT and id not in _JOINS_PREV):
+                ready = True
+            if id in _OPENING:
+                depth += 1
+            elif id in _CLOSING:
+                depth -= 1
+                if depth <= 0:
+                    ready = True
+            last_id = id
+        self._depth, self._last_id = depth, last_id
+        self._ready = ready or error_pos is not None
+        self._ids.extend(ids[:n])
+        self._starts.extend(tokens.starts[:n])
+        self._ends.extend(tokens.ends[:n])
+        self._values.extend(tokens.values[:n])
+        self._lexed = self._ends[-1]
+        return error_pos
+
+    def _parse(self, final, result):
+        """Parses the complete datashapes in the buffer into result."""
+        error_pos = self._lex(final)
+        buf = self._buf
+        if not (final or self._ready):
+            if len(buf) > self.max_buffer:
+                raise ValueError('datashape in stream exceeds the maximum ' +
+                                 'buffer size of %d characters' %
+                                 self.max_buffer)
+            return
+        self._ready = False
+        tokens = lexer.TokenArrays(self._ids, self._starts, self._ends,
+                                   self._values, error_pos)
+        # Whether the tokens stop short of the end of the buffer
+        partial = not final and self._lexed < len(buf.rstrip())
+        dsp = DataShapeParser(buf, self.sym, tokens)
+        # The offset of the text not yet parsed into a datashape
+        keep = 0
+        while dsp.pos < dsp.ntokens:
+            dsp.hit_end = False
+            try:
+                ds = dsp.parse_datashape()
+                if ds is None:
+                    dsp.raise_error('Invalid datashape')
+            except error.DataShapeSyntaxError:
+                if dsp.hit_end and not final:
+                    partial = True
+                    break
+                raise
+            if dsp.hit_end and not final:
+                # The datashape may continue in the next chunk
+                partial = True
+                break
+            result.append(ds)
+            keep = tokens.ends[dsp.pos - 1]
+        rest = buf[keep:]
+        if not partial and rest.rfind('#') <= rest.rfind('\n'):
+            # Only whitespace and complete comments are left
+            rest = u''
+        if len(rest) > self.max_buffer:
+            raise ValueError('datashape in stream exceeds the maximum ' +
+                             'buffer size of %d characters' % self.max_buffer)
+        if keep or not rest:
+            # Lexes what is left again, which is only the start of the
+            # next datashape
+            self._buf = rest
+            self._reset_tokens()
+            if rest and not final:
+                self._lex(final)
+                self._ready = False
+
+
+# The tokens joining the token after them, or before them, into the same
+# datashape outside of brackets, and the brackets
+_JOINS_NEXT = frozenset([lexer.ASTERISK, lexer.RARROW])
+_JOINS_PREV = frozenset([lexer.ASTERISK, lexer.RARROW, lexer.LBRACKET,
+                         lexer.ELLIPSIS])
+_OPENING = frozenset([lexer.LBRACKET, lexer.LBRACE, lexer.LPAREN])
+_CLOSING = frozenset([lexer.RBRACKET, lexer.RBRACE, lexer.RPAREN])
+
+
+# The size of the pieces bytes are decoded in by PushParser.feed
+_DECODE_CHUNK = 1 << 16
+
+
+def iterparse(source, sym, chunk_size=1 << 16, **kwargs):
+    """
+    Parses a stream of concatenated datashapes, yielding each one
+    as soon as it is complete.
+
+    Parameters
+    ----------
+    source : str, bytes, mmap, file object or iterable of chunks
+        The stream to parse. File objects are read chunk_size at a time.
+    sym : TypeSymbolTable
+        The symbol tables of dimensions, dtypes, and type constructors for each.
+    chunk_size : int, optional
+        The number of characters or bytes passed to the parser at a time.
+    **kwargs
+        Passed on to PushParser.
+    """
+    pp = PushParser(sym, **kwargs)
+    if isinstance(source, (unicode, bytes, bytearray, memoryview,
+                           mmap.mmap)):
+        chunks = (source[i:i + chunk_size]
+                  for i in range(0, len(source), chunk_size))
+    elif hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+    else:
+        chunks = source
+    for chunk in chunks:
+        for ds in pp.feed(chunk):
+            yield ds
+    for ds in pp.close():
+        yield ds
@@ -33,12 +33,26 @@ if PY2:
     unicode = __builtin__.unicode
     basestring = __builtin__.basestring
     _strtypes = (str, unicode)
+    # Python 2 raises a plain RuntimeError at the recursion limit
+    RecursionError = RuntimeError
 else:
+    import builtins
     from functools import reduce
     _inttypes = (int,)
     unicode = str
     basestring = str
     _strtypes = (str,)
+    RecursionError = builtins.RecursionError
+
+def with_metaclass(meta, *bases):
+    """Create a base class with a metaclass."""
+    # This requires a bit of explanation: the basic idea is to make a dummy
+    # metaclass for one level of class instantiation that replaces itself with
+    # the actual metaclass.
+    class metaclass(meta):
+        def __new__(cls, name, this_bases, d):
+            return meta(name, bases, d)
+    return type.__new__(metaclass, 'temporary_class', (), {})
 
 if sys.version_info[:2] >= (2, 7):
     from unittest import skip, skipIf
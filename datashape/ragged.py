@@ -0,0 +1,213 @@
+"""
+Compact storage for arrays with a variable length dimension.
+
+A RaggedArray holds data of datashape ``N * var * T`` in two buffers,
+the values of every row one after the other in one NumPy array, and an
+int64 array of N + 1 offsets, where row i is values[offsets[i]:
+offsets[i + 1]]. T can be any datashape NumPy supports, including fixed
+dimensions and records.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from itertools import chain
+
+import numpy as np
+
+from . import coretypes as ct
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['RaggedArray']
+
+
+class RaggedArray(object):
+    """
+    An array of datashape ``N * var * T``, as an offsets buffer and a
+    values buffer.
+
+    Parameters
+    ----------
+    offsets : array_like of int
+        N + 1 nondecreasing offsets into values, where row i is
+        values[offsets[i]:offsets[i + 1]]. They need not start at 0.
+    values : numpy.ndarray
+        The values of the rows, with the dimensions of T after the
+        first axis.
+    """
+    def __init__(self, offsets, values):
+        offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        values = np.asarray(values)
+        if offsets.ndim != 1 or len(offsets) == 0:
+            raise ValueError('Ragged offsets must be a nonempty 1D array')
+        if values.ndim == 0:
+            raise ValueError('Ragged values must have at least 1 dimension')
+        if (offsets[0] < 0 or offsets[-1] > len(values) or
+                np.any(offsets[1:] < offsets[:-1])):
+            raise ValueError('Ragged offsets must be nondecreasing and '
+                             'within the %d values' % len(values))
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def _new(cls, offsets, values):
+        # Skips validation, for buffers which are known to be valid
+        self = cls.__new__(cls)
+        self.offsets = offsets
+        self.values = values
+        return self
+
+    @classmethod
+    def from_lists(cls, rows, ds=None):
+        """
+        Builds a ragged array from a sequence of rows.
+
+        Parameters
+        ----------
+        rows : sequence of sequences or NumPy arrays
+            The rows.
+        ds : Mono or string, optional
+            The datashape, ``N * var * T`` or ``var * var * T``. By
+            default the type of the values is inferred by NumPy.
+        """
+        dtype = None
+        if ds is not None:
+            if isinstance(ds, _strtypes):
+                ds = dshape(ds)
+            if (not isinstance(ds, ct.DataShape) or len(ds) < 3 or
+                    not isinstance(ds[1], ct.Var) or
+                    not isinstance(ds[0], (ct.Fixed, ct.Var))):
+                raise TypeError('Ragged arrays have datashape '
+                                'N * var * T, not %s' % ds)
+            if isinstance(ds[0], ct.Fixed) and ds[0].val != len(rows):
+                raise ValueError('Datashape %s does not match %d rows' %
+                                 (ds, len(rows)))
+            inner, dtype = ct.to_numpy(ds.subarray(2))
+        lengths = np.fromiter(map(len, rows), dtype=np.int64,
+                              count=len(rows))
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if rows and all(isinstance(r, np.ndarray) for r in rows):
+            values = np.concatenate(rows)
+            if dtype is not None:
+                values = values.astype(dtype, copy=False)
+        elif dtype is not None and not inner and dtype.names is None:
+            values = np.fromiter(chain.from_iterable(rows), dtype=dtype,
+                                 count=offsets[-1])
+        else:
+            values = np.array(list(chain.from_iterable(rows)), dtype=dtype)
+        if ds is not None and values.shape[1:] != inner:
+            raise ValueError('Values of shape %s do not match datashape %s'
+                             % (values.shape[1:], ds))
+        return cls._new(offsets, values)
+
+    @classmethod
+    def from_padded(cls, padded, lengths):
+        """
+        Builds a ragged array from the first lengths[i] values of each
+        row i of a padded array.
+        """
+        padded = np.asarray(padded)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if padded.ndim < 2 or len(lengths) != len(padded):
+            raise ValueError('Expected a padded array of %d rows' %
+                             len(lengths))
+        if np.any(lengths < 0) or np.any(lengths > padded.shape[1]):
+            raise ValueError('Row lengths must be between 0 and %d' %
+                             padded.shape[1])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        mask = np.arange(padded.shape[1]) < lengths[:, None]
+        return cls._new(offsets, padded[mask])
+
+    @property
+    def dshape(self):
+        """The datashape, N * var * T."""
+        elem = ct.from_numpy(self.values.shape[1:], self.values.dtype)
+        if isinstance(elem, ct.DataShape):
+            params = elem.parameters
+        else:
+            params = (elem,)
+        return ct.DataShape(ct.Fixed(len(self)), ct.Var(), *params)
+
+    @property
+    def lengths(self):
+        """The length of each row."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        """The bytes used by the rows' values and the offsets."""
+        values = self.values
+        itemsize = values.dtype.itemsize * int(np.prod(values.shape[1:]))
+        return (self.offsets.nbytes +
+                itemsize * int(self.offsets[-1] - self.offsets[0]))
+
+    def to_padded(self, fill=0, width=None):
+        """
+        Copies the rows into a padded array of shape (N, width) + the
+        dimensions of T, filling the rest of each row with fill.
+
+        The width defaults to the length of the longest row.
+        """
+        lengths = self.lengths
+        max_len = int(lengths.max()) if len(lengths) else 0
+        if width is None:
+            width = max_len
+        elif width < max_len:
+            raise ValueError('Width %d is less than the longest row, %d' %
+                             (width, max_len))
+        out = np.empty((len(self), width) + self.values.shape[1:],
+                       dtype=self.values.dtype)
+        out[...] = fill
+        mask = np.arange(width) < lengths[:, None]
+        out[mask] = self.values[self.offsets[0]:self.offsets[-1]]
+        return out
+
+    def to_lists(self):
+        """Converts the rows to Python lists."""
+        values = self.values[self.offsets[0]:self.offsets[-1]].tolist()
+        offsets = (self.offsets - self.offsets[0]).tolist()
+        return [values[offsets[i]:offsets[i + 1]]
+                for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, key):
+        """
+        An integer gives a view of that row, and a slice a ragged array
+        of those rows. Contiguous slices share both buffers.
+        """
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return self._new(self.offsets[start:stop + 1], self.values)
+            return self.take(np.arange(start, stop, step))
+        i = int(key)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Row %d is out of range for %d rows' %
+                             (key, len(self)))
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def take(self, indices):
+        """Copies the given rows into a new, compact ragged array."""
+        indices = np.asarray(indices, dtype=np.intp)
+        starts = self.offsets[:-1][indices]
+        lengths = self.offsets[1:][indices] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # The position in values of every value of the new rows
+        index = (np.arange(offsets[-1], dtype=np.int64) +
+                 np.repeat(starts - offsets[:-1], lengths))
+        return self._new(offsets, self.values[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __repr__(self):
+        return 'RaggedArray(dshape="%s")' % self.dshape
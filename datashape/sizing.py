@@ -0,0 +1,222 @@
+"""
+How many bytes the data of a datashape needs.
+
+Types with a fixed layout need exactly memory_layout(ds).itemsize bytes.
+Other types are sized as the containers in this package store them:
+
+    var dimension   int64 offsets, one per row plus one, and the rows'
+                    values, as in RaggedArray
+    option[T]       the values of T and one validity bit per value, as
+                    in OptionArray
+    string, bytes,  int64 offsets, one per value plus one, and the
+    json            encoded data
+    records         the sum of their fields, stored column by column,
+                    if any field has no fixed layout
+
+The sizes of var dimensions and variable length strings come from the
+caller, as lengths. Passing averages gives an estimate, and passing
+maxima gives an upper bound.
+
+Sizes are counted in bits, which are whole numbers even with validity
+bitmaps, so integer lengths give exact sizes, rounded up to whole bytes
+once at the end.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import math
+import numbers
+from itertools import repeat
+
+import numpy as np
+
+from . import coretypes as ct
+from .error import LayoutError
+from .layout import memory_layout
+from .py2help import _strtypes
+from .util import dshape
+
+__all__ = ['nbytes', 'nbytes_many']
+
+# Bits of each offset into variable length data
+_OFFSET_BITS = 64
+# Bytes per value of the measures NumPy stores as 64-bit integers
+_int64_measures = (ct.Date, ct.Time, ct.DateTime, ct.TimeDelta)
+
+
+class _Sizer(object):
+    """Sizes the parts of one datashape, given the length statistics."""
+    def __init__(self, ds, var_len, str_len):
+        self.ds = ds
+        if var_len is None or isinstance(var_len, numbers.Number):
+            self.var_lens = repeat(var_len)
+        else:
+            self.var_lens = iter(var_len)
+        self.str_len = str_len
+
+    def var_len(self):
+        n = next(self.var_lens, None)
+        if n is None:
+            raise ValueError('Sizing %s needs var_len, a length for each of '
+                             'its var dimensions' % self.ds)
+        return n
+
+    def dims(self, params):
+        """
+        Sizes a datashape from its parameters, as (a, b) where c
+        copies of it take c * a + b bits.
+        """
+        count = 1
+        a = b = 0
+        for dim in params[:-1]:
+            if isinstance(dim, ct.Fixed):
+                count *= dim.val
+            elif isinstance(dim, ct.Var):
+                # One offset per row, plus the end offset
+                a += count * _OFFSET_BITS
+                b += _OFFSET_BITS
+                count *= self.var_len()
+            else:
+                raise ValueError('Cannot size %s, which has dimension %s' %
+                                 (self.ds, dim))
+        ma, mb = self.measure(params[-1])
+        return a + count * ma, b + mb
+
+    def measure(self, m):
+        """
+        Sizes a measure as (a, b), where c values of it take c * a + b
+        bits.
+        """
+        try:
+            return memory_layout(m).itemsize * 8, 0
+        except LayoutError:
+            pass
+        if isinstance(m, ct.Option):
+            a, b = self.measure(m.ty)
+            return a + 1, b
+        elif isinstance(m, (ct.String, ct.Bytes, ct.JSON)):
+            if self.str_len is None:
+                raise ValueError('Sizing %s needs str_len, the length in '
+                                 'bytes of its strings' % self.ds)
+            # The offsets of the values, plus the end offset
+            return _OFFSET_BITS + self.str_len * 8, _OFFSET_BITS
+        elif isinstance(m, _int64_measures):
+            return 64, 0
+        elif isinstance(m, (ct.Record, ct.Tuple)):
+            types = m.types if isinstance(m, ct.Record) else m.dshapes
+            sizes = [self.dims(t.parameters) for t in types]
+            return sum(a for a, b in sizes), sum(b for a, b in sizes)
+        raise ValueError('Cannot size %s, which has measure %s' %
+                         (self.ds, m))
+
+
+def _params(ds):
+    return ds.parameters if isinstance(ds, ct.DataShape) else (ds,)
+
+
+def _to_bytes(bits):
+    """Rounds a number of bits up to whole bytes."""
+    if isinstance(bits, numbers.Integral):
+        return -(-bits // 8)
+    return int(math.ceil(bits / 8))
+
+
+def nbytes(ds, var_len=None, str_len=None):
+    """
+    Returns the number of bytes the data of a datashape needs.
+
+    The result is exact for types with a fixed layout. Otherwise it
+    depends on the lengths given for var dimensions and strings.
+
+    Parameters
+    ----------
+    ds : Mono or string
+        The datashape.
+    var_len : number or sequence of numbers, optional
+        The length of the var dimensions, or of each var dimension in
+        the order they appear in the datashape. Required if there are
+        any.
+    str_len : number, optional
+        The length in bytes of each variable length string. Required if
+        there are any.
+
+    >>> nbytes('10 * {a: int8, b: float64}')
+    160
+    >>> nbytes('10 * var * option[int32]', var_len=5)
+    295
+    """
+    if isinstance(ds, _strtypes):
+        ds = dshape(ds)
+    a, b = _Sizer(ds, var_len, str_len).dims(_params(ds))
+    return int(_to_bytes(a + b))
+
+
+def nbytes_many(dshapes, var_len=None, str_len=None):
+    """
+    Returns the number of bytes needed by each of many datashapes, as a
+    NumPy int64 array.
+
+    Takes the same length statistics as nbytes, applied to each
+    datashape. Datashapes which differ only in a fixed leading
+    dimension, like chunks of one array, are sized together, so the
+    cost is mostly in the distinct types. Each datashape is still
+    looked at once in Python, to find its type, but the sizes are
+    computed for all of them at once with NumPy.
+
+    With integer lengths the sizes are exact, as nbytes gives them, up
+    to 2**63 bytes. Lengths which are not integers give estimates,
+    computed in float64.
+    """
+    n = len(dshapes)
+    leading = np.ones(n, dtype=np.int64)
+    which = np.empty(n, dtype=np.intp)
+    sizes = []
+    index = {}
+    # The (leading, index into sizes) of each datashape, by id, as the
+    # datashapes of a chunked array are often the same object
+    seen = {}
+    for i, ds in enumerate(dshapes):
+        try:
+            leading[i], which[i] = seen[id(ds)][:2]
+            continue
+        except KeyError:
+            pass
+        orig = ds
+        if isinstance(ds, _strtypes):
+            ds = dshape(ds)
+        params = _params(ds)
+        count = 1
+        if len(params) > 1 and isinstance(params[0], ct.Fixed):
+            count = params[0].val
+            params = params[1:]
+            key = tuple(map(id, params))
+        else:
+            key = (None,) + tuple(map(id, params))
+        try:
+            j = index[key][0]
+        except KeyError:
+            j = len(sizes)
+            sizes.append(_Sizer(ds, var_len, str_len).dims(params))
+            # Keep the parameters alive, so their ids aren't reused
+            index[key] = (j, params)
+        # Likewise keeps the datashape alive
+        seen[id(orig)] = (count, j, orig)
+        leading[i], which[i] = count, j
+    if not sizes:
+        return np.zeros(0, dtype=np.int64)
+    a = [s[0] for s in sizes]
+    b = [s[1] for s in sizes]
+    if all(isinstance(x, numbers.Integral) for x in a + b):
+        a, b = [int(x) for x in a], [int(x) for x in b]
+        # Whole bits, rounded up to bytes with integer arithmetic, in
+        # int64 unless the bits could overflow it
+        if max(a) * int(leading.max()) + max(b) < 2**63:
+            dtype = np.int64
+        else:
+            dtype = object
+        bits = (leading.astype(dtype) * np.array(a, dtype=dtype)[which] +
+                np.array(b, dtype=dtype)[which])
+        return (-(-bits // 8)).astype(np.int64)
+    bits = leading * np.array(a, dtype=np.float64)[which] + \
+        np.array(b, dtype=np.float64)[which]
+    return np.ceil(bits / 8).astype(np.int64)
@@ -0,0 +1,107 @@
+"""
+Test the datashape array file format.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from datashape import dshape, ArrayFile, save_array, LayoutError
+
+
+class TestArrayFile(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.dsa')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        a = np.arange(24, dtype='int32').reshape(2, 3, 4)
+        save_array(self.path, a)
+        with ArrayFile(self.path) as af:
+            self.assertEqual(af.dshape, dshape('2 * 3 * 4 * int32'))
+            self.assertEqual(af.element_dshape, dshape('3 * 4 * int32'))
+            self.assertTrue(np.array_equal(af.array, a))
+            self.assertFalse(af.array.flags.writeable)
+            # The data is aligned in the file
+            self.assertEqual(af.array.ctypes.data % 64, 0)
+
+    def test_records(self):
+        save_array(self.path, [(1, 2.5, b'ab'), (3, 4.5, b'cd')],
+                   '2 * {a: int8, b: float64, c: string[2, "A"]}')
+        with ArrayFile(self.path) as af:
+            self.assertEqual(af.array['a'].tolist(), [1, 3])
+            self.assertEqual(af.array['b'].tolist(), [2.5, 4.5])
+            self.assertEqual(af.array['c'].tolist(), [b'ab', b'cd'])
+            self.assertEqual(af.array.strides, (24,))
+
+    def test_append(self):
+        save_array(self.path, np.zeros((2, 3)))
+        with ArrayFile(self.path, 'r+') as af:
+            old = af.array
+            af.append(np.ones((2, 3)))
+            af.append([[2, 2, 2]])
+            self.assertEqual(af.count, 5)
+            self.assertEqual(af.dshape, dshape('5 * 3 * float64'))
+            self.assertEqual(af.array[:, 0].tolist(), [0, 0, 1, 1, 2])
+            # Earlier views still work
+            self.assertEqual(old.shape, (2, 3))
+            af.array[0, 0] = 9
+        with ArrayFile(self.path) as af:
+            self.assertEqual(af.array.shape, (5, 3))
+            self.assertEqual(af.array[:, 0].tolist(), [9, 0, 1, 1, 2])
+            self.assertRaises(ValueError, af.append, [[1, 1, 1]])
+
+    def test_little_endian(self):
+        save_array(self.path, np.array([1, 2], dtype='>i4'))
+        with ArrayFile(self.path) as af:
+            self.assertEqual(af.array.tolist(), [1, 2])
+            self.assertEqual(af.array.dtype, np.dtype('<i4'))
+            offset = af._data_offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            self.assertEqual(f.read(), struct.pack('<ii', 1, 2))
+
+    def test_append_shape(self):
+        save_array(self.path, np.zeros((2, 3)))
+        with ArrayFile(self.path, 'r+') as af:
+            # Too short data is not broadcast
+            self.assertRaises(ValueError, af.append, [1, 1, 1])
+            self.assertRaises(ValueError, af.append, np.ones((1, 3)), 2)
+            self.assertRaises(ValueError, af.append, 5, 2)
+            self.assertRaises(ValueError, af.append, np.ones((2, 4)))
+            self.assertEqual(af.count, 2)
+
+    def test_empty(self):
+        save_array(self.path, [], '0 * (int16, float32)')
+        with ArrayFile(self.path, 'r+') as af:
+            self.assertEqual(af.array.shape, (0,))
+            af.append([(1, 2.0)])
+            self.assertEqual(af.array['f1'].tolist(), [2.0])
+
+    def test_errors(self):
+        self.assertRaises(ValueError, save_array, self.path, 1, 'int32')
+        self.assertRaises(ValueError, save_array, self.path, [[1]],
+                          'var * 1 * int32')
+        self.assertRaises(LayoutError, save_array, self.path, [1],
+                          '1 * string')
+        with open(self.path, 'wb') as f:
+            f.write(b'not an array file')
+        self.assertRaises(ValueError, ArrayFile, self.path)
+        save_array(self.path, [1, 2], '2 * int16')
+        with open(self.path, 'r+b') as f:
+            f.seek(8)
+            f.write(struct.pack('<I', 99))
+        self.assertRaises(ValueError, ArrayFile, self.path)
+        self.assertRaises(ValueError, ArrayFile, self.path, 'w')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Test the datashape bundle file format.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import tempfile
+import unittest
+
+import datashape
+from datashape import dshape, Bundle, save_bundle
+from datashape import coretypes as ct
+from datashape.parser import parse
+
+
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.dsb')
+        os.close(fd)
+        self.catalog = {
+            'points': dshape('var * {x: float64, y: float64}'),
+            'table': dshape('3 * var * {id: int64, name: string[10, "A"],' +
+                            ' score: option[float32], tags: string}'),
+            'func': dshape('(A... * int32, N * T) -> N * (int8, complex)'),
+            'times': dshape('var * {t: time[tz="UTC"], d: date,' +
+                            ' dt: datetime, j: json,' +
+                            ' ns: datetime[tz="UTC", unit="ns"],' +
+                            ' td: timedelta[unit="ms"]}'),
+            'bytes': ct.DataShape(ct.Ellipsis(), ct.bytes_),
+            'units': dshape('units["m", int32]'),
+            u'été': dshape('... * 5 * bool'),
+            'large': ct.DataShape(ct.Fixed(2**40), ct.int8),
+            # Lengths which don't fit in one 32-bit word
+            'long_strings': dshape('{a: string[4294967295],' +
+                                   ' b: string[1099511627776, "A"]}'),
+            'named': ct.DataShape(ct.int16, name='myint16'),
+        }
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        save_bundle(self.path, self.catalog)
+        with Bundle(self.path) as bundle:
+            self.assertEqual(len(bundle), len(self.catalog))
+            self.assertEqual(sorted(bundle), sorted(self.catalog))
+            for name, ds in self.catalog.items():
+                self.assertTrue(name in bundle)
+                # Decoded types are interned like any other
+                self.assertTrue(bundle[name] is ds)
+            self.assertFalse('missing' in bundle)
+            self.assertRaises(KeyError, lambda: bundle['missing'])
+
+    def test_lazy_shared_decoding(self):
+        save_bundle(self.path, [('a', dshape('3 * {x: int32}')),
+                                ('b', dshape('var * {x: int32}'))])
+        with Bundle(self.path) as bundle:
+            # Nothing is decoded when opening the bundle
+            self.assertEqual(bundle._types, {})
+            bundle['a']
+            ndecoded = len(bundle._types)
+            bundle['b']
+            # Only the types 'b' doesn't share with 'a' were decoded
+            self.assertEqual(len(bundle._types), ndecoded + 2)
+
+    def test_deep_nesting(self):
+        depth = 5 * sys.getrecursionlimit()
+        ds_str = '{a: ' * depth + 'int32' + '}' * depth
+        ds = parse(ds_str, datashape.sym)
+        save_bundle(self.path, {'deep': ds})
+        with Bundle(self.path) as bundle:
+            self.assertTrue(bundle['deep'] is ds)
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, save_bundle, self.path,
+                          {'x': ct.IntegerConstant(1)})
+        with open(self.path, 'wb') as f:
+            f.write(b'not a bundle, but long enough to have a header....' * 2)
+        self.assertRaises(ValueError, Bundle, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
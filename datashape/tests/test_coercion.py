@@ -2,7 +2,13 @@ from __future__ import absolute_import, division, print_function
 
 import unittest
 
-from datashape import coercion_cost, dshape, dshapes, error
+import numpy as np
+
+from datashape import (coercion_cost, coercion_costs, coercion_path, dshape,
+                       dshapes, error)
+from datashape import coretypes as ct
+from datashape.coercion import (CoercionTable, dtype_coercion_cost,
+                                _structural_cache)
 from datashape.tests import common
 from datashape.py2help import skip
 
@@ -95,6 +101,210 @@ class TestCoercion(common.BTestCase):
             self.assertGreater(coercion_cost(dshape(ds), dshape('bool')),
                                min_cost)
 
+    def test_cheapest_chain(self):
+        # uint32 -> int64 -> float64 -> complex[float64]
+        self.assertAlmostEqual(coercion_cost(dshape('uint32'),
+                                             dshape('complex[float64]')),
+                               3.7)
+
+
+class TestCoercionTable(unittest.TestCase):
+
+    def test_closure(self):
+        table = CoercionTable()
+        table.add_coercion(ct.int8, ct.int16, 1)
+        table.add_coercion(ct.int16, ct.int32, 1)
+        self.assertEqual(table.coercion_cost(ct.int8, ct.int32), 2)
+        table.add_coercion(ct.int8, ct.int32, 1.5)
+        self.assertEqual(table.coercion_cost(ct.int8, ct.int32), 1.5)
+        self.assertEqual(table.coercion_cost(ct.int16, ct.int16), 0)
+        self.assertRaises(KeyError, table.coercion_cost, ct.int32, ct.int8)
+        self.assertRaises(KeyError, table.coercion_cost, ct.int8, ct.int64)
+
+    def test_path(self):
+        table = CoercionTable()
+        table.add_coercion(ct.int8, ct.int16, 1)
+        table.add_coercion(ct.int16, ct.int32, 1)
+        table.add_coercion(ct.int8, ct.int64, 5)
+        table.add_coercion(ct.int32, ct.int64, 1)
+        self.assertEqual(table.coercion_path(ct.int8, ct.int64),
+                         (ct.int8, ct.int16, ct.int32, ct.int64))
+        self.assertEqual(table.coercion_path(ct.int16, ct.int16),
+                         (ct.int16,))
+        self.assertRaises(KeyError, table.coercion_path, ct.int64, ct.int8)
+        # Adding a cheaper rule drops the cached path
+        table.add_coercion(ct.int8, ct.int64, 2)
+        self.assertEqual(table.coercion_path(ct.int8, ct.int64),
+                         (ct.int8, ct.int64))
+        table.add_coercion(ct.int16, ct.int64, 0.5, transitive=False)
+        self.assertEqual(table.coercion_path(ct.int16, ct.int64),
+                         (ct.int16, ct.int64))
+        self.assertEqual(table.coercion_path(ct.int8, ct.int64),
+                         (ct.int8, ct.int64))
+
+    def test_not_transitive(self):
+        table = CoercionTable()
+        table.add_coercion(ct.int8, ct.int16, 1)
+        table.add_coercion(ct.int16, ct.int32, 1, transitive=False)
+        self.assertEqual(table.coercion_cost(ct.int16, ct.int32), 1)
+        self.assertRaises(KeyError, table.coercion_cost, ct.int8, ct.int32)
+
+
+class TestCoercionPath(unittest.TestCase):
+
+    def test_path(self):
+        self.assertEqual(coercion_path(dshape('uint8'), dshape('float32')),
+                         (ct.uint8, ct.int16, ct.float32))
+        self.assertEqual(coercion_path(ct.int32, dshape('int32')),
+                         (ct.int32,))
+
+    def test_path_cost(self):
+        a, b = dshapes('int8', 'complex[float64]')
+        path = coercion_path(a, b)
+        self.assertEqual((path[0], path[-1]), (a[0], b[0]))
+        self.assertAlmostEqual(sum(coercion_cost(x, y)
+                                   for x, y in zip(path, path[1:])),
+                               coercion_cost(a, b))
+
+    def test_no_path(self):
+        self.assertRaises(error.CoercionError, coercion_path,
+                          dshape('float32'), dshape('int32'))
+        self.assertRaises(error.CoercionError, coercion_path,
+                          dshape('3 * int32'), dshape('3 * int64'))
+
+
+class TestCoercionCosts(unittest.TestCase):
+
+    def test_matches_coercion_cost(self):
+        types = dshapes('int8', 'uint32', 'float32', 'complex[float64]',
+                        'bool', 'string', '3 * int32', '2 * 3 * int64',
+                        'X * float64')
+        srcs = [a for a in types for b in types]
+        dsts = [b for a in types for b in types]
+        costs = coercion_costs(srcs, dsts)
+        self.assertEqual(costs.dtype, np.float64)
+        self.assertEqual(costs.shape, (len(srcs),))
+        for a, b, cost in zip(srcs, dsts, costs):
+            try:
+                expected = coercion_cost(a, b)
+            except (error.CoercionError, TypeError):
+                expected = np.inf
+            self.assertAlmostEqual(cost, expected)
+
+    def test_ctypes(self):
+        costs = coercion_costs([ct.int8, ct.float64, ct.bool_],
+                               [ct.int16, ct.int8, ct.bool_])
+        self.assertEqual(costs.tolist(), [1, np.inf, 0])
+
+    def test_empty(self):
+        self.assertEqual(coercion_costs([], []).shape, (0,))
+
+    def test_lengths(self):
+        self.assertRaises(ValueError, coercion_costs, [ct.int8],
+                          [ct.int8, ct.int16])
+
+    def test_table_ids(self):
+        table = CoercionTable()
+        table.add_coercion(ct.int8, ct.int16, 1)
+        ids = table.type_ids([ct.int16, ct.int8, ct.float32])
+        self.assertEqual(ids.tolist(), [1, 0, -1])
+        self.assertEqual(table.costs_by_id(ids, ids[[0, 0, 0]]).tolist(),
+                         [0, 1, np.inf])
+
+
+class TestStructuralCoercion(unittest.TestCase):
+
+    def test_option(self):
+        a, b, c = dshapes('int32', 'option[int32]', 'option[int64]')
+        self.assertGreater(coercion_cost(a, b), 0)
+        self.assertLess(coercion_cost(a, b), coercion_cost(a, c))
+        self.assertEqual(coercion_cost(b, c),
+                         coercion_cost(a, dshape('int64')))
+        self.assertRaises(error.CoercionError, coercion_cost, b, a)
+        self.assertRaises(error.CoercionError, coercion_cost, c, b)
+
+    def test_record(self):
+        a, b, c = dshapes('{x: int32, y: string[3]}',
+                          '{x: int64, y: string}',
+                          '{x: float64, y: string}')
+        self.assertLess(coercion_cost(a, b), coercion_cost(a, c))
+        self.assertAlmostEqual(coercion_cost(a, b), 1.1)
+        self.assertRaises(error.CoercionError, coercion_cost, b, a)
+        # Fields are matched by name
+        self.assertAlmostEqual(
+            coercion_cost(a, dshape('{y: string, x: int64}')), 1.1)
+        self.assertRaises(error.CoercionError, coercion_cost, a,
+                          dshape('{x: int32}'))
+
+    def test_nested(self):
+        a, b = dshapes('{x: 3 * int32, y: {z: float32}}',
+                       '{x: 3 * int64, y: option[{z: float64}]}')
+        self.assertAlmostEqual(coercion_cost(a, b), 2.1)
+
+    def test_tuple(self):
+        a, b = dshapes('(int8, float32)', '(int16, float64)')
+        self.assertEqual(coercion_cost(a, b), 2)
+        self.assertRaises(error.CoercionError, coercion_cost, a,
+                          dshape('(int16, float64, int8)'))
+
+    def test_string(self):
+        ascii3, utf3, utf5, utf, utf32 = dshapes(
+            'string[3, "A"]', 'string[3]', 'string[5]', 'string',
+            'string[5, "U32"]')
+        self.assertLess(coercion_cost(ascii3, utf3),
+                        coercion_cost(utf5, utf32))
+        self.assertLess(coercion_cost(utf3, utf5),
+                        coercion_cost(ascii3, utf5))
+        self.assertGreater(coercion_cost(utf5, utf), 0)
+        for a, b in [(utf, utf5), (utf5, utf3), (utf3, ascii3)]:
+            self.assertRaises(error.CoercionError, coercion_cost, a, b)
+
+    def test_string_encoding_widths(self):
+        # Ten characters take up to 40 bytes of UTF-8 and 20 UTF-16
+        # code units
+        for a, b in [('string[10, "U32"]', 'string[10]'),
+                     ('string[10, "U32"]', 'string[39]'),
+                     ('string[10, "U32"]', 'string[19, "U16"]'),
+                     ('string[10, "U16"]', 'string[10]'),
+                     ('string[10]', 'string[10, "U16"]')]:
+            self.assertRaises(error.CoercionError, coercion_cost,
+                              dshape(a), dshape(b))
+        for a, b in [('string[10, "U32"]', 'string[40]'),
+                     ('string[10, "U32"]', 'string[20, "U16"]'),
+                     ('string[10]', 'string[10, "U32"]'),
+                     ('string[10, "A"]', 'string[10, "U16"]'),
+                     ('string[10, "U16"]', 'string[40]')]:
+            self.assertLess(coercion_cost(dshape(a), dshape(b)), 1)
+
+    def test_datetime(self):
+        naive, utc, est = dshapes('datetime', 'datetime[tz="UTC"]',
+                                  'datetime[tz="EST"]')
+        self.assertLess(coercion_cost(utc, est), coercion_cost(naive, utc))
+        self.assertEqual(coercion_cost(utc, utc), 0)
+        # A finer unit holds every value, a coarser one truncates them
+        s, ns = dshapes('datetime[unit="s"]', 'datetime[unit="ns"]')
+        self.assertLess(coercion_cost(s, naive), coercion_cost(ns, naive))
+        # but nanoseconds only span 1678 to 2262, so may overflow
+        self.assertEqual(coercion_cost(s, ns), coercion_cost(ns, s))
+        self.assertLess(coercion_cost(s, naive), coercion_cost(s, ns))
+
+    def test_dtype_coercion_cost(self):
+        a, b = dshapes('{x: int32}', '{x: int64}')
+        self.assertEqual(dtype_coercion_cost(a.measure, b.measure), 1)
+        self.assertEqual(dtype_coercion_cost(b.measure, a.measure),
+                         float('inf'))
+        self.assertEqual(coercion_costs([a, b], [b, a]).tolist(),
+                         [1, float('inf')])
+
+    def test_memoized(self):
+        a, b = dshapes('{x: int32, y: option[int8]}',
+                       '{x: int64, y: option[int16]}')
+        coercion_cost(a, b)
+        hits = _structural_cache.hits
+        self.assertEqual(coercion_cost(a, b), 2)
+        self.assertEqual(_structural_cache.hits, hits + 1)
+
+
 class TestCoercionErrors(unittest.TestCase):
 
     def test_downcast(self):
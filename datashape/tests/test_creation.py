@@ -1,10 +1,19 @@
 from __future__ import absolute_import, division, print_function
 
+import binascii
 import ctypes
+import gc
+import os
+import pickle
+import subprocess
+import sys
+import threading
 import unittest
+import weakref
 
 import datashape
 from datashape import dshape, error
+from datashape.parser import parse
 from datashape.py2help import skip
 
 
@@ -125,5 +134,280 @@ class TestDataShapeCreation(unittest.TestCase):
         self.assertEqual(shape, ())
         self.assertEqual(dt, np.dtype([('x', 'int32'), ('y', 'float32')]))
 
+
+class TestNumpyBridge(unittest.TestCase):
+
+    def check_round_trip(self, shape, dt):
+        import numpy as np
+        dt = np.dtype(dt)
+        ds = datashape.from_numpy(shape, dt)
+        self.assertEqual(datashape.to_numpy(ds), (shape, dt))
+        return ds
+
+    def test_round_trip(self):
+        self.check_round_trip((), 'int8')
+        self.check_round_trip((3, 4), 'complex128')
+        self.check_round_trip((2,), 'S7')
+        self.check_round_trip((), 'U5')
+        self.check_round_trip((), 'M8[D]')
+        self.check_round_trip((), 'M8[us]')
+        self.check_round_trip((), 'M8[ns]')
+        self.check_round_trip((), 'M8[s]')
+        self.check_round_trip((), 'm8[ns]')
+        self.check_round_trip((5,), [('a', 'i4'), ('b', 'f8', (2, 3)),
+                                     ('c', [('d', 'i1'), ('e', 'U3')])])
+
+    def test_from_numpy(self):
+        import numpy as np
+        self.assertEqual(datashape.from_numpy((), 'U5'),
+                         datashape.String(5, 'U32'))
+        ds = datashape.from_numpy((2,), np.dtype(('i2', (3,))))
+        self.assertEqual(ds, dshape('2 * 3 * int16'))
+        ds = datashape.from_numpy((), [('a', 'i4', 3), ('b', [('c', 'f4')])])
+        self.assertEqual(ds,
+                         dshape('{a: 3 * int32, b: {c: float32}}').measure)
+        self.assertEqual(datashape.from_numpy((), 'M8[ns]'),
+                         datashape.DateTime(unit='ns'))
+        self.assertEqual(datashape.from_numpy((), 'M8[us]'),
+                         datashape.datetime_)
+        # Coarser units than days are dates, which are datetime64[D]
+        self.assertEqual(datashape.from_numpy((), 'M8[W]'), datashape.date_)
+        self.assertEqual(datashape.from_numpy((), 'm8[ms]'),
+                         datashape.TimeDelta('ms'))
+        # The byte order and padding are not part of the datashape, and
+        # are given back to to_numpy
+        self.assertEqual(datashape.from_numpy((), '>i4'), datashape.int32)
+        for dt in ['>i4', '>M8[ns]', [('a', '>i2'), ('b', '>f8', 2)]]:
+            dt = np.dtype(dt)
+            ds = datashape.from_numpy((3,), dt)
+            self.assertEqual(datashape.to_numpy(ds, byteorder='>'),
+                             ((3,), dt))
+        dt = np.dtype([('a', 'i1'), ('b', 'i4')], align=True)
+        self.assertEqual(datashape.from_numpy((), dt),
+                         dshape('{a: int8, b: int32}').measure)
+        for dt in ['V8', 'M8', 'm8', 'g']:
+            self.assertRaises(datashape.NotNumpyCompatible,
+                              datashape.from_numpy, (), dt)
+
+    def test_to_numpy(self):
+        import numpy as np
+        ds = dshape('{a: int8, b: (int32, 2 * float64)}')
+        shape, dt = datashape.to_numpy(ds, align=True)
+        self.assertEqual(dt, np.dtype([('a', 'i1'),
+                                       ('b', [('f0', 'i4'), ('f1', 'f8', 2)])],
+                                      align=True))
+        self.assertEqual(dt.itemsize, 32)
+        shape, dt = datashape.to_numpy(dshape('2 * int32'), byteorder='>')
+        self.assertEqual((shape, dt), ((2,), np.dtype('>i4')))
+        self.assertEqual(datashape.to_numpy(dshape('M * int32'))[0], (-1,))
+        for ds_str in ['var * int32', 'string', '{a: M * int32}',
+                       'string[3, "U8"]', 'datetime[tz="UTC"]']:
+            self.assertRaises(datashape.NotNumpyCompatible,
+                              datashape.to_numpy, dshape(ds_str))
+
+    def test_memoized(self):
+        import numpy as np
+        ds = dshape('10 * {a: int8, b: 3 * float64}')
+        self.assertTrue(datashape.to_numpy(ds) is datashape.to_numpy(ds))
+        dt = np.dtype([('a', 'i1'), ('b', 'f8', 3)])
+        self.assertTrue(datashape.from_numpy((10,), dt) is ds)
+        self.assertTrue(datashape.from_numpy((10,), dt) is
+                        datashape.from_numpy([10], dt))
+
+    def test_datetime(self):
+        dt = dshape('datetime[tz="UTC", unit="ns"]').measure
+        self.assertEqual(dt, datashape.DateTime('UTC', 'ns'))
+        self.assertEqual(str(dt), "datetime[tz='UTC', unit='ns']")
+        self.assertEqual(dshape(str(dt)).measure, dt)
+        self.assertEqual(str(datashape.DateTime(unit='ms')),
+                         "datetime[unit='ms']")
+        self.assertNotEqual(datashape.DateTime(unit='ms'), datashape.datetime_)
+        # Microseconds are the default
+        self.assertTrue(datashape.DateTime(unit='us') is datashape.datetime_)
+        self.assertEqual(str(dshape('datetime')), 'datetime')
+        self.assertRaises(ValueError, datashape.DateTime, None, 'D')
+
+    def test_timedelta(self):
+        td = dshape('timedelta[unit="ms"]').measure
+        self.assertEqual(td, datashape.TimeDelta('ms'))
+        self.assertEqual(str(td), "timedelta[unit='ms']")
+        self.assertEqual(dshape(str(td)).measure, td)
+        self.assertEqual(str(dshape('timedelta')), 'timedelta')
+        self.assertRaises(ValueError, datashape.TimeDelta, 'xs')
+
+
+class TestDataShapeInterning(unittest.TestCase):
+
+    def test_parse_shares_types(self):
+        sym = datashape.TypeSymbolTable()
+        a = parse('3 * { a : int32, b : var * string[10] }', sym)
+        b = parse('3*{a:int32,b:var*string[10]}', sym)
+        self.assertTrue(a is b)
+        self.assertTrue(a[-1]['b'] is b[-1]['b'])
+
+    def test_constructors_share_types(self):
+        self.assertTrue(datashape.Fixed(3) is datashape.Fixed(3))
+        self.assertTrue(datashape.String(5, 'A') is datashape.String(5, 'A'))
+        self.assertTrue(datashape.Option(datashape.int32) is
+                        datashape.Option(datashape.DataShape(datashape.int32)))
+        self.assertTrue(datashape.Record([('x', datashape.int32)]) is
+                        datashape.Record([('x', datashape.int32)]))
+        self.assertTrue(datashape.DataShape(datashape.Fixed(2),
+                                            datashape.float64) is
+                        dshape('2 * float64'))
+
+    def test_distinct_types_are_not_shared(self):
+        # Equal, but differently spelled or named, types stay distinct
+        self.assertFalse(datashape.String('ascii') is datashape.String('A'))
+        self.assertFalse(datashape.DataShape(3, datashape.int32) is
+                         datashape.DataShape(datashape.Fixed(3),
+                                             datashape.int32))
+        named = datashape.DataShape(datashape.int8, name='interned_int8')
+        self.assertFalse(named is datashape.DataShape(datashape.int8))
+        self.assertEqual(str(named), 'interned_int8')
+
+    def test_named_datashapes_register_the_interned_type(self):
+        named = datashape.DataShape(datashape.int16, name='registered_int16')
+        again = datashape.DataShape(datashape.int16, name='registered_int16')
+        self.assertTrue(again is named)
+        self.assertTrue(datashape.Type.lookup_type('registered_int16')
+                        is named)
+        data = pickle.dumps(named)
+        del named, again
+        gc.collect()
+        # A named datashape rebuilt by unpickling is registered too
+        named = pickle.loads(data)
+        self.assertTrue(datashape.Type.lookup_type('registered_int16')
+                        is named)
+
+    def test_unpickled_types_are_shared(self):
+        for ds in [dshape('3 * {a : int32, b : var * string[10, "A"]}'),
+                   dshape('(int8, T) -> A... * B'),
+                   datashape.DataShape(datashape.int8, name='pickled_int8')]:
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                self.assertTrue(pickle.loads(pickle.dumps(ds, protocol)) is ds)
+        # A type which isn't live is interned when unpickled
+        data = pickle.dumps(dshape('654321 * int8'))
+        gc.collect()
+        self.assertTrue(pickle.loads(data) is dshape('654321 * int8'))
+
+    def test_types_are_immutable(self):
+        ds = dshape('3 * {a : int32, b : string[4]}')
+        for t, name in [(ds, 'name'), (ds, 'parameters'),
+                        (ds[-1], 'parameters'), (ds[0], 'val'),
+                        (ds[-1]['b'][0], 'encoding'),
+                        (ds[-1]['b'][0], 'fixlen')]:
+            self.assertRaises(AttributeError, setattr, t, name, None)
+            self.assertRaises(AttributeError, delattr, t, name)
+        self.assertTrue(dshape('3 * {a : int32, b : string[4]}') is ds)
+        self.assertEqual(str(ds), '3 * { a : int32, b : string[4] }')
+        # Values cached on first use can't be replaced either
+        ds.fingerprint
+        self.assertRaises(AttributeError, setattr, ds, '_fingerprint', b'')
+        # but may be set again to an equal value, as a thread racing to
+        # fill the cache does
+        ds._fingerprint = bytes(bytearray(ds.fingerprint))
+
+    def test_cached_values_filled_by_threads(self):
+        errors = []
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for i in range(20):
+                # New types, so each round fills their caches afresh
+                types = [datashape.Record([('f%d_%d' % (i, j),
+                                            datashape.int32),
+                                           ('g', dshape('var * int8'))])
+                         for j in range(100)]
+                barrier = threading.Barrier(4)
+
+                def fill():
+                    barrier.wait()
+                    try:
+                        for t in types:
+                            hash(t)
+                            t.fields
+                            t.fingerprint
+                            t.ndim
+                            hash(datashape.DataShape(datashape.Fixed(2), t))
+                    except Exception as e:
+                        errors.append(e)
+                threads = [threading.Thread(target=fill) for _ in range(4)]
+                for th in threads:
+                    th.start()
+                for th in threads:
+                    th.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+
+    def test_types_have_no_instance_dict(self):
+        for ds in [dshape('3 * var * int32'), datashape.Fixed(3),
+                   datashape.int32, datashape.String(4, 'A'),
+                   datashape.Option(datashape.int8), datashape.Var(),
+                   dshape('{a : int32}')[0], dshape('(int8, int16)')[0],
+                   dshape('datetime[tz="UTC"]')[0]]:
+            self.assertFalse(hasattr(ds, '__dict__'), repr(ds))
+
+    def test_record_field_index(self):
+        rec = datashape.Record([('a', datashape.int32),
+                                ('b', dshape('3 * float64'))])
+        self.assertEqual(rec.names, ['a', 'b'])
+        self.assertEqual(rec['b'], dshape('3 * float64'))
+        self.assertEqual(rec.fields, {'a': dshape('int32'),
+                                      'b': dshape('3 * float64')})
+
+    def test_unreferenced_types_are_released(self):
+        ds = datashape.DataShape(datashape.Fixed(123457), datashape.int8)
+        ref = weakref.ref(ds)
+        del ds
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+
+class TestDataShapeFingerprint(unittest.TestCase):
+
+    def test_structural(self):
+        a = dshape('3 * {a : int32, b : var * string[10, "ascii"]}')
+        fp = a.fingerprint
+        self.assertEqual(len(fp), 16)
+        # Computed once, then stored on the type
+        self.assertTrue(a.fingerprint is fp)
+        # Equal types have equal fingerprints, however they are spelled
+        self.assertEqual(
+            dshape('3 * {a : int32, b : var * string[10, "A"]}').fingerprint,
+            fp)
+        self.assertEqual(datashape.DataShape(datashape.int8,
+                                             name='fp_int8').fingerprint,
+                         dshape('int8').fingerprint)
+
+    def test_distinguishes_types(self):
+        ds_strs = ['int32', '3 * int32', '4 * int32', 'var * int32',
+                   'N * int32', 'string', 'string[3]', '{a: int32}',
+                   '{b: int32}', '{a: int32, b: int8}', '{b: int8, a: int32}',
+                   '(int32, int8)', '(int32) -> int8', 'option[int32]',
+                   'A... * int32', '... * int32', 'time[tz="UTC"]', 'time',
+                   'units["m"]', 'units["s"]', 'json', 'date', 'datetime']
+        fps = set(dshape(ds_str).fingerprint for ds_str in ds_strs)
+        self.assertEqual(len(fps), len(ds_strs))
+        self.assertNotEqual(datashape.int32.fingerprint,
+                            dshape('int32').fingerprint)
+
+    def test_stable_across_processes(self):
+        ds_str = '3 * {a : option[int32], b : (N * string, time[tz="UTC"])}'
+        code = ('import binascii, datashape; print(binascii.hexlify(' +
+                'datashape.dshape(%r).fingerprint).decode())' % ds_str)
+        env = dict(os.environ, PYTHONHASHSEED='12345')
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        out = subprocess.check_output([sys.executable, '-c', code], env=env)
+        self.assertEqual(out.decode().strip(),
+                         binascii.hexlify(dshape(ds_str).fingerprint).decode())
+
+    def test_deep_nesting(self):
+        depth = 5 * sys.getrecursionlimit()
+        ds = parse('{a: ' * depth + 'int32' + '}' * depth,
+                   datashape.TypeSymbolTable())
+        self.assertEqual(len(ds.fingerprint), 16)
+
 if __name__ == '__main__':
     unittest.main()
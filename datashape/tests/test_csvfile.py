@@ -0,0 +1,160 @@
+"""
+Test inferring the datashapes of CSV files and reading them in chunks.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from datashape import dshape, infer_csv, read_csv
+
+
+TEXT = (u'id,score,when,name,ok\n'
+        u'1,0.5,2014-01-01,"a\nb",true\n'
+        u'2,,2014-01-02T10:00,x,False\n'
+        u'3,7,2014-01-03,"y, z",true\n')
+
+
+class TestInferCSV(unittest.TestCase):
+    def test_infer(self):
+        self.assertEqual(infer_csv(io.StringIO(TEXT)),
+                         dshape('var * {id: int64, score: option[float64], '
+                                'when: datetime, name: string, ok: bool}'))
+
+    def test_sample(self):
+        text = u'a,b\n1,x\n2,y\n2.5,z\n'
+        self.assertEqual(infer_csv(io.StringIO(text), sample=2),
+                         dshape('var * {a: int64, b: string}'))
+        self.assertEqual(infer_csv(io.StringIO(text)),
+                         dshape('var * {a: float64, b: string}'))
+
+    def test_no_header(self):
+        self.assertEqual(infer_csv(io.StringIO(u'1;a\n'), header=False,
+                                   delimiter=';'),
+                         dshape('var * {f0: int64, f1: string}'))
+
+    def test_empty_columns(self):
+        self.assertEqual(infer_csv(io.StringIO(u'a,b\n,1\n')),
+                         dshape('var * {a: option[string], b: int64}'))
+        self.assertEqual(infer_csv(io.StringIO(u'a,b\n')),
+                         dshape('var * {a: string, b: string}'))
+        self.assertRaises(ValueError, infer_csv, io.StringIO(u''))
+
+    def test_ragged_rows(self):
+        self.assertRaises(ValueError, infer_csv, io.StringIO(u'a,b\n1\n'))
+
+    def test_strict_numbers(self):
+        text = u'a,b,c,d\n1_000, 2,1e5,-inf\n'
+        self.assertEqual(infer_csv(io.StringIO(text)),
+                         dshape('var * {a: string, b: string, c: float64, '
+                                'd: float64}'))
+
+    def test_utc_offsets(self):
+        # Datetimes with an offset would be shifted to UTC, so are strings
+        text = u'a,b\n2020-01-01T00:00:00+05:00,2020-01-01T00:00:00Z\n'
+        self.assertEqual(infer_csv(io.StringIO(text)),
+                         dshape('var * {a: string, b: datetime}'))
+
+
+class TestReadCSV(unittest.TestCase):
+    def test_read(self):
+        chunks = list(read_csv(io.StringIO(TEXT), infer_csv(io.StringIO(TEXT))))
+        self.assertEqual(len(chunks), 1)
+        values = chunks[0].values
+        self.assertEqual(values['id'].tolist(), [1, 2, 3])
+        self.assertEqual(values['name'].tolist(), ['a\nb', 'x', 'y, z'])
+        self.assertEqual(values['ok'].tolist(), [True, False, True])
+        self.assertEqual(values['when'][1],
+                         np.datetime64('2014-01-02T10:00', 'us'))
+        score = chunks[0].column('score')
+        self.assertEqual(score.null_count, 1)
+        self.assertEqual(score[2], 7.0)
+        self.assertEqual(sorted(chunks[0].validity), ['score'])
+
+    def test_chunks(self):
+        text = u'a,b\n' + u''.join(u'%d,"%d\n"\n' % (i, i) for i in range(100))
+        chunks = list(read_csv(io.StringIO(text), 'var * {a: int32, b: string}',
+                               chunksize=7))
+        # Each row takes two lines
+        self.assertEqual([len(c) for c in chunks[:3]], [4, 4, 4])
+        self.assertEqual(sum(map(len, chunks)), 100)
+        a = np.concatenate([c.values['a'] for c in chunks])
+        self.assertEqual(a.dtype, np.dtype('int32'))
+        self.assertEqual(a.tolist(), list(range(100)))
+
+    def test_fixed_strings(self):
+        chunk, = read_csv(io.StringIO(u'a\nabcdef\n\n'),
+                          'var * {a: option[string[3, "U32"]]}')
+        self.assertEqual(chunk.values['a'].tolist(), ['abc', ''])
+        self.assertEqual(chunk.column('a')[1], None)
+
+    def test_infer_from_file(self):
+        text = u'a,b\n' + u''.join(u'%d,x\n' % i for i in range(10))
+        f = io.StringIO(text)
+        chunks = list(read_csv(f, sample=4))
+        self.assertEqual(sum(map(len, chunks)), 10)
+        self.assertEqual(chunks[0].values['a'].tolist(), list(range(10)))
+
+    def test_infer_unseekable(self):
+        class Unseekable(io.StringIO):
+            def seekable(self):
+                return False
+        self.assertRaises(TypeError, list,
+                          read_csv(Unseekable(u'a\n1\n')))
+        chunk, = read_csv(Unseekable(u'a\n1\n'), 'var * {a: int8}')
+        self.assertEqual(chunk.values['a'].tolist(), [1])
+
+    def test_errors(self):
+        text = u'a\n1\nx\n'
+        self.assertRaises(ValueError, list,
+                          read_csv(io.StringIO(text), 'var * {a: int64}'))
+        self.assertRaises(ValueError, list,
+                          read_csv(io.StringIO(u'a\n\n'), 'var * {a: int64}'))
+        self.assertRaises(TypeError, list,
+                          read_csv(io.StringIO(text), 'var * int64'))
+        self.assertRaises(TypeError, list,
+                          read_csv(io.StringIO(text), 'var * {a: 2 * int64}'))
+
+    def test_utc_offsets(self):
+        text = u'a\n2020-01-01T10:00Z\n2020-01-01T10:00-05:00\n'
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            chunks = read_csv(io.StringIO(text), 'var * {a: datetime}',
+                              chunksize=1)
+            self.assertEqual(next(chunks).values['a'][0],
+                             np.datetime64('2020-01-01T10:00', 'us'))
+            self.assertRaises(ValueError, next, chunks)
+
+
+class TestReadCSVFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.csv')
+        with io.open(self.path, 'w', newline='') as f:
+            f.write(u'id,x\n')
+            for i in range(1000):
+                f.write(u'%d,%s\n' % (i, u'' if i % 3 == 0 else i / 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_processes(self):
+        serial = list(read_csv(self.path, chunksize=100))
+        pooled = list(read_csv(self.path, chunksize=100, processes=2))
+        self.assertEqual(len(serial), 10)
+        for a, b in zip(serial, pooled):
+            self.assertEqual(a.values.tolist(), b.values.tolist())
+            self.assertEqual(a.validity['x'].tolist(),
+                             b.validity['x'].tolist())
+        self.assertEqual(serial[3].column('x').null_count, 34)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Test discovering the datashape of Python data.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import datetime
+import unittest
+
+import numpy as np
+
+from datashape import dshape, discover, discover_value, join, typeof
+from datashape import coretypes as ct
+
+
+class TestDiscoverValue(unittest.TestCase):
+    def test_scalars(self):
+        self.assertEqual(discover_value(1), dshape('int64'))
+        self.assertEqual(discover_value(True), dshape('bool'))
+        self.assertEqual(discover_value(1.5), dshape('float64'))
+        self.assertEqual(discover_value('abc'), dshape('string'))
+        self.assertEqual(discover_value(None), dshape('option[string]'))
+        self.assertEqual(discover_value(np.float32(1)), dshape('float32'))
+        self.assertEqual(discover_value(object()), dshape('string'))
+
+    def test_dates(self):
+        self.assertEqual(discover_value(datetime.date(2014, 1, 1)),
+                         dshape('date'))
+        self.assertEqual(discover_value(datetime.datetime(2014, 1, 1)),
+                         dshape('datetime'))
+        self.assertEqual(discover_value('2014-01-01'), dshape('date'))
+        self.assertEqual(discover_value('2014-01-01T10:30:00.5Z'),
+                         dshape('datetime'))
+        self.assertEqual(discover_value('2014-01-01 10:30'),
+                         dshape('datetime'))
+        self.assertEqual(discover_value('2014-01-01x'), dshape('string'))
+        self.assertEqual(discover_value(datetime.timedelta(1)),
+                         dshape('timedelta'))
+
+    def test_collections(self):
+        self.assertEqual(discover_value([1, 2, 3]), dshape('var * int64'))
+        self.assertEqual(discover_value([1, 2.5, None]),
+                         dshape('var * option[float64]'))
+        self.assertEqual(discover_value([[1], [], [2, 3]]),
+                         dshape('var * var * int64'))
+        self.assertEqual(discover_value([]), dshape('var * string'))
+        self.assertEqual(discover_value((1, 'a')),
+                         dshape('(int64, string)'))
+        self.assertEqual(discover_value(np.zeros((2, 3), 'int16')),
+                         dshape('2 * 3 * int16'))
+        self.assertEqual(discover_value({'a': 1, 'b': {'c': [1.0]}}),
+                         dshape('{a: int64, b: {c: var * float64}}'))
+
+
+class TestJoin(unittest.TestCase):
+    def test_measures(self):
+        self.assertEqual(join(dshape('int64'), dshape('float64')),
+                         dshape('float64'))
+        self.assertEqual(join(dshape('bool'), dshape('int64')),
+                         dshape('int64'))
+        self.assertEqual(join(dshape('option[int32]'), dshape('int64')),
+                         dshape('option[int64]'))
+        self.assertEqual(join(dshape('date'), dshape('datetime')),
+                         dshape('datetime'))
+        self.assertEqual(join(dshape('date'), dshape('string')),
+                         dshape('string'))
+        self.assertEqual(join(dshape('int64'), dshape('var * int64')),
+                         dshape('string'))
+
+    def test_dimensions(self):
+        self.assertEqual(join(dshape('3 * int32'), dshape('3 * int32')),
+                         dshape('3 * int32'))
+        self.assertEqual(join(dshape('3 * int32'), dshape('4 * int32')),
+                         dshape('var * int32'))
+
+    def test_records(self):
+        a = dshape('{a: int64, b: var * int64}')
+        b = dshape('{a: option[int64], c: date}')
+        self.assertEqual(join(a, b),
+                         dshape('{a: option[int64], b: var * int64, '
+                                'c: option[date]}'))
+        self.assertEqual(join(dshape('(int8, string)'),
+                              dshape('(float64, string)')),
+                         dshape('(float64, string)'))
+
+
+class TestDiscover(unittest.TestCase):
+    def test_rows(self):
+        rows = [{'id': i, 'name': 'x%d' % i, 'score': i * 0.5}
+                for i in range(100)]
+        rows[50]['score'] = None
+        rows[70]['extra'] = [1, 2]
+        self.assertEqual(discover(rows),
+                         dshape('100 * {id: int64, name: string, '
+                                'score: option[float64], '
+                                'extra: var * int64}'))
+        self.assertEqual(discover([]), dshape('0 * string'))
+        self.assertEqual(discover([[1, 2], [3]]),
+                         dshape('2 * var * int64'))
+
+    def test_iterators(self):
+        self.assertEqual(discover(iter([1, 2, 3])), dshape('3 * int64'))
+        self.assertEqual(discover(iter(range(10)), sample=4),
+                         dshape('var * int64'))
+        self.assertEqual(discover(iter(range(3)), sample=4),
+                         dshape('3 * int64'))
+        # Exactly as many rows as sampled are all the rows
+        self.assertEqual(discover(iter(range(4)), sample=4),
+                         dshape('4 * int64'))
+        self.assertEqual(discover(iter(range(5)), sample=4),
+                         dshape('var * int64'))
+
+    def test_sample_and_stable(self):
+        data = list(range(1000)) + [1.5]
+        self.assertEqual(discover(data), dshape('1001 * float64'))
+        self.assertEqual(discover(data, stable=10), dshape('1001 * int64'))
+        self.assertEqual(discover(iter(data), stable=10),
+                         dshape('var * int64'))
+        self.assertEqual(discover(iter(range(11)), stable=10),
+                         dshape('11 * int64'))
+        # Sampling keeps the length of a sequence
+        self.assertEqual(discover(data, sample=10)[0], ct.Fixed(1001))
+
+    def test_typeof(self):
+        self.assertEqual(typeof(datetime.datetime(2014, 1, 1)),
+                         dshape('datetime'))
+        self.assertEqual(typeof(datetime.timedelta(1)), dshape('timedelta'))
+        self.assertEqual(typeof(datetime.date(2014, 1, 1)), dshape('date'))
+        self.assertEqual(typeof(True), dshape('bool'))
+
+
+if __name__ == '__main__':
+    unittest.main()
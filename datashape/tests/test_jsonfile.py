@@ -0,0 +1,160 @@
+"""
+Test reading JSON lines into structured arrays of a datashape.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from datashape import dshape, jsonfile, read_jsonl
+
+
+LINES = ['{"id": 1, "name": "alice", "score": 0.5, "when": "2014-01-01",'
+         ' "extra": [1, 2]}',
+         '',
+         '{"id": 2, "name": "bob", "score": null, "when": "2014-01-02"}',
+         '{"name": "carol-long", "id": 3}']
+
+DS = ('var * {id: int64, name: string[5], score: option[float32], '
+      'when: option[date]}')
+
+
+class TestReadJSONL(unittest.TestCase):
+    def test_read(self):
+        chunk, = read_jsonl(LINES, DS)
+        values = chunk.values
+        self.assertEqual(values.dtype.names, ('id', 'name', 'score', 'when'))
+        self.assertEqual(values['id'].tolist(), [1, 2, 3])
+        self.assertEqual(values['name'].tolist(), ['alice', 'bob', 'carol'])
+        self.assertEqual(values['score'].dtype, np.dtype('float32'))
+        self.assertEqual(chunk.column('score').null_count, 2)
+        self.assertEqual(chunk.column('when')[1], np.datetime64('2014-01-02'))
+        self.assertEqual(chunk.column('when')[2], None)
+        self.assertEqual(sorted(chunk.validity), ['score', 'when'])
+
+    def test_chunks(self):
+        lines = ('{"a": %d, "b": "x%d"}' % (i, i) for i in range(100))
+        chunks = list(read_jsonl(lines, '{a: int16, b: string}',
+                                 chunksize=30))
+        self.assertEqual([len(c) for c in chunks], [30, 30, 30, 10])
+        self.assertEqual(chunks[3].values['b'].tolist()[-1], 'x99')
+        self.assertEqual(chunks[0].values['a'].dtype, np.dtype('int16'))
+
+    def test_bytes(self):
+        chunk, = read_jsonl([b'{"a": true}\n', b'{"a": false}\n'],
+                            dshape('{a: bool}'))
+        self.assertEqual(chunk.values['a'].tolist(), [True, False])
+
+    def test_errors(self):
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['{"a": 1}', '{}'], '{a: int32}'))
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['{"a": "x"}'], '{a: int32}'))
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['{"a": 1}', '{"a": '], '{a: int32}'))
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['[1]'], '{a: int32}'))
+        self.assertRaises(TypeError, list, read_jsonl(['1'], 'int32'))
+
+    def test_not_json_lines(self):
+        # Several objects on a line, and an object split over lines
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['{"a": 1}, {"a": 2}'], '{a: int32}'))
+        self.assertRaises(ValueError, list,
+                          read_jsonl(['{"a": [1', '2]}'], '{a: string}'))
+
+    def test_wrong_types(self):
+        for ds, value in [('int32', '1.7'), ('int32', 'true'),
+                          ('int32', '"12"'), ('bool', '"yes"'),
+                          ('bool', '1'), ('float64', '"1.5"'),
+                          ('string[3]', '{"x": 1}'), ('string', '[1, 2]'),
+                          ('string', '3'), ('option[int8]', '2.5'),
+                          ('date', '20140101')]:
+            line = '{"a": %s}' % value
+            self.assertRaises(ValueError, list,
+                              read_jsonl([line], '{a: %s}' % ds))
+        chunk, = read_jsonl(['{"a": 1, "b": 2}'], '{a: float32, b: int8}')
+        self.assertEqual(chunk.values.tolist(), [(1.0, 2)])
+
+
+class TestLinePatterns(unittest.TestCase):
+    ds = ('{id: int8, name: string[8], tag: option[string], '
+          'x: option[float64], when: option[datetime]}')
+
+    def test_matched(self):
+        lines = ['{"id": 1, "name": "a\\"b\\u00e9", "tag": null, "x": 1e3, '
+                 '"when": "2014-01-01T10:00Z", "extra": [1]}',
+                 '{"id": -2,"name":"cc","tag":"t","x":null,"when":null}']
+        # The nested value of the first line's extra key
+        self.assertEqual(jsonfile._parse_fields(lines, self.ds), None)
+        lines[0] = lines[0].replace(', "extra": [1]', ', "extra": "z"')
+        lines[1] = lines[1].replace('}', ', "extra": 5}')
+        self.assertEqual(len(jsonfile._parse_fields(lines, self.ds)), 5)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            chunk, = read_jsonl(lines, self.ds)
+        self.assertEqual(chunk.values['id'].tolist(), [1, -2])
+        self.assertEqual(chunk.values['name'].tolist(), [u'a"b\xe9', 'cc'])
+        self.assertEqual(list(chunk.column('tag')), [None, 't'])
+        self.assertEqual(list(chunk.column('x')), [1000.0, None])
+        self.assertEqual(chunk.values['when'][0],
+                         np.datetime64('2014-01-01T10:00', 'us'))
+        self.assertEqual(chunk.column('when')[1], None)
+
+    def test_unmatched(self):
+        # Lines whose keys are in another order are parsed one at a time
+        lines = ['{"id": 1, "name": "a", "x": 2, "tag": "t", "when": null}',
+                 '{"name": "b", "id": 2, "x": 3, "tag": null, "when": null}']
+        self.assertEqual(jsonfile._parse_fields(lines, self.ds), None)
+        chunk, = read_jsonl(lines, self.ds)
+        self.assertEqual(chunk.values['name'].tolist(), ['a', 'b'])
+        self.assertEqual(list(chunk.column('tag')), ['t', None])
+
+    def test_errors(self):
+        for value in ['300', '"1"', '1.5', 'null']:
+            line = ('{"id": %s, "name": "a", "tag": null, "x": 1, '
+                    '"when": null}' % value)
+            self.assertRaises(ValueError, list, read_jsonl([line], self.ds))
+
+    def test_utc_offsets(self):
+        for lines in [['{"a": "2014-01-01T10:00+05:00"}'],
+                      ['{"a": "2014-01-01T10:00-0500", "b": [1]}']]:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                self.assertRaises(ValueError, list,
+                                  read_jsonl(lines, '{a: datetime}'))
+
+
+class TestReadJSONLFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.jsonl')
+        with io.open(self.path, 'w') as f:
+            for i in range(1000):
+                f.write(u'{"id": %d, "x": %s}\n' %
+                        (i, u'null' if i % 4 == 0 else i / 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_processes(self):
+        ds = '{id: int64, x: option[float64]}'
+        serial = list(read_jsonl(self.path, ds, chunksize=100))
+        pooled = list(read_jsonl(self.path, ds, chunksize=100, processes=2))
+        self.assertEqual(len(serial), 10)
+        for a, b in zip(serial, pooled):
+            self.assertEqual(a.values.tolist(), b.values.tolist())
+            self.assertEqual(a.validity['x'].tolist(),
+                             b.validity['x'].tolist())
+        self.assertEqual(serial[0].column('x').null_count, 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
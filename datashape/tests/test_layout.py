@@ -0,0 +1,159 @@
+"""
+Test the C memory layout of datashape types.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import ctypes
+import mmap
+import struct
+import unittest
+
+import numpy as np
+
+from datashape import dshape, memory_layout, view, LayoutError
+from datashape import coretypes as ct
+
+
+class TestMemoryLayout(unittest.TestCase):
+    def check_numpy(self, ds_str):
+        ds = dshape(ds_str)
+        lay = memory_layout(ds)
+        dt = ds.measure.to_numpy_dtype(align=True)
+        self.assertEqual(lay.itemsize, dt.itemsize)
+        self.assertEqual(lay.alignment, dt.alignment)
+        self.assertEqual(lay.offsets,
+                         tuple(dt.fields[n][1] for n in dt.names))
+
+    def test_scalars(self):
+        lay = memory_layout(ct.int32)
+        self.assertEqual(lay, (4, 4, (), (), (), ()))
+        lay = memory_layout(ct.String(5, 'U32'))
+        self.assertEqual((lay.itemsize, lay.alignment), (20, 4))
+        self.assertEqual(memory_layout(ct.String(3, 'A')).itemsize, 3)
+
+    def test_record_matches_numpy(self):
+        self.check_numpy('{a: int8, b: int32, c: int16}')
+        self.check_numpy('{a: float64, b: int8}')
+        self.check_numpy('{a: int8, b: {c: int16, d: float64}, e: int8}')
+        self.check_numpy('{a: bool, b: complex[float64], c: uint8}')
+        self.check_numpy('{a: int8, b: {c: int8, d: {e: int64}}}')
+
+    def test_record_matches_ctypes(self):
+        class Inner(ctypes.Structure):
+            _fields_ = [('c', ctypes.c_int16), ('d', ctypes.c_double)]
+
+        class Outer(ctypes.Structure):
+            _fields_ = [('a', ctypes.c_int8), ('b', Inner),
+                        ('e', ctypes.c_int8), ('f', ctypes.c_int32 * 3)]
+
+        lay = memory_layout(dshape('{a: int8, b: {c: int16, d: float64}, '
+                                   'e: int8, f: 3 * int32}'))
+        self.assertEqual(lay.itemsize, ctypes.sizeof(Outer))
+        self.assertEqual(lay.alignment, ctypes.alignment(Outer))
+        self.assertEqual(lay.offsets,
+                         tuple(getattr(Outer, n).offset for n in 'abef'))
+        self.assertEqual(lay.padding, (7, 0, 3, 0))
+
+    def test_tuple(self):
+        lay = memory_layout(dshape('(int8, 2 * int16, float32)'))
+        self.assertEqual(lay.offsets, (0, 2, 8))
+        self.assertEqual(lay.padding, (1, 2, 0))
+        self.assertEqual((lay.itemsize, lay.alignment), (12, 4))
+
+    def test_strides(self):
+        ds = dshape('3 * 4 * 5 * {a: int8, b: int32}')
+        for order in 'CF':
+            a = np.empty((3, 4, 5), dtype=ds.measure.to_numpy_dtype(True),
+                         order=order)
+            lay = memory_layout(ds, order)
+            self.assertEqual(lay.shape, a.shape)
+            self.assertEqual(lay.strides, a.strides)
+            self.assertEqual(lay.itemsize, a.nbytes)
+            self.assertEqual(lay.offsets, (0, 4))
+        self.assertRaises(ValueError, memory_layout, ds, 'A')
+
+    def test_cached(self):
+        ds = dshape('10 * {a: int8, b: int32}')
+        self.assertTrue(memory_layout(ds) is memory_layout(ds))
+
+    def test_not_fixed(self):
+        for ds_str in ['var * int32', 'M * int32', '... * int32',
+                       'string', '3 * {a: int32, b: string}', 'date',
+                       '(int8, T)']:
+            self.assertRaises(LayoutError, memory_layout, dshape(ds_str))
+        self.assertRaises(LayoutError, memory_layout, ct.bytes_)
+
+    def test_deep_nesting(self):
+        ds = ct.DataShape(ct.int32)
+        for i in range(5000):
+            ds = ct.DataShape(ct.Fixed(1),
+                              ct.Tuple([ds, ct.DataShape(ct.int8)]))
+        lay = memory_layout(ds)
+        self.assertEqual((lay.itemsize, lay.alignment), (20004, 4))
+
+
+class TestView(unittest.TestCase):
+    def test_shares_memory(self):
+        buf = bytearray(np.arange(12, dtype='int32').tobytes())
+        a = view(buf, '3 * 4 * int32')
+        self.assertEqual(a.shape, (3, 4))
+        self.assertEqual(a[1, 2], 6)
+        a[0, 0] = 100
+        self.assertEqual(struct.unpack_from('=i', buf, 0)[0], 100)
+        # Bytes are immutable, so the view is read only
+        a = view(bytes(buf), dshape('12 * int32'))
+        self.assertFalse(a.flags.writeable)
+        self.assertEqual(a[0], 100)
+
+    def test_record(self):
+        buf = bytearray(32)
+        struct.pack_into('=bxxxid', buf, 0, 1, 2, 3.5)
+        struct.pack_into('=bxxxi', buf, 16, 4, 5)
+        a = view(buf, '{a: int8, b: int32, c: float64}')
+        self.assertEqual((a['a'], a['b'], a['c']), (1, 2, 3.5))
+        a = view(buf, '(int8, int32)', offset=16)
+        self.assertEqual((a['f0'], a['f1']), (4, 5))
+
+    def test_offset_and_count(self):
+        buf = np.arange(10, dtype='int16').tobytes()
+        a = view(buf, '2 * int16', offset=4, count=2)
+        self.assertEqual(a.tolist(), [[2, 3], [4, 5]])
+        a = view(buf, '2 * int16', offset=4, count=-1)
+        self.assertEqual(a.shape, (4, 2))
+        self.assertEqual(view(buf, 'int16', offset=20, count=-1).shape, (0,))
+        self.assertEqual(view(buf, 'int16', offset=2)[()], 1)
+
+    def test_byteorder(self):
+        buf = struct.pack('>hhf', 1, 2, 1.5)
+        a = view(buf, '{a: 2 * int16, b: float32}', byteorder='>')
+        self.assertEqual(a['a'].tolist(), [1, 2])
+        self.assertEqual(a['b'], 1.5)
+
+    def test_mmap(self):
+        m = mmap.mmap(-1, 4096)
+        try:
+            a = view(m, '16 * {x: float64, y: float64}', offset=512)
+            a['y'][3] = 2.5
+            self.assertEqual(struct.unpack_from('=d', m, 512 + 3 * 16 + 8),
+                             (2.5,))
+            del a
+        finally:
+            m.close()
+
+    def test_errors(self):
+        buf = bytearray(16)
+        # Too short
+        self.assertRaises(ValueError, view, buf, '5 * int32')
+        self.assertRaises(ValueError, view, buf, 'int32', offset=8, count=3)
+        self.assertRaises(ValueError, view, buf, 'int8', offset=17)
+        # Misaligned
+        self.assertRaises(ValueError, view, buf, 'int32', offset=2)
+        # Not a whole number of values
+        self.assertRaises(ValueError, view, buf, '3 * int8', count=-1)
+        self.assertRaises(ValueError, view, buf, 'int8', count=-2)
+        self.assertRaises(LayoutError, view, buf, 'var * int8')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,11 +17,18 @@ class TestDataShapeLexer(unittest.TestCase):
         # Lexing should produce a single token matching the specification
         self.assertEqual(list(lexer.lex(ds_str)),
                          [lexer.Token(tid, tname, (0, len(ds_str)), val)])
+        # The bulk lexer should agree
+        toks = lexer.lex_all(ds_str)
+        self.assertEqual((list(toks.ids), list(toks.starts),
+                          list(toks.ends), toks.values, toks.error_pos),
+                         ([tid], [0], [len(ds_str)], [val], None))
 
     def check_failing_token(self, ds_str):
         # Creating the lexer will fail, because the error is
         # in the first token.
         self.assertRaises(datashape.DataShapeSyntaxError, list, lexer.lex(ds_str))
+        # The bulk lexer records the error position instead of raising
+        self.assertEqual(lexer.lex_all(ds_str).error_pos, 0)
 
     def test_isolated_tokens(self):
         self.check_isolated_token('testing', 'NAME_LOWER', 'testing')
@@ -149,5 +156,43 @@ class TestDataShapeLexer(unittest.TestCase):
                                ' \t # end'))
         self.assertEqual([(tok.id, tok.val) for tok in toks], expected_idval)
 
+
+class TestDataShapeLexAll(unittest.TestCase):
+
+    def check_matches_lex(self, ds_str):
+        toks = lexer.lex_all(ds_str)
+        self.assertEqual(toks.error_pos, None)
+        self.assertEqual(list(zip(toks.ids, toks.starts,
+                                  toks.ends, toks.values)),
+                         [(tok.id, tok.span[0], tok.span[1], tok.val)
+                          for tok in lexer.lex(ds_str)])
+
+    def test_matches_lex(self):
+        self.check_matches_lex('')
+        self.check_matches_lex('  # only a comment')
+        self.check_matches_lex('3 * var * {x: int32, "y z": option[float64]}')
+        self.check_matches_lex('(A... * T, string["U8"]) -> 0 * B')
+        self.check_matches_lex('a#b\nc # trailing comment')
+
+    def test_string_escapes(self):
+        toks = lexer.lex_all(r'''"\"\b\f\n\r\t\u0041\u00e9" '\'x' "y"''')
+        self.assertEqual(toks.values,
+                         [u'"\b\f\n\r\tA\u00e9', u"'x", u'y'])
+
+    def test_error_position(self):
+        # Lexing stops at the invalid token, keeping those before it
+        toks = lexer.lex_all('3 * int32 $ 5')
+        self.assertEqual(list(toks.ids), [lexer.INTEGER, lexer.ASTERISK,
+                                          lexer.NAME_LOWER])
+        self.assertEqual(toks.error_pos, 10)
+        # A '#' is always a comment, so can't start an invalid token
+        self.assertEqual(lexer.lex_all('int32 #$').error_pos, None)
+
+    def test_start_position(self):
+        # Lexing may resume at the end of a token, keeping its offsets
+        toks = lexer.lex_all('3 * int32', 3)
+        self.assertEqual(list(toks.ids), [lexer.NAME_LOWER])
+        self.assertEqual((list(toks.starts), list(toks.ends)), ([4], [9]))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+"""
+Test option arrays with validity bitmaps.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+import datashape
+from datashape import dshape, OptionArray, to_numpy_option
+from datashape.option import null_count, bitmap_and, bitmap_or
+
+
+class TestBitmaps(unittest.TestCase):
+    def test_null_count(self):
+        bitmap = np.array([0xff, 0x0f, 0xf1], dtype=np.uint8)
+        self.assertEqual(null_count(bitmap, 24), 7)
+        self.assertEqual(null_count(bitmap, 17), 4)
+        self.assertEqual(null_count(bitmap, 8), 0)
+        self.assertEqual(null_count(bitmap[:0], 0), 0)
+
+    def test_combine(self):
+        a = np.array([0b1100, 0xff], dtype=np.uint8)
+        b = np.array([0b1010, 0x0f], dtype=np.uint8)
+        self.assertEqual(bitmap_and(a, b).tolist(), [0b1000, 0x0f])
+        self.assertEqual(bitmap_or(a, b).tolist(), [0b1110, 0xff])
+        self.assertEqual(bitmap_and(a, b, np.zeros(2, np.uint8)).tolist(),
+                         [0, 0])
+
+
+class TestOptionArray(unittest.TestCase):
+    def setUp(self):
+        self.objs = [1, None, 3, 4, None, 6, 7, 8, 9, None]
+        self.a = OptionArray.from_objects(self.objs, dtype='int32')
+
+    def test_from_objects(self):
+        a = self.a
+        self.assertEqual(a.dshape, dshape('10 * option[int32]'))
+        self.assertEqual(a.validity.tolist(), [0b11101101, 0b01])
+        self.assertEqual(a.null_count, 3)
+        self.assertEqual([a[i] for i in range(10)], self.objs)
+        self.assertEqual(a[-1], None)
+        self.assertRaises(IndexError, a.__getitem__, 10)
+        self.assertEqual(a.to_objects().tolist(), self.objs)
+        self.assertEqual(a.nbytes, 42)
+
+    def test_masked(self):
+        ma = self.a.to_masked()
+        self.assertEqual(ma.count(), 7)
+        self.assertEqual(ma.sum(), 38)
+        b = OptionArray.from_masked(ma)
+        self.assertEqual(b.validity.tolist(), self.a.validity.tolist())
+        b = OptionArray.from_masked(np.arange(3))
+        self.assertEqual(b.null_count, 0)
+
+    def test_sentinel(self):
+        s = self.a.to_sentinel(-1)
+        self.assertEqual(s.tolist(), [1, -1, 3, 4, -1, 6, 7, 8, 9, -1])
+        b = OptionArray.from_sentinel(s, -1)
+        self.assertEqual(b.to_objects().tolist(), self.objs)
+        b = OptionArray.from_sentinel([1.5, np.nan, 2.5], np.nan)
+        self.assertEqual(b.to_objects().tolist(), [1.5, None, 2.5])
+        dates = np.array(['2014-01-01', 'NaT'], dtype='M8[D]')
+        b = OptionArray.from_sentinel(dates, np.datetime64('NaT'))
+        self.assertEqual(b.null_count, 1)
+        self.assertEqual(b.dshape, dshape('2 * option[date]'))
+
+    def test_filter(self):
+        b = self.a.filter(np.arange(10) % 2 == 0)
+        self.assertEqual(b.to_objects().tolist(), [1, 3, None, 7, 9])
+        self.assertEqual(self.a.dropna().tolist(), [1, 3, 4, 6, 7, 8, 9])
+        self.assertRaises(ValueError, self.a.filter, [True])
+
+    def test_to_numpy(self):
+        self.assertEqual(to_numpy_option('10 * option[int32]'),
+                         (((10,), np.dtype('int32')),
+                          ((2,), np.dtype('uint8'))))
+        self.assertEqual(to_numpy_option('2 * 8 * option[float64]')[1][0],
+                         (2,))
+        self.assertRaises(TypeError, to_numpy_option, '3 * int32')
+        self.assertRaises(datashape.NotNumpyCompatible, datashape.to_numpy,
+                          dshape('3 * option[int32]'))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, OptionArray, [1, 2, 3],
+                          np.zeros(0, np.uint8))
+        self.assertRaises(ValueError, OptionArray, [[1]], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
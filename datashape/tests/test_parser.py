@@ -4,12 +4,24 @@ Test the DataShape parser.
 
 from __future__ import absolute_import, division, print_function
 
+import ast as pyast
+import io
+import os
+import random
+import sys
+import mmap
+import tempfile
+import time
 import unittest
 
 import datashape
-from datashape.parser import parse
-from datashape import coretypes as ct
+from datashape.parser import (parse, parse_ast, ast_to_type, ast_ndim,
+                              ast_has_var, ast_field_names,
+                              PushParser, iterparse)
+from datashape import coretypes as ct, parser, util
 from datashape import DataShapeSyntaxError
+from datashape.py2help import RecursionError, _strtypes
+from datashape.validation import validate
 
 class TestDataShapeParseBasicDType(unittest.TestCase):
     def setUp(self):
@@ -540,5 +552,288 @@ class TestDataShapeParseFuncProto(unittest.TestCase):
                                                 ct.DataShape(ct.int32),
                                                 ct.DataShape(ct.bool_))))
 
+
+class TestDataShapeParserScaling(unittest.TestCase):
+    def setUp(self):
+        # Create a default symbol table for the parser to use
+        self.sym = datashape.TypeSymbolTable()
+
+    def test_deep_nesting(self):
+        # Far deeper than the recursion limit
+        depth = 5 * sys.getrecursionlimit()
+        ds = parse('{a: ' * depth + 'int32' + '}' * depth, self.sym)
+        for i in range(depth):
+            ds = ds[-1]['a']
+        self.assertEqual(ds, ct.DataShape(ct.int32))
+        ds = parse('(' * depth + 'int32' + ')' * depth, self.sym)
+        for i in range(depth):
+            ds = ds[-1].dshapes[0]
+        self.assertEqual(ds, ct.DataShape(ct.int32))
+
+    def test_wide_struct(self):
+        fields = ['f%d: %s' % (i, ['int32', 'var * float64', 'string[10]',
+                                   '3 * {a: int8, b: option[int16]}'][i % 4])
+                  for i in range(5000)]
+        ds = parse('{' + ', '.join(fields) + '}', self.sym)
+        self.assertEqual(len(ds[-1].names), 5000)
+        self.assertEqual(ds[-1]['f4999'],
+                         parse('3 * {a: int8, b: option[int16]}', self.sym))
+
+    def check_error_pos(self, ds_str, lexpos, msg):
+        try:
+            parse(ds_str, self.sym)
+        except DataShapeSyntaxError as e:
+            self.assertEqual((e.lexpos, e.msg), (lexpos, msg))
+        else:
+            self.fail('%r should not parse' % ds_str)
+
+    def test_error_positions(self):
+        self.check_error_pos('3 * var', 4, 'Expected a dtype')
+        self.check_error_pos('A... int32', 1, 'Unexpected token in datashape')
+        self.check_error_pos('var', 0, 'Invalid datashape')
+        self.check_error_pos('{a: int32, b: 3 *}', 17, 'Expected a dtype')
+        self.check_error_pos('(int32, 5) -> int8', 8,
+                             'Invalid datashape in tuple')
+        self.check_error_pos('option[int32, string=3]', 20,
+                             'Invalid type constructor argument')
+        self.check_error_pos('time[tz="UTC", int32]', 15,
+                             'Expected another keyword argument, ' +
+                             'positional arguments cannot follow ' +
+                             'keyword arguments')
+        self.check_error_pos('string[[1, 2 * int32]]', 13,
+                             'Expected a "," or a closing "]"')
+
+
+class TestDataShapeParseAST(unittest.TestCase):
+    def setUp(self):
+        # Create a default symbol table for the parser to use
+        self.sym = datashape.TypeSymbolTable()
+
+    def test_ast_nodes(self):
+        self.assertEqual(parse_ast('var * 3 * int32', self.sym),
+                         ('dshape', (('dim', 'var'),
+                                     ('dim_constr', 'fixed', (3,), ())),
+                          ('dtype', 'int32')))
+        self.assertEqual(parse_ast('{x: N * T, y: string["U8"]}', self.sym),
+                         ('dshape', (),
+                          ('struct', ('x', 'y'),
+                           (('dshape', (('dim_constr', 'typevar', ('N',), ()),),
+                             ('dtype_constr', 'typevar', ('T',), ())),
+                            ('dshape', (),
+                             ('dtype_constr', 'string', ('U8',), ()))))))
+        self.assertEqual(parse_ast('(int8, ... * T) -> datetime[tz="UTC"]',
+                                   self.sym)[2],
+                         ('funcproto',
+                          (('dshape', (), ('dtype', 'int8')),
+                           ('dshape', (('dim', 'ellipsis'),),
+                            ('dtype_constr', 'typevar', ('T',), ()))),
+                          ('dshape', (),
+                           ('dtype_constr', 'datetime', (),
+                            (('tz', 'UTC'),)))))
+
+    def test_ast_to_type(self):
+        for ds_str in ['int32', 'var * 3 * M * A... * ... * float64',
+                       '{x: int32, y: {z: option[int16]}}',
+                       '(int32, 5 * T) -> A... * B',
+                       'string[10, "ascii"]', 'time[tz="UTC"]',
+                       'var * (int8, (float32, complex[float64]))']:
+            ast = parse_ast(ds_str, self.sym)
+            # Without list arguments, the AST is hashable
+            hash(ast)
+            self.assertEqual(ast_to_type(ast, self.sym),
+                             parse(ds_str, self.sym))
+        # Deep nesting doesn't recurse
+        depth = 5 * sys.getrecursionlimit()
+        ds_str = '{a: ' * depth + 'int32' + '}' * depth
+        self.assertEqual(ast_to_type(parse_ast(ds_str, self.sym), self.sym),
+                         parse(ds_str, self.sym))
+
+    def test_matches_full_parser(self):
+        # The common forms are parsed without the frames of the full
+        # parser, to the same AST
+        full = parser._ASTParser
+        for ds_str in ['int32', 'var * 3 * M * A... * ... * float64',
+                       '{x: int32, _y: {Z: option[int16]},}',
+                       '(int32, 5 * T,) -> A... * B', '(int8, string)',
+                       'string[10, "ascii"]', 'datetime[tz=\'UTC\']',
+                       'unary[[1, 2], ["a"], [int8, 3 * T], []]',
+                       'unary[x=[], y=3 * int8] # comment']:
+            sym = self.sym
+            if ds_str.startswith('unary'):
+                sym = datashape.TypeSymbolTable()
+                sym.dtype_constr['unary'] = lambda *args, **kwargs: None
+            self.assertEqual(parse_ast(ds_str, sym),
+                             full(ds_str, sym).parse_datashape())
+
+    def test_structure(self):
+        ast = parse_ast('var * 3 * {id: int64, tags: var * string}', self.sym)
+        self.assertEqual(ast_ndim(ast), 2)
+        self.assertTrue(ast_has_var(ast))
+        self.assertEqual(ast_field_names(ast), ['id', 'tags'])
+        ast = parse_ast('3 * {a: (A... * int8, float32)}', self.sym)
+        self.assertEqual(ast_ndim(ast), 1)
+        self.assertTrue(ast_has_var(ast))
+        self.assertEqual(ast_field_names(ast[2][2][0]), None)
+        for ds_str in ['int32', '3 * string', '{a: 3 * int8}']:
+            ast = parse_ast(ds_str, self.sym)
+            ds = parse(ds_str, self.sym)
+            self.assertEqual(ast_ndim(ast), ds.ndim)
+            self.assertEqual(ast_has_var(ast), datashape.has_var_dim(ds))
+            self.assertFalse(ast_has_var(ast))
+
+    def test_syntax_errors(self):
+        for ds_str in ['3 * var', 'A... int32', '{a: int32, b: 3 *}',
+                       'option[int32, string=3]', 'int32 $', '3 * 012',
+                       '{}', '()', 'string["U8"', '_x', 'var']:
+            self.assertRaises(DataShapeSyntaxError, parse_ast,
+                              ds_str, self.sym)
+        # Constructor arguments are only checked when building the type
+        ast = parse_ast('string["bogus"]', self.sym)
+        self.assertRaises(ValueError, ast_to_type, ast, self.sym)
+
+    def test_matches_dshape(self):
+        # Every string literal of this module, and strings generated from
+        # them and from tokens, give the same type through the AST as
+        # with dshape(), or a syntax error at the same place
+        sym = datashape.sym
+
+        def outcome(func, ds_str):
+            try:
+                return func(ds_str)
+            except DataShapeSyntaxError as e:
+                return (DataShapeSyntaxError, e.lineno, e.col_offset, e.msg)
+            except (RecursionError, MemoryError):
+                raise
+            except Exception as e:
+                return type(e)
+
+        def via_ast(ds_str):
+            ds = ast_to_type(parse_ast(ds_str, sym), sym)
+            validate(ds)
+            return ds
+
+        with open(os.path.splitext(__file__)[0] + '.py') as f:
+            tree = pyast.parse(f.read())
+        # String literals are Constant nodes from Python 3.8, Str before
+        literal = getattr(pyast, 'Constant', None) or pyast.Str
+        values = [node.value if hasattr(node, 'value') else node.s
+                  for node in pyast.walk(tree) if isinstance(node, literal)]
+        corpus = sorted(set(v for v in values if isinstance(v, _strtypes)))
+        vocab = ['int32', 'float64', 'string', 'option', 'datetime', 'var',
+                 'T', 'N', 'A...', '...', '3', '10', '*', '{', '}', '(', ')',
+                 '[', ']', ',', ':', '->', '=', 'x', 'tz', '"UTC"', "'U8'",
+                 ' ', '# c\n']
+        rnd = random.Random(0)
+        generated = []
+        for i in range(3000):
+            if i % 2:
+                chars = list(rnd.choice(corpus))
+                for j in range(rnd.randint(1, 3)):
+                    k = rnd.randint(0, len(chars))
+                    if chars and rnd.random() < 0.4:
+                        del chars[min(k, len(chars) - 1)]
+                    else:
+                        chars.insert(k, rnd.choice(vocab))
+                generated.append(''.join(chars))
+            else:
+                generated.append(''.join(rnd.choice(vocab) for j in
+                                         range(rnd.randint(1, 12))))
+        depth = 2 * sys.getrecursionlimit()
+        generated.append('var * (' * depth + 'int8' + ')' * depth)
+        generated.append('{a: ' * depth + 'int8' + '}' * (depth - 1))
+        for ds_str in corpus + generated:
+            expected = outcome(util.dshape, ds_str)
+            actual = outcome(via_ast, ds_str)
+            if isinstance(expected, type):
+                # A constructor raised, and as the AST is built before any
+                # type, a syntax error after it may be reported instead
+                self.assertIsInstance(actual, (type, tuple), ds_str)
+            else:
+                self.assertEqual(actual, expected, ds_str)
+
+
+class TestDataShapePushParser(unittest.TestCase):
+    def setUp(self):
+        # Create a default symbol table for the parser to use
+        self.sym = datashape.TypeSymbolTable()
+        self.ds_strs = ['3 * int32',
+                        'var * {x: int32, y: option[float64]}',
+                        '(int32, 5 * T) -> A... * B',
+                        'datetime[tz="\\u00e9"]',
+                        'N * string["U8"]']
+        self.stream = ' # a comment\n'.join(self.ds_strs) + '\n'
+        self.expected = [parse(ds_str, self.sym) for ds_str in self.ds_strs]
+
+    def test_feed_chunks(self):
+        for data in [self.stream, self.stream.encode('utf-8')]:
+            for size in [1, 2, 3, 7, 100]:
+                pp = PushParser(self.sym)
+                result = []
+                for i in range(0, len(data), size):
+                    result.extend(pp.feed(data[i:i + size]))
+                result.extend(pp.close())
+                self.assertEqual(result, self.expected)
+
+    def test_yields_early(self):
+        pp = PushParser(self.sym)
+        # The datashape could still continue, e.g. as 'int32[...]'
+        self.assertEqual(pp.feed('int32'), [])
+        self.assertEqual(pp.feed(' 3 '), [parse('int32', self.sym)])
+        self.assertEqual(pp.feed('* int8 #'), [])
+        self.assertEqual(pp.close(), [parse('3 * int8', self.sym)])
+
+    def test_bounded_buffer(self):
+        pp = PushParser(self.sym)
+        for i in range(1000):
+            pp.feed(self.stream)
+            self.assertTrue(len(pp._buf) < len(self.stream))
+        pp = PushParser(self.sym, max_buffer=100)
+        self.assertRaises(ValueError, pp.feed, '{' + 'x: int8, ' * 20)
+
+    def test_linear_time(self):
+        # A long datashape arriving in many chunks is not parsed again
+        # from its start on every chunk
+        ds_str = '{%s}\n' % ', '.join('f%d: int32' % i for i in range(5000))
+        start = time.time()
+        expected = list(iterparse(ds_str, self.sym, chunk_size=len(ds_str)))
+        whole = time.time() - start
+        start = time.time()
+        result = list(iterparse(ds_str, self.sym, chunk_size=1000))
+        chunked = time.time() - start
+        self.assertEqual(result, expected)
+        self.assertTrue(chunked < 4 * whole + 0.5, (chunked, whole))
+
+    def test_iterparse_sources(self):
+        data = self.stream.encode('utf-8')
+        self.assertEqual(list(iterparse(data, self.sym, chunk_size=5)),
+                         self.expected)
+        self.assertEqual(list(iterparse(io.BytesIO(data), self.sym)),
+                         self.expected)
+        chunks = (ds_str + ' ' for ds_str in self.ds_strs)
+        self.assertEqual(list(iterparse(chunks, self.sym)), self.expected)
+        fd, path = tempfile.mkstemp()
+        try:
+            os.write(fd, data)
+            mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(list(iterparse(mm, self.sym, chunk_size=4)),
+                                 self.expected)
+            finally:
+                mm.close()
+        finally:
+            os.close(fd)
+            os.remove(path)
+
+    def test_errors(self):
+        pp = PushParser(self.sym)
+        # Incomplete at the end of the stream
+        self.assertEqual(pp.feed('int8 3 * '), [parse('int8', self.sym)])
+        self.assertRaises(DataShapeSyntaxError, pp.close)
+        # Invalid tokens are reported without waiting for the end
+        pp = PushParser(self.sym)
+        self.assertRaises(DataShapeSyntaxError, pp.feed, 'int8 $ ')
+        pp = PushParser(self.sym)
+        self.assertRaises(DataShapeSyntaxError, pp.feed, '3 * {x: *} ')
+
 if __name__ == '__main__':
     unittest.main()
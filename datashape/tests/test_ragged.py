@@ -0,0 +1,84 @@
+"""
+Test ragged arrays with a var dimension.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+from datashape import dshape, RaggedArray
+
+
+class TestRaggedArray(unittest.TestCase):
+    def setUp(self):
+        self.rows = [[1, 2, 3], [], [4, 5], [6]]
+        self.r = RaggedArray.from_lists(self.rows, '4 * var * int32')
+
+    def test_from_lists(self):
+        r = self.r
+        self.assertEqual(r.offsets.tolist(), [0, 3, 3, 5, 6])
+        self.assertEqual(r.values.dtype, np.dtype('int32'))
+        self.assertEqual(r.dshape, dshape('4 * var * int32'))
+        self.assertEqual(r.to_lists(), self.rows)
+        self.assertEqual(r.lengths.tolist(), [3, 0, 2, 1])
+        self.assertEqual(r.nbytes, 5 * 8 + 6 * 4)
+        # From NumPy rows, and inferring the type
+        r = RaggedArray.from_lists([np.arange(2.0), np.arange(3.0)])
+        self.assertEqual(r.dshape, dshape('2 * var * float64'))
+        self.assertEqual(RaggedArray.from_lists([]).dshape,
+                         dshape('0 * var * float64'))
+
+    def test_inner_types(self):
+        r = RaggedArray.from_lists([[(1, 2.5)], [(3, 4.5), (5, 6.5)]],
+                                   'var * var * {a: int8, b: float64}')
+        self.assertEqual(r[1]['b'].tolist(), [4.5, 6.5])
+        self.assertEqual(r.dshape,
+                         dshape('2 * var * {a: int8, b: float64}'))
+        r = RaggedArray.from_lists([[[1, 2], [3, 4]], [[5, 6]]],
+                                   '2 * var * 2 * int16')
+        self.assertEqual(r.values.shape, (3, 2))
+        self.assertEqual(r.to_padded().shape, (2, 2, 2))
+
+    def test_indexing(self):
+        r = self.r
+        self.assertEqual(r[0].tolist(), [1, 2, 3])
+        self.assertEqual(r[-1].tolist(), [6])
+        self.assertRaises(IndexError, r.__getitem__, 4)
+        # Contiguous slices share the buffers
+        s = r[1:3]
+        self.assertEqual(s.to_lists(), [[], [4, 5]])
+        self.assertTrue(np.shares_memory(s.values, r.values))
+        self.assertTrue(np.shares_memory(s.offsets, r.offsets))
+        self.assertEqual(s.dshape, dshape('2 * var * int32'))
+        self.assertEqual(len(r[3:1]), 0)
+        self.assertEqual(r[::-2].to_lists(), [[6], []])
+        self.assertEqual(r.take([2, 0]).to_lists(), [[4, 5], [1, 2, 3]])
+        self.assertEqual([x.tolist() for x in r], self.rows)
+
+    def test_padded(self):
+        padded = self.r.to_padded(fill=-1)
+        self.assertEqual(padded.tolist(), [[1, 2, 3], [-1, -1, -1],
+                                           [4, 5, -1], [6, -1, -1]])
+        self.assertEqual(self.r[2:].to_padded(width=4).tolist(),
+                         [[4, 5, 0, 0], [6, 0, 0, 0]])
+        self.assertRaises(ValueError, self.r.to_padded, width=2)
+        r = RaggedArray.from_padded(padded, [3, 0, 2, 1])
+        self.assertEqual(r.to_lists(), self.rows)
+        self.assertRaises(ValueError, RaggedArray.from_padded, padded,
+                          [4, 0, 0, 0])
+
+    def test_errors(self):
+        self.assertRaises(TypeError, RaggedArray.from_lists, [[1]],
+                          '1 * 2 * int32')
+        self.assertRaises(ValueError, RaggedArray.from_lists, [[1]],
+                          '2 * var * int32')
+        self.assertRaises(ValueError, RaggedArray, [0, 2, 1], [1, 2])
+        self.assertRaises(ValueError, RaggedArray, [0, 3], [1, 2])
+        r = RaggedArray([1, 2], [1, 2])
+        self.assertEqual(r.to_lists(), [[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
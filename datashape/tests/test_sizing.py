@@ -0,0 +1,80 @@
+"""
+Test sizing the data of datashapes.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+import datashape
+from datashape import dshape, nbytes, nbytes_many, memory_layout
+
+
+class TestNbytes(unittest.TestCase):
+    def test_fixed(self):
+        for ds in ['int32', '10 * float64', '3 * 4 * {a: int8, b: float64}',
+                   '5 * string[10, "U32"]', '2 * (int16, 3 * int8)']:
+            ds = dshape(ds)
+            shape, dt = datashape.to_numpy(ds, align=True)
+            self.assertEqual(nbytes(ds), memory_layout(ds).itemsize)
+            self.assertEqual(nbytes(ds), int(np.prod(shape)) * dt.itemsize)
+        self.assertEqual(nbytes('7 * date'), 56)
+        self.assertEqual(nbytes('0 * int32'), 0)
+
+    def test_var(self):
+        # 11 offsets and 50 values
+        self.assertEqual(nbytes('10 * var * int32', var_len=5), 288)
+        # 3 offsets, then 2 * 4 + 1 offsets and 2 * 4 * 10 values
+        self.assertEqual(nbytes('2 * var * var * int8', var_len=[4, 10]),
+                         3 * 8 + 9 * 8 + 80)
+        self.assertEqual(nbytes('2 * var * int8', var_len=1.5), 27)
+        self.assertRaises(ValueError, nbytes, '10 * var * int32')
+        self.assertRaises(ValueError, nbytes, 'var * var * int32',
+                          var_len=[3])
+
+    def test_strings_and_options(self):
+        # 11 offsets and 40 bytes of strings
+        self.assertEqual(nbytes('10 * string', str_len=4), 128)
+        self.assertRaises(ValueError, nbytes, '10 * string')
+        # 10 values and 2 bytes of validity bitmap
+        self.assertEqual(nbytes('10 * option[int32]'), 42)
+        self.assertEqual(nbytes('10 * option[string]', str_len=4), 130)
+        # Columnar records
+        self.assertEqual(nbytes('10 * {a: int32, b: string}', str_len=2),
+                         148)
+        self.assertEqual(nbytes('4 * {a: option[int8], b: var * int8}',
+                                var_len=2), 4 + 1 + 5 * 8 + 8)
+        self.assertRaises(ValueError, nbytes, '10 * T')
+
+    def test_nbytes_many(self):
+        shapes = ['%d * {a: int32, b: var * float32}' % n
+                  for n in range(0, 100, 7)]
+        shapes += ['int8', 'var * int16', dshape('3 * 10 * int64')]
+        result = nbytes_many(shapes, var_len=3)
+        self.assertEqual(result.dtype, np.int64)
+        self.assertEqual(result.tolist(),
+                         [nbytes(ds, var_len=3) for ds in shapes])
+        self.assertEqual(nbytes_many(['10 * option[int8]'] * 2).tolist(),
+                         [12, 12])
+        self.assertEqual(len(nbytes_many([])), 0)
+
+    def test_nbytes_many_exact(self):
+        # Sizes past 2**53 bytes, which float64 can't hold exactly, with
+        # validity bitmaps
+        n = 2**56 + 1
+        shapes = ['%d * option[int64]' % n, '%d * {a: option[int8], '
+                  'b: var * int8}' % n, '%d * option[int8]' % 2**60]
+        expected = [65 * 2**53 + 9, 81 * 2**53 + 19, 9 * 2**57]
+        self.assertEqual([nbytes(ds, var_len=1) for ds in shapes], expected)
+        self.assertEqual(nbytes_many(shapes, var_len=1).tolist(), expected)
+        self.assertEqual(nbytes_many(shapes[:2], var_len=np.int64(1)).tolist(),
+                         expected[:2])
+        # Lengths which are not integers give float estimates
+        self.assertEqual(nbytes_many(['2 * var * int8'], var_len=1.5).tolist(),
+                         [27])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 
 import datashape
 from datashape import dshape, has_var_dim, has_ellipsis
+from datashape import coretypes as ct
+from datashape import util
 
 
 class TestDataShapeUtil(unittest.TestCase):
@@ -86,6 +88,179 @@ class TestDataShapeUtil(unittest.TestCase):
 
         self.assertFalse(fail, msg)
 
+    def test_ndim_and_is_concrete(self):
+        self.assertEqual(dshape('3 * var * int32').ndim, 2)
+        self.assertEqual(dshape('int32').ndim, 0)
+        self.assertEqual(ct.int32.ndim, 0)
+        self.assertTrue(dshape('3 * var * {a: int32, b: string}').is_concrete)
+        self.assertFalse(dshape('M * int32').is_concrete)
+        self.assertFalse(dshape('... * int32').is_concrete)
+        self.assertFalse(dshape('{a: 3 * T}').is_concrete)
+        self.assertFalse(ct.DataShape(datashape.typesets.signed).is_concrete)
+
+    def test_free(self):
+        ds = dshape('(A, M * B) -> A')
+        self.assertEqual(ct.free(ds), [ct.TypeVar('A'), ct.TypeVar('M'),
+                                       ct.TypeVar('B'), ct.TypeVar('A')])
+        # Callers get their own list
+        ct.free(ds).append(None)
+        self.assertEqual(len(ct.free(ds)), 4)
+        self.assertEqual(ct.free(ct.int32), [])
+
+    def test_metadata_deep_nesting(self):
+        ds = ct.DataShape(ct.int32)
+        for i in range(5000):
+            ds = ct.DataShape(ct.Var(), ct.Tuple([ds]))
+        self.assertTrue(has_var_dim(ds))
+        self.assertFalse(has_ellipsis(ds))
+        self.assertTrue(ds.is_concrete)
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.maxsize = util.parse_cache_info().maxsize
+        util.clear_parse_cache()
+
+    def tearDown(self):
+        util.set_parse_cache_size(self.maxsize)
+        util.clear_parse_cache()
+
+    def test_hits_and_misses(self):
+        a = dshape('3 * var * int32')
+        b = dshape('3 * var * int32')
+        self.assertTrue(a is b)
+        info = util.parse_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_errors_are_not_cached(self):
+        for i in range(2):
+            self.assertRaises(datashape.DataShapeSyntaxError, dshape, '1 *')
+        self.assertEqual(util.parse_cache_info().currsize, 0)
+
+    def test_eviction(self):
+        util.set_parse_cache_size(2)
+        dshape('int8')
+        dshape('int16')
+        dshape('int32')
+        info = util.parse_cache_info()
+        self.assertEqual((info.evictions, info.currsize), (1, 2))
+        # 'int8' was the least recently used entry
+        dshape('int8')
+        self.assertEqual(util.parse_cache_info().misses, 4)
+
+    def test_disabled(self):
+        util.set_parse_cache_size(0)
+        self.assertEqual(dshape('int32'), dshape('int32'))
+        info = util.parse_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (0, 2, 0))
+        self.assertRaises(ValueError, util.set_parse_cache_size, -1)
+
+    def test_symbol_table_mutation_invalidates(self):
+        sym = datashape.type_symbol_table.sym
+        self.assertRaises(datashape.DataShapeSyntaxError, dshape, 'mytype')
+        version = sym.version
+        dshape('3 * int32')
+        sym.dtype['mytype'] = ct.int16
+        try:
+            self.assertNotEqual(sym.version, version)
+            self.assertEqual(dshape('mytype'), ct.DataShape(ct.int16))
+            # Entries parsed against the old table were discarded
+            self.assertEqual(util.parse_cache_info().currsize, 1)
+            sym.dtype['mytype'] = ct.int64
+            self.assertEqual(dshape('mytype'), ct.DataShape(ct.int64))
+        finally:
+            del sym.dtype['mytype']
+        self.assertRaises(datashape.DataShapeSyntaxError, dshape, 'mytype')
+
+    def test_dead_symbol_table_entries_dropped(self):
+        sym = datashape.TypeSymbolTable()
+        util._cached_parse('3 * int32', sym)
+        key = ('3 * int32', id(sym), sym.version)
+        self.assertIn(key, util._parse_cache._data)
+        # Stands in for a new table given the id() of a dead one
+        sym._cached_version = None
+        sym._bump_version()
+        util._cached_parse('int8', sym)
+        self.assertNotIn(key, util._parse_cache._data)
+
+    def test_symbol_table_versions(self):
+        sym = datashape.TypeSymbolTable(bare=True)
+        versions = [sym.version]
+        sym.dim.update(var=ct.Var())
+        versions.append(sym.version)
+        sym.dim = {}
+        versions.append(sym.version)
+        sym.dim.setdefault('var', ct.Var())
+        versions.append(sym.version)
+        sym.dim |= {'other': ct.Var()}
+        versions.append(sym.version)
+        self.assertEqual(len(set(versions)), 5)
+        self.assertIs(type(sym.dim), type(sym.dtype))
+        self.assertNotEqual(datashape.TypeSymbolTable().version, sym.version)
+
+
+class TestBulkDShapes(unittest.TestCase):
+    def setUp(self):
+        util.clear_parse_cache()
+        self.ds_strs = ['%d * {x: int32, y: string[%d]}' % (i % 40, i % 3 + 1)
+                        for i in range(300)]
+        self.ds_strs[7] = 'var * int32 $'
+        self.ds_strs[250] = 'string["bogus"]'
+
+    def tearDown(self):
+        util.clear_parse_cache()
+
+    def check_result(self, result):
+        self.assertEqual(sorted(result.errors), [7, 250])
+        self.assertTrue(isinstance(result.errors[7],
+                                   datashape.DataShapeSyntaxError))
+        self.assertTrue(isinstance(result.errors[250], ValueError))
+        for i, ds_str in enumerate(self.ds_strs):
+            if i in result.errors:
+                self.assertTrue(result.dshapes[i] is None)
+            else:
+                self.assertTrue(result.dshapes[i] is dshape(ds_str))
+
+    def test_sequential(self):
+        self.check_result(util.bulk_dshapes(self.ds_strs, processes=1))
+
+    def test_process_pool(self):
+        min_parallel = util._BULK_MIN_PARALLEL
+        util._BULK_MIN_PARALLEL = 1
+        try:
+            self.check_result(util.bulk_dshapes(iter(self.ds_strs),
+                                                processes=2))
+        finally:
+            util._BULK_MIN_PARALLEL = min_parallel
+
+    def test_worker_results(self):
+        # Workers with the same symbol table build the types, and others
+        # only the ASTs
+        sym = datashape.type_symbol_table.sym
+        sym_names = util._SymbolNames(*[frozenset(getattr(sym, name))
+                                        for name in util._SymbolNames._fields])
+        try:
+            util._bulk_init(sym_names, sym.version)
+            self.assertTrue(util._bulk_parse('3 * int32') is
+                            dshape('3 * int32'))
+            util._bulk_init(sym_names, -1)
+            self.assertEqual(util._bulk_parse('3 * int32'),
+                             datashape.parser.parse_ast('3 * int32', sym))
+            self.assertTrue(isinstance(util._bulk_parse('int32 $'),
+                                       datashape.DataShapeSyntaxError))
+        finally:
+            util._bulk_init(None, None)
+
+    def test_deduplicates(self):
+        dshape(self.ds_strs[0])
+        util.bulk_dshapes(self.ds_strs, processes=1)
+        # Each distinct string was looked up in the cache once, and only
+        # those which weren't found were parsed
+        info = util.parse_cache_info()
+        self.assertEqual((info.hits, info.misses),
+                         (1, 1 + 2 * (len(set(self.ds_strs)) - 1)))
+
+
 if __name__ == '__main__':
     unittest.main()
 
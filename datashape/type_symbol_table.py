@@ -7,6 +7,7 @@ from __future__ import absolute_import, division, print_function
 __all__ = ['TypeSymbolTable', 'sym']
 
 import ctypes
+import itertools
 
 from . import coretypes as ct
 
@@ -42,6 +43,60 @@ def _typevar_dtype(name):
 def _ellipsis(name):
     return ct.Ellipsis(ct.TypeVar(name))
 
+# Versions are drawn from one global counter, so a (table, version) pair
+# never repeats, even if a dead table's id() is reused by a new one.
+_versions = itertools.count(1)
+
+class _SymbolDict(dict):
+    """
+    A dict which bumps the version of its owning TypeSymbolTable
+    whenever it is mutated.
+    """
+    __slots__ = ['_owner']
+
+    def __init__(self, owner, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._owner = owner
+
+    def _mutated(self):
+        self._owner._bump_version()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._mutated()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._mutated()
+
+    def clear(self):
+        dict.clear(self)
+        self._mutated()
+
+    def pop(self, *args):
+        result = dict.pop(self, *args)
+        self._mutated()
+        return result
+
+    def popitem(self):
+        result = dict.popitem(self)
+        self._mutated()
+        return result
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._mutated()
+
+    def __ior__(self, other):
+        # dict's |= doesn't go through update
+        self.update(other)
+        return self
+
 class TypeSymbolTable(object):
     """
     This is a class which holds symbols for types and type constructors,
@@ -57,11 +112,19 @@ class TypeSymbolTable(object):
         Dimension symbols with no type constructor.
     sym.dim_constr
         Dimension symbols with a type constructor.
+
+    Every mutation of these tables changes sym.version, which lets
+    caches of parsed types detect that their entries are stale.
     """
-    __slots__ = ['dtype', 'dtype_constr', 'dim', 'dim_constr']
+    __slots__ = ['dtype', 'dtype_constr', 'dim', 'dim_constr', '_version',
+                 '_cached_version']
 
     def __init__(self, bare=False):
-        # Initialize all the symbol tables to empty dicts1
+        self._version = next(_versions)
+        # The version the dshape() parse cache last saw, see
+        # util._check_version
+        self._cached_version = None
+        # Initialize all the symbol tables to empty dicts
         self.dtype = {}
         self.dtype_constr = {}
         self.dim = {}
@@ -69,6 +132,26 @@ class TypeSymbolTable(object):
         if not bare:
             self.add_default_types()
 
+    def __setattr__(self, name, value):
+        if name not in ('_version', '_cached_version'):
+            # Wrap replacement tables so their mutations are tracked too
+            value = _SymbolDict(self, value)
+            object.__setattr__(self, name, value)
+            self._bump_version()
+        else:
+            object.__setattr__(self, name, value)
+
+    def _bump_version(self):
+        self._version = next(_versions)
+
+    @property
+    def version(self):
+        """
+        An integer identifying the current contents of the symbol table.
+        It changes whenever any of the four tables is modified.
+        """
+        return self._version
+
     def add_default_types(self):
         """
         Adds all the default datashape types to the symbol table.
@@ -96,7 +179,8 @@ class TypeSymbolTable(object):
                            ('json', ct.json),
                            ('date', ct.date_),
                            ('time', ct.time_),
-                           ('datetime', ct.datetime_)])
+                           ('datetime', ct.datetime_),
+                           ('timedelta', ct.timedelta_)])
         # data types with a type constructor
         self.dtype_constr.update([('complex', _complex),
                                   ('string', ct.String),
@@ -107,6 +191,7 @@ class TypeSymbolTable(object):
                                   ('option', ct.Option),
                                   ('time', ct.Time),
                                   ('datetime', ct.DateTime),
+                                  ('timedelta', ct.TimeDelta),
                                   ('units', ct.Units)])
         # dim types with no type constructor
         self.dim.update([('var', ct.Var()),
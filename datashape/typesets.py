@@ -17,6 +17,8 @@ class TypeSet(Unit):
     Create a new set of types. Keyword argument 'name' may create a registered
     typeset for use in datashape type strings.
     """
+    __slots__ = ('_order', '_set', 'name')
+    _symbolic = True
 
     def __init__(self, *args, **kwds):
         self._order = args
@@ -26,6 +28,13 @@ class TypeSet(Unit):
         if self.name:
             register_typeset(self.name, self)
 
+    def _intern_key(self):
+        # Type sets are identified by name, never share them
+        return None
+
+    def _fingerprint_parameters(self):
+        return (self.name, self._order)
+
     @property
     def types(self):
         return self._order
@@ -4,17 +4,22 @@ from __future__ import print_function, division, absolute_import
 import operator
 import ctypes
 import sys
+import multiprocessing
+from collections import namedtuple, OrderedDict
 
 from . import py2help
 from . import parser
 from . import type_symbol_table
 from .error import UnificationError
 from .validation import validate
+from .caching import LRUCache
 from . import coretypes
 
 
-__all__ = ['dshape', 'dshapes', 'has_var_dim', 'has_ellipsis',
-           'cat_dshapes', 'from_ctypes', 'from_cffi', 'to_ctypes']
+__all__ = ['dshape', 'dshapes', 'bulk_dshapes', 'BulkParseResult',
+           'has_var_dim', 'has_ellipsis',
+           'cat_dshapes', 'from_ctypes', 'from_cffi', 'to_ctypes',
+           'parse_cache_info', 'set_parse_cache_size', 'clear_parse_cache']
 
 
 PY3 = (sys.version_info[:2] >= (3, 0))
@@ -32,14 +37,221 @@ def dshapes(*args):
     return [dshape(arg) for arg in args]
 
 
+#------------------------------------------------------------------------
+# Bulk parsing
+#------------------------------------------------------------------------
+
+BulkParseResult = namedtuple('BulkParseResult', 'dshapes, errors')
+
+# The names in each dictionary of a TypeSymbolTable, which is all
+# parser.parse_ast needs, and unlike the table itself can be pickled
+_SymbolNames = namedtuple('_SymbolNames', 'dim, dtype, dim_constr, dtype_constr')
+
+# Fewer strings than this to parse are not worth starting processes for
+_BULK_MIN_PARALLEL = 2000
+
+# The _SymbolNames of a bulk parsing worker process
+_worker_sym_names = None
+# Whether the worker's default symbol table is the one the strings are
+# parsed against, and the types built for the small AST nodes they share
+_worker_builds_types = False
+_worker_memo = {}
+
+
+def _bulk_init(sym_names, version):
+    global _worker_sym_names, _worker_builds_types
+    _worker_sym_names = sym_names
+    # A forked worker has the same table as its parent, as does a worker
+    # started afresh if the table was not changed since import
+    _worker_builds_types = type_symbol_table.sym.version == version
+
+
+def _bulk_parse(ds_str):
+    # Returns the validated datashape, or with a different symbol table
+    # the AST, or the exception, so one bad string doesn't fail the rest
+    # of the chunk
+    try:
+        if _worker_builds_types:
+            sym = type_symbol_table.sym
+            ds = parser.ast_to_type(parser.parse_ast(ds_str, sym), sym,
+                                    _worker_memo)
+            validate(ds)
+            return ds
+        return parser.parse_ast(ds_str, _worker_sym_names)
+    except Exception as e:
+        return e
+
+
+def _parse_or_error(ds_str, sym):
+    try:
+        return _cached_parse(ds_str, sym)
+    except Exception as e:
+        return e
+
+
+def bulk_dshapes(ds_strs, processes=None, chunksize=None):
+    """
+    Parses many datashape strings against the default type symbol
+    table, spreading the parsing across a pool of processes.
+
+    Each distinct string is parsed once, and strings dshape() has
+    cached are not parsed again. The worker processes parse and
+    validate the datashapes, which are interned as they are received,
+    so the results are the same objects dshape() returns, and are added
+    to its cache. Workers which don't have the same default symbol table,
+    as when they are not forked and it was changed, only build the
+    structure of each datashape (see parser.parse_ast), which this
+    process then converts into types and validates.
+
+    Parameters
+    ----------
+    ds_strs : iterable of str
+        The datashape strings to parse.
+    processes : int, optional
+        The number of worker processes, by default the number of CPUs.
+        With 1, or few strings to parse, no processes are started.
+    chunksize : int, optional
+        The number of strings sent to a worker at a time.
+
+    Returns
+    -------
+    BulkParseResult(dshapes, errors)
+        dshapes holds the parsed datashapes in input order, with None
+        for each string which failed, and errors maps the index of each
+        failed string to the exception dshape() raises for it.
+
+    >>> sorted(bulk_dshapes(['3 * int32', 'int32 $']).errors)
+    [1]
+    """
+    ds_strs = list(ds_strs)
+    sym = type_symbol_table.sym
+    # The indices at which each distinct string occurs
+    positions = OrderedDict()
+    for i, ds_str in enumerate(ds_strs):
+        positions.setdefault(ds_str, []).append(i)
+    results = {}
+    todo = []
+    _check_version(sym)
+    for ds_str in positions:
+        ds = _parse_cache.get((ds_str, id(sym), sym.version))
+        if ds is None:
+            todo.append(ds_str)
+        else:
+            results[ds_str] = ds
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(todo) < _BULK_MIN_PARALLEL:
+        for ds_str in todo:
+            results[ds_str] = _parse_or_error(ds_str, sym)
+    else:
+        sym_names = _SymbolNames(*[frozenset(getattr(sym, name))
+                                   for name in _SymbolNames._fields])
+        if chunksize is None:
+            chunksize = max(1, len(todo) // (4 * processes))
+        pool = multiprocessing.Pool(processes, _bulk_init,
+                                    (sym_names, sym.version))
+        try:
+            parsed = pool.map(_bulk_parse, todo, chunksize)
+        finally:
+            pool.terminate()
+            pool.join()
+        # Types already built for the small AST nodes the datashapes share
+        memo = {}
+        for ds_str, ds in zip(todo, parsed):
+            if isinstance(ds, Exception):
+                ds = None
+            elif isinstance(ds, tuple):
+                try:
+                    ds = parser.ast_to_type(ds, sym, memo)
+                    validate(ds)
+                except Exception:
+                    ds = None
+            if ds is None:
+                # Parse the string again as dshape() would, so the
+                # error reported is exactly the one it raises
+                ds = _parse_or_error(ds_str, sym)
+            else:
+                _parse_cache.put((ds_str, id(sym), sym.version), ds)
+            results[ds_str] = ds
+
+    dshapes = [None] * len(ds_strs)
+    errors = {}
+    for ds_str, indices in positions.items():
+        ds = results[ds_str]
+        for i in indices:
+            if isinstance(ds, Exception):
+                errors[i] = ds
+            else:
+                dshapes[i] = ds
+    return BulkParseResult(dshapes, errors)
+
+
+#------------------------------------------------------------------------
+# Parse cache
+#------------------------------------------------------------------------
+
+# Parsed and validated datashapes, keyed on
+# (datashape string, id(symbol table), symbol table version)
+_parse_cache = LRUCache(4096)
+
+
+def _check_version(sym):
+    """
+    Drops the cached datashapes parsed against a previous version of
+    the symbol table, if it changed since last seen. The version last
+    seen is kept on the table, so it goes with it, and a new table which
+    reuses the id() of a dead one also drops the dead one's entries.
+    """
+    version = sym.version
+    if sym._cached_version != version:
+        table = id(sym)
+        _parse_cache.discard(lambda k: k[1] == table and k[2] != version)
+        sym._cached_version = version
+
+
+def _cached_parse(ds_str, sym):
+    key = (ds_str, id(sym), sym.version)
+    ds = _parse_cache.get(key)
+    if ds is None:
+        _check_version(sym)
+        ds = parser.parse(ds_str, sym)
+        validate(ds)
+        _parse_cache.put(key, ds)
+    return ds
+
+
+def parse_cache_info():
+    """
+    Returns a CacheInfo(hits, misses, evictions, maxsize, currsize)
+    namedtuple describing the cache behind dshape().
+    """
+    return _parse_cache.info()
+
+
+def set_parse_cache_size(maxsize):
+    """
+    Sets the number of parsed datashape strings dshape() remembers.
+    A size of 0 disables the cache.
+    """
+    _parse_cache.resize(maxsize)
+
+
+def clear_parse_cache():
+    """Empties the dshape() parse cache and resets its counters."""
+    _parse_cache.clear()
+
+
 def dshape(o):
     """
     Parse a blaze type. For a thorough description see
     http://blaze.pydata.org/docs/datashape.html
 
+    Strings are parsed against the default type symbol table, and
+    the results are memoized (see parse_cache_info).
     """
     if isinstance(o, py2help._strtypes):
-        ds = parser.parse(o, type_symbol_table.sym)
+        return _cached_parse(o, type_symbol_table.sym)
     elif isinstance(o, (coretypes.CType, coretypes.String,
                         coretypes.Record, coretypes.JSON,
                         coretypes.Date, coretypes.Time, coretypes.DateTime,
@@ -82,41 +294,32 @@ def cat_dshapes(dslist):
     return coretypes.DataShape(*[coretypes.Fixed(outer_dim_size)] + list(inner_ds))
 
 
+def _type_meta(ds):
+    try:
+        return ds._meta
+    except AttributeError:
+        return coretypes._compute_meta(ds)
+
+
 def has_var_dim(ds):
     """Returns True if datashape has a variable dimension
 
     Note currently treats variable length string as scalars.
     """
-    test = []
-    if isinstance(ds, (coretypes.Ellipsis, coretypes.Var)):
-        return True
-    elif isinstance(ds, coretypes.Record):
-        test = ds.types
-    elif isinstance(ds, coretypes.Mono):
-        test = ds.parameters
+    if isinstance(ds, coretypes.Mono):
+        return _type_meta(ds).has_var
     elif isinstance(ds, (list, tuple)):
-        test = ds
-    for ds_t in test:
-        if has_var_dim(ds_t):
-            return True
+        return any(has_var_dim(ds_t) for ds_t in ds)
     return False
 
 
 def has_ellipsis(ds):
     """Returns True if the datashape has an ellipsis
     """
-    test = []
-    if isinstance(ds, coretypes.Ellipsis):
-        return True
-    elif isinstance(ds, coretypes.Record):
-        test = ds.types
-    elif isinstance(ds, coretypes.Mono):
-        test = ds.parameters
+    if isinstance(ds, coretypes.Mono):
+        return _type_meta(ds).has_ellipsis
     elif isinstance(ds, (list, tuple)):
-        test = ds
-    for ds_t in test:
-        if has_ellipsis(ds_t):
-            return True
+        return any(has_ellipsis(ds_t) for ds_t in ds)
     return False
 
 